@@ -0,0 +1,79 @@
+"""
+Micro-benchmark of the per-file cost of test collection.
+
+Every collected test file gets a `Meta` object built from its
+metadata section (twice when filters apply). `Meta.__post_init__`
+used to look its caller up with `inspect.stack()`, which reads the
+source context of every frame on the stack. This benchmark collects
+a synthetic suite (see: `corpus.make_tests`) with the current `Meta`
+and with a `Meta` restoring that lookup, and prints the collection
+cost per file of both:
+
+```bash
+python benchmarks/bench_meta_construction.py --files 200 --repeat 3
+```
+"""
+from dataclasses import dataclass
+from unittest import mock
+
+import argparse
+import inspect
+import os
+import shutil
+import tempfile
+import time
+
+from kalash import config as kalash_config
+from kalash.config import CliConfig, Meta, SharedMetaElements, Test, Trigger
+from kalash.run import prepare_suite
+
+from corpus import CorpusSpec, make_tests, tag_value
+
+
+@dataclass
+class _StackLookupMeta(Meta):
+    """`Meta` with the caller lookup it used to do on construction."""
+
+    def __post_init__(self):
+        frame = inspect.stack()[1]
+        module = inspect.getmodule(frame[0])
+        if module:
+            SharedMetaElements(self.cli_config).resolve_interpolables(
+                self, os.path.abspath(module.__file__))  # type: ignore
+
+
+def collect(directory: str) -> float:
+    trigger = Trigger(
+        # a single device in the corpus, the filter keeps every file
+        [Test(path=directory, devices=tag_value('devices', 0))],
+        cli_config=CliConfig(None, no_log=True, no_log_echo=True, what_if='ids')
+    )
+    start = time.perf_counter()
+    for _ in prepare_suite(trigger):
+        pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        make_tests(directory, CorpusSpec(files=args.files, depth=0, methods=1, tags=1))
+        collect(directory)  # warm up imports and caches
+        with mock.patch.object(kalash_config, 'Meta', _StackLookupMeta):
+            before = min(collect(directory) for _ in range(args.repeat))
+        after = min(collect(directory) for _ in range(args.repeat))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    for label, seconds in (('inspect.stack() lookup', before), ('current', after)):
+        print(f'{label:<24} {seconds * 1000 / args.files:8.3f} ms/file')
+    print(f'{"speed-up":<24} {before / after:8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark of loading the Kalash specification (`spec.yaml`).
+
+Every `CliConfig` used to parse `spec.yaml` again: at import time for
+the class-level defaults and in every `Trigger()`. `Spec.load_spec`
+now parses a file once per process. This benchmark times `import
+kalash.run` (in a fresh interpreter) and `Trigger()` construction,
+with the spec cache and with a cache that never keeps anything:
+
+```bash
+python benchmarks/bench_spec_loading.py --imports 10 --triggers 1000
+```
+"""
+from unittest import mock
+
+import argparse
+import subprocess
+import sys
+import time
+
+from kalash import spec as kalash_spec
+from kalash.config import Trigger
+
+
+class _NoCache(dict):
+    """Cache that forgets everything, i.e. parsing on every load."""
+
+    def __setitem__(self, key, value):
+        pass
+
+
+IMPORT_CODE = '''
+import time
+start = time.perf_counter()
+import kalash.spec
+if {uncached}:
+    class _NoCache(dict):
+        def __setitem__(self, key, value):
+            pass
+    kalash.spec._SPEC_CACHE = _NoCache()
+import kalash.run
+print(time.perf_counter() - start)
+'''
+
+
+def time_import(uncached: bool) -> float:
+    output = subprocess.check_output(
+        [sys.executable, '-c', IMPORT_CODE.format(uncached=uncached)]
+    )
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def time_triggers(count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        Trigger()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--imports', type=int, default=10)
+    parser.add_argument('--triggers', type=int, default=1000)
+    args = parser.parse_args()
+
+    import_uncached = min(time_import(True) for _ in range(args.imports))
+    import_cached = min(time_import(False) for _ in range(args.imports))
+    with mock.patch.object(kalash_spec, '_SPEC_CACHE', _NoCache()):
+        triggers_uncached = time_triggers(args.triggers)
+    triggers_cached = time_triggers(args.triggers)
+
+    print(f'{"":<24} {"uncached":>10} {"cached":>10}')
+    print(f'{"import kalash.run":<24} {import_uncached * 1000:8.1f}ms '
+          f'{import_cached * 1000:8.1f}ms')
+    print(f'{"Trigger()":<24} {triggers_uncached * 1e6 / args.triggers:8.1f}us '
+          f'{triggers_cached * 1e6 / args.triggers:8.1f}us')
+
+
+if __name__ == '__main__':
+    main()
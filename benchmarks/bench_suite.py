@@ -0,0 +1,259 @@
+"""
+Benchmarks of collection and what-if runs on a synthetic corpus.
+
+Generates a test tree with `corpus.make_corpus` (its shape is set by
+the `CorpusSpec` options) and times, `--repeat` times each:
+
+* `discovery` - collecting every test of the tree, without filters
+* `metadata` - `parse_metadata_section` of every test file
+* `filtering` - collecting with tag (`devices`) and ID filters
+* `last_result_cold` - `last_result: NOK` against the XML reports,
+  building the report index from scratch
+* `last_result_warm` - the same with the report index up to date
+* `last_result_history` - `last_result: NOK` in any of the last 3
+  runs of the result history
+* `what_if` - a complete `--what-if ids` run
+* `logger_setup` - creating the logger of every collected test,
+  logging a line and closing its file
+
+The results (best and median time, time per test file and the phases
+of the best repetition, see: `kalash.timings`) are printed and written
+as JSON, together with the Kalash version, the git commit and the
+corpus. `--compare` prints the change against an earlier result file,
+e.g. of the previous version:
+
+```bash
+python benchmarks/bench_suite.py --files 500 --repeat 5 --output before.json
+git checkout my-branch
+python benchmarks/bench_suite.py --files 500 --repeat 5 --compare before.json
+```
+"""
+from typing import Any, Callable, Dict, List, Optional
+
+import argparse
+import contextlib
+import datetime
+import gc
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import kalash
+from kalash import timings
+from kalash.config import CliConfig, Config, Test, Trigger
+from kalash.last_result_filter import INDEX_FILE_NAME
+from kalash.log import close_all
+from kalash.metaparser import parse_metadata_section
+from kalash.retry import iterate_tests
+from kalash.run import MetaLoader, prepare_suite, run_test_suite
+
+import corpus
+from corpus import tag_value
+
+ID_FILTER = r'^\d+_0[0-4]-'
+"""Selects the first 5 ID groups (10% of the tests by default)."""
+HISTORY_RUNS = 3
+
+Measurement = Callable[[], int]
+
+
+class Benchmarks:
+    """The measurements of one corpus. Every method prepares
+    a measurement (untimed) and returns it, a measurement returns
+    the number of tests (or files) it went through.
+
+    Args:
+        root (str): directory the corpus has been written to
+        paths (List[str]): test files of the corpus
+    """
+
+    def __init__(self, root: str, paths: List[str]):
+        self.tests = os.path.join(root, 'tests')
+        self.reports = os.path.join(root, 'reports')
+        self.logs = os.path.join(root, 'logs')
+        self.paths = paths
+
+    def _trigger(self, what_if: Optional[str] = None, no_log: bool = True, **filters) -> Trigger:
+        return Trigger(
+            [Test(path=self.tests, **filters)],
+            config=Config(report=self.reports),
+            cli_config=CliConfig(
+                None, no_log=no_log, no_log_echo=True, log_dir=self.logs, what_if=what_if
+            )
+        )
+
+    def _collect(self, **filters) -> Measurement:
+        trigger = self._trigger(**filters)
+        return lambda: sum(
+            len(list(iterate_tests(suite))) for suite, _ in prepare_suite(trigger)
+        )
+
+    def discovery(self) -> Measurement:
+        return self._collect()
+
+    def metadata(self) -> Measurement:
+        cli_config = CliConfig(None, no_log=True, no_log_echo=True)
+
+        def parse():
+            for path in self.paths:
+                parse_metadata_section(path, cli_config)
+            return len(self.paths)
+        return parse
+
+    def filtering(self) -> Measurement:
+        return self._collect(
+            devices=[tag_value('devices', 0), tag_value('devices', 1)],
+            id=[ID_FILTER]
+        )
+
+    def last_result_cold(self) -> Measurement:
+        index = os.path.join(self.reports, INDEX_FILE_NAME)
+        if os.path.exists(index):
+            os.remove(index)
+        return self._collect(last_result='NOK')
+
+    def last_result_warm(self) -> Measurement:
+        self._collect(last_result='NOK')()  # brings the report index up to date
+        return self._collect(last_result='NOK')
+
+    def last_result_history(self) -> Measurement:
+        return self._collect(
+            last_result='NOK', last_result_runs=HISTORY_RUNS, last_result_count=1
+        )
+
+    def what_if(self) -> Measurement:
+        trigger = self._trigger(what_if='ids')
+        # the run prints the timings recorded by `measure`, don't write them as well
+        trigger.config.report = None
+
+        def run():
+            names: List[str] = []
+            with contextlib.redirect_stdout(io.StringIO()):
+                run_test_suite(MetaLoader(trigger=trigger, local=False), trigger, names.append)
+            return len(names)
+        return run
+
+    def logger_setup(self) -> Measurement:
+        shutil.rmtree(self.logs, ignore_errors=True)
+        tests = [
+            test for suite, _ in prepare_suite(self._trigger(no_log=False))
+            for test in iterate_tests(suite)
+        ]
+
+        def set_up():
+            for test in tests:
+                test.logger.info('started')
+            close_all()
+            return len(tests)
+        return set_up
+
+
+BENCHMARKS = (
+    'discovery', 'metadata', 'filtering', 'last_result_cold', 'last_result_warm',
+    'last_result_history', 'what_if', 'logger_setup'
+)
+
+
+def measure(benchmarks: Benchmarks, name: str, repeat: int) -> Dict[str, Any]:
+    """Prepares and times one measurement `repeat` times."""
+    runs: List[float] = []
+    best_phases: Dict[str, float] = {}
+    items = 0
+    for _ in range(repeat):
+        measurement = getattr(benchmarks, name)()
+        gc.collect()
+        recorded = timings.start(name)
+        start = time.perf_counter()
+        items = measurement()
+        elapsed = time.perf_counter() - start
+        timings.stop()
+        if not runs or elapsed < min(runs):
+            best_phases = {k: round(v, 6) for k, v in recorded.phases.items() if v}
+        runs.append(elapsed)
+    best = min(runs)
+    return {
+        'best': round(best, 6),
+        'median': round(statistics.median(runs), 6),
+        'runs': [round(r, 6) for r in runs],
+        'items': items,
+        'per_file_us': round(best * 1e6 / len(benchmarks.paths), 1),
+        'phases': best_phases
+    }
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(kalash.__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    """Prints the change of the best times against a baseline."""
+    if current['corpus'] != baseline['corpus']:
+        print('warning: the baseline was measured on a different corpus')
+    print(f'\nagainst {baseline["kalash"]} ({baseline["commit"]}, {baseline["created"]}):')
+    print(f'{"benchmark":<22} {"before":>10} {"after":>10} {"change":>8}')
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if not before:
+            continue
+        change = (result['best'] - before['best']) * 100 / before['best'] if before['best'] else 0
+        print(f'{name:<22} {before["best"] * 1000:8.1f}ms {result["best"] * 1000:8.1f}ms '
+              f'{change:+7.1f}%')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    corpus.add_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument('--output', default=f'kalash_bench-{time.strftime("%Y%m%d%H%M%S")}.json')
+    parser.add_argument('--compare', help='result file of an earlier run')
+    args = parser.parse_args()
+
+    spec = corpus.spec_from_args(args)
+    root = tempfile.mkdtemp()
+    try:
+        paths = corpus.make_corpus(root, spec)
+        benchmarks = Benchmarks(root, paths)
+        benchmarks.discovery()()  # warm up imports and caches
+        results = {name: measure(benchmarks, name, args.repeat) for name in args.only}
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    current = {
+        'kalash': kalash.__version__,
+        'commit': _commit(),
+        'created': datetime.datetime.now().replace(microsecond=0).isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'corpus': spec.to_dict(),
+        'repeat': args.repeat,
+        'results': results
+    }
+    print(f'{"benchmark":<22} {"best":>10} {"median":>10} {"per file":>12} {"items":>7}')
+    for name, result in results.items():
+        print(f'{name:<22} {result["best"] * 1000:8.1f}ms {result["median"] * 1000:8.1f}ms '
+              f'{result["per_file_us"]:10.1f}us {result["items"]:7}')
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(current, f, indent=2)
+    print(f'Results written to {args.output}')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(current, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
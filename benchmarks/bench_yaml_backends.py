@@ -0,0 +1,73 @@
+"""
+Benchmark of the YAML backends reading metadata sections.
+
+Generates a corpus of test files (10k by default, see:
+`corpus.make_tests`) and times reading their metadata sections,
+per file:
+
+* `python` - PyYAML's pure-Python `FullLoader` (`yaml.full_load`)
+* `libyaml` - libyaml's `CSafeLoader` (if PyYAML is built with it)
+* `flat` - the restricted parser `kalash.yaml_backend.load_flat`
+
+both for the YAML alone and for `parse_metadata_section`, which
+also reads and parses the test file:
+
+```bash
+python benchmarks/bench_yaml_backends.py --files 10000
+```
+"""
+from typing import Any, Callable, Dict
+from unittest import mock
+
+import argparse
+import shutil
+import tempfile
+import time
+
+import yaml
+
+from kalash import yaml_backend
+from kalash.config import CliConfig
+from kalash.metaparser import extract_meta_from_test_script_ast, parse_metadata_section
+
+from corpus import CorpusSpec, make_tests
+
+BACKENDS: Dict[str, Callable[[str], Any]] = {
+    'python': yaml.full_load,
+    'flat': yaml_backend.load_flat,
+}
+if yaml_backend.HAS_LIBYAML:
+    BACKENDS['libyaml'] = lambda text: yaml.load(text, Loader=yaml.CSafeLoader)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--files', type=int, default=10000)
+    args = parser.parse_args()
+
+    cli_config = CliConfig()
+    directory = tempfile.mkdtemp()
+    try:
+        paths = make_tests(directory, CorpusSpec(files=args.files, depth=0))
+        texts = [extract_meta_from_test_script_ast(p, cli_config) for p in paths]
+        expected = [yaml.full_load(t) for t in texts]
+
+        print(f'{"backend":<10} {"YAML only":>12} {"per file":>12}')
+        for name, backend in BACKENDS.items():
+            start = time.perf_counter()
+            loaded = [backend(t) for t in texts]
+            yaml_only = time.perf_counter() - start
+            assert loaded == expected, name
+            with mock.patch.object(yaml_backend, 'load_metadata', backend):
+                start = time.perf_counter()
+                for path in paths:
+                    parse_metadata_section(path, cli_config)
+                per_file = time.perf_counter() - start
+            print(f'{name:<10} {yaml_only * 1e6 / args.files:10.1f}us '
+                  f'{per_file * 1e6 / args.files:10.1f}us')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+Synthetic test trees for the benchmarks.
+
+`make_corpus` writes `files` Kalash test files spread over
+directories `depth` levels deep (`fanout` subdirectories per level),
+each with a metadata section and a test class with `methods` test
+methods. Metadata values are drawn from pools of `tags` values per
+field (`use_cases`, `workbenches`, `devices`, `suites`,
+`functionality`), IDs
+follow `id_format` and the report directory holds `history` past
+runs: XML reports written by `ReportWriter` and the result history,
+with `failure_rate` of the tests failing. The same seed always
+gives the same tree. All benchmarks write their test files with
+`make_tests`:
+
+```bash
+python benchmarks/corpus.py /tmp/corpus --files 2000 --depth 3 --tags 50 --history 10
+```
+"""
+from dataclasses import asdict, dataclass
+from typing import List
+
+import argparse
+import datetime
+import os
+import random
+
+from kalash.history import ResultHistory
+from kalash.report import FAILURE, ReportWriter, TestCaseRecord
+
+TAG_FIELDS = ('use_cases', 'workbenches', 'devices', 'suites', 'functionality')
+
+TEST_FILE = '''"""
+META_START
+---
+id: {id}  # ID of the test
+{tags}
+META_END
+"""
+from kalash.run import TestCase
+
+
+class Test{index}(TestCase):
+{methods}'''
+
+TEST_METHOD = '''
+    def test_{index}(self):
+        pass
+'''
+
+
+@dataclass
+class CorpusSpec:
+    """Shape of a synthetic test tree.
+
+    Args:
+        files (int): number of test files
+        depth (int): directory levels below the corpus root
+        fanout (int): subdirectories per directory level
+        methods (int): test methods per test file
+        tags (int): distinct values of every metadata field
+        tags_per_file (int): most values of a field in a single file
+        id_groups (int): distinct values of `group` in `id_format`
+        id_format (str): format of test IDs with the fields `n`
+            (number of the file) and `group` (`n` modulo `id_groups`)
+        history (int): number of past runs in the report directory
+        failure_rate (float): share of failing tests in past runs
+        seed (int): seed of the random generator
+    """
+    files: int = 500
+    depth: int = 2
+    fanout: int = 4
+    methods: int = 3
+    tags: int = 20
+    tags_per_file: int = 3
+    id_groups: int = 50
+    id_format: str = '{n:09}_{group:02}-Bench_{n}-Corpus'
+    history: int = 5
+    failure_rate: float = 0.1
+    seed: int = 0
+
+    def test_id(self, n: int) -> str:
+        return self.id_format.format(n=n, group=n % self.id_groups)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def tag_value(field: str, index: int) -> str:
+    return f'{field}_{index:03}'
+
+
+def make_tests(root: str, spec: CorpusSpec) -> List[str]:
+    """Writes the test files of a corpus.
+
+    Returns:
+        Paths to the written test files
+    """
+    rng = random.Random(spec.seed)
+    paths = []
+    for n in range(spec.files):
+        directory = os.path.join(
+            root, *(f'level{level}_{rng.randrange(spec.fanout)}' for level in range(spec.depth))
+        )
+        os.makedirs(directory, exist_ok=True)
+        tags = []
+        for field in TAG_FIELDS:
+            count = rng.randint(1, spec.tags_per_file)
+            values = sorted(rng.sample(range(spec.tags), min(count, spec.tags)))
+            tags.append(f'{field}:')
+            tags.extend(f'  - {tag_value(field, v)}' for v in values)
+        path = os.path.join(directory, f'test_bench_{n}.py')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(TEST_FILE.format(
+                id=spec.test_id(n),
+                tags='\n'.join(tags),
+                index=n,
+                methods=''.join(TEST_METHOD.format(index=m) for m in range(spec.methods))
+            ))
+        paths.append(path)
+    return paths
+
+
+def make_history(report_dir: str, paths: List[str], spec: CorpusSpec):
+    """Writes `spec.history` past runs of the tests in `paths`
+    as XML reports and into the result history."""
+    rng = random.Random(spec.seed + 1)
+    start = datetime.datetime(2022, 1, 1)
+    for run in range(spec.history):
+        writer = ReportWriter(report_dir, outsuffix=f'run{run:04}')
+        history = ResultHistory.in_report_dir(report_dir, f'run{run:04}')
+        timestamp = (start + datetime.timedelta(hours=run)).isoformat()
+        for n, path in enumerate(paths):
+            suite = f'test_bench_{n}.Test{n}'
+            for m in range(spec.methods):
+                failed = rng.random() < spec.failure_rate
+                writer.submit(TestCaseRecord(
+                    suite=suite,
+                    classname=suite,
+                    name=f'test_{m}',
+                    outcome=FAILURE if failed else None,
+                    exc_type='AssertionError' if failed else '',
+                    message='boom' if failed else '',
+                    file=path,
+                    time=0.01,
+                    timestamp=timestamp
+                ))
+                history.add(f'{suite}.test_{m}', path, f'test_{m}',
+                            'failed' if failed else 'passed', 0.01, timestamp)
+        writer.close()
+        history.close()
+
+
+def make_corpus(root: str, spec: CorpusSpec) -> List[str]:
+    """Writes a corpus with its tests in `root/tests` and
+    its report history in `root/reports`.
+
+    Returns:
+        Paths to the written test files
+    """
+    paths = make_tests(os.path.join(root, 'tests'), spec)
+    make_history(os.path.join(root, 'reports'), paths, spec)
+    return paths
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Adds a command line option for every `CorpusSpec` field."""
+    for name, default in CorpusSpec().to_dict().items():
+        parser.add_argument(f'--{name.replace("_", "-")}', type=type(default), default=default)
+
+
+def spec_from_args(args: argparse.Namespace) -> CorpusSpec:
+    return CorpusSpec(**{name: getattr(args, name) for name in CorpusSpec().to_dict()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('root', help='directory the corpus is written to')
+    add_arguments(parser)
+    args = parser.parse_args()
+    paths = make_corpus(args.root, spec_from_args(args))
+    print(f'{len(paths)} test files written to {os.path.join(args.root, "tests")}')
+
+
+if __name__ == '__main__':
+    main()
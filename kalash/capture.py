@@ -0,0 +1,110 @@
+"""
+Output capture with a bounded memory footprint.
+
+`OutputCapture` keeps captured output in memory up to a limit.
+Beyond that it spills the complete output to a file and only
+keeps its head and tail in memory, so a test printing hundreds
+of megabytes doesn't grow the runner's memory. Reports then get
+the head and the tail together with the path to the full output.
+"""
+__docformat__ = "google"
+
+from collections import deque
+from typing import Deque, IO, Optional
+
+import io
+import os
+import re
+import tempfile
+
+DEFAULT_OUTPUT_LIMIT = 1024 * 1024  # characters
+
+
+class OutputCapture(io.TextIOBase):
+    """Text stream capturing the output of a single test.
+
+    Args:
+        limit (int): number of characters kept in memory before
+            the output is spilled to a file, the report then gets
+            `limit // 2` characters from the start and from the end
+        spill_dir (str): directory where spilled output is stored
+    """
+
+    def __init__(self, limit: int = DEFAULT_OUTPUT_LIMIT, spill_dir: str = '.'):
+        super().__init__()
+        self.limit = limit
+        self.spill_dir = spill_dir
+        self._file: Optional[IO[str]] = None
+        self._clear('output')
+
+    def _clear(self, name: str):
+        self.name = name
+        self.size = 0
+        self.path: Optional[str] = None
+        self._buffer = io.StringIO()
+        self._file = None
+        self._head = ''
+        self._tail: Deque[str] = deque()
+        self._tail_size = 0
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def writable(self):
+        return True
+
+    def write(self, s: str) -> int:
+        self.size += len(s)
+        if self._file is None:
+            self._buffer.write(s)
+            if self.size > self.limit:
+                self._spill()
+        else:
+            self._file.write(s)
+            self._push_tail(s)
+        return len(s)
+
+    def _spill(self):
+        if not os.path.exists(self.spill_dir):
+            os.makedirs(self.spill_dir)
+        prefix = re.sub(r'[^\w.-]', '_', self.name)[:100] + '-'
+        fd, self.path = tempfile.mkstemp(prefix=prefix, suffix='.txt', dir=self.spill_dir)
+        self._file = open(fd, 'w', encoding='utf-8', errors='replace')
+        content = self._buffer.getvalue()
+        self._buffer = io.StringIO()
+        self._file.write(content)
+        self._head = content[:self.limit // 2]
+        self._push_tail(content)
+
+    def _push_tail(self, s: str):
+        keep = self.limit // 2
+        self._tail.append(s[-keep:] if keep else '')
+        self._tail_size += len(self._tail[-1])
+        while self._tail and self._tail_size - len(self._tail[0]) >= keep:
+            self._tail_size -= len(self._tail.popleft())
+
+    def getvalue(self) -> str:
+        """Returns the captured output, or its head and tail
+        with a note pointing to the full output once spilled.
+        """
+        if self._file is None:
+            return self._buffer.getvalue()
+        self._file.flush()
+        tail = ''.join(self._tail)[-(self.limit // 2):] if self.limit // 2 else ''
+        return (
+            f'{self._head}\n\n'
+            f'[... output truncated, {self.size} characters in total, '
+            f'full output in {os.path.abspath(self.path or "")} ...]\n\n'
+            f'{tail}'
+        )
+
+    def reset(self, name: str = 'output'):
+        """Starts capturing output of the next test.
+
+        Args:
+            name (str): used as the prefix of the spill file name
+        """
+        if self._file is not None:
+            self._file.close()
+        self._clear(name)
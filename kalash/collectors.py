@@ -16,7 +16,7 @@ import unittest
 import os
 import inspect
 
-from .config import (CollectorArtifact, Meta,
+from .config import (CollectorArtifact, Meta, MethodFilter,
                      PathOrIdForWhatIf, TestModule, Trigger)
 from .smuggle import smuggle
 from .metaparser import parse_metadata_section
@@ -25,7 +25,8 @@ from .test_case import TestCase
 
 def _collect_test_case_from_module(
     test: TestModule,
-    trigger: Optional[Trigger]
+    trigger: Optional[Trigger],
+    method_filter: Optional[MethodFilter] = None
 ):
     identifiers: PathOrIdForWhatIf = []
     suite = unittest.TestSuite()
@@ -45,11 +46,12 @@ def _collect_test_case_from_module(
 
                     if inspect.isfunction(func) \
                         and funcname.startswith('test') \
-                            and _id is not None:
+                            and _id is not None \
+                            and (method_filter is None or method_filter(obj.__name__, funcname)):
 
-                        suite.addTest(obj(
-                            funcname, _id, meta, trigger
-                        ))
+                        case = obj(funcname, _id, meta, trigger)
+                        case.collected_from = os.path.abspath(test.__file__)  # type: ignore
+                        suite.addTest(case)
                         if _trigger.cli_config:
                             if _trigger.cli_config.what_if == \
                                     _trigger.cli_config.spec.cli_config.whatif_ids:
@@ -74,7 +76,8 @@ def _collect_test_case_from_module(
 # ====================
 def _collect_test_case_v1_x(
     file: str,
-    trigger: Trigger
+    trigger: Trigger,
+    method_filter: Optional[MethodFilter] = None
 ) -> CollectorArtifact:
     # import the test from absolute or relative path
     # path should be relative to current working directory when calling kalash
@@ -83,7 +86,7 @@ def _collect_test_case_v1_x(
     # meta = defaultdict(lambda: None, parse_metadata_section(file))['values']
     # meta = defaultdict(lambda: None, meta) if meta else defaultdict(lambda: None)
 
-    return _collect_test_case_from_module(test, trigger)
+    return _collect_test_case_from_module(test, trigger, method_filter)
 
 # =============================================================================
 
@@ -93,7 +96,8 @@ def _collect_test_case_v1_x(
 # ====================
 def _collect_test_case_v2_0(
     file: str,
-    trigger: Trigger
+    trigger: Trigger,
+    method_filter: Optional[MethodFilter] = None
 ) -> CollectorArtifact:
     raise NotImplementedError("Test case V2 has not been implemented yet")
 
@@ -5,19 +5,16 @@ __doc__ = """"""
 
 from collections import defaultdict
 from types import ModuleType
-from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, Union
-from dataclasses import dataclass, field
-from toolz import pipe
-from dataclasses_jsonschema import JsonSchemaMixin
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, Union, get_type_hints
+from dataclasses import dataclass, field, fields
 
 import unittest
 import logging
 import os
-import yaml
-import inspect
 
 from .smuggle import smuggle
 from .spec import Spec
+from . import yaml_backend
 
 T = TypeVar('T')
 TestPath = str
@@ -89,6 +86,45 @@ class CliConfig:
         fail_fast (bool): if `True` the test suite won't be continued if
             at least one of the tests that have been collected and triggered
             has failed
+        retries (Optional[int]): default number of in-process re-runs
+            of a failed or errored test, overrides `retries` from the
+            `config` section
+        retry_budget (Optional[int]): total number of re-runs allowed
+            in the whole run, overrides `retry_budget` from the
+            `config` section
+        output_limit (Optional[int]): number of characters of captured
+            output per test kept in memory and in the report, overrides
+            `output_limit` from the `config` section
+        events (Optional[str]): path to a JSON Lines file receiving run
+            events, overrides `events` from the `config` section
+        log_async (bool): hand log records over to a background thread
+            writing the log files and echoing to STDOUT, so that logging
+            doesn't block tests on disk or console I/O
+        log_queue_size (int): maximal number of log records waiting
+            for the background thread
+        log_overflow (str): what happens to a log record when the queue
+            is full, either `block` (wait for the background thread) or
+            `drop` (discard the record)
+        log_echo_rate (Optional[int]): maximal number of log lines
+            per second echoed to STDOUT, the file logs are complete
+        log_max_bytes (Optional[int]): size at which a log file is
+            rotated, no limit by default
+        log_backups (int): number of rotated log files kept per log,
+            with 0 the log file is started over when full
+        log_compress (bool): gzip rotated log files and log files
+            of finished tests
+        log_json (bool): also write logs as JSON lines, indexed
+            in the log base directory (see: `kalash.log_index`)
+        run_id (Optional[str]): ID of the run shared by the run events,
+            the result history and the JSON logs, a random one
+            is assigned to every run by `run.run_test_suite` by default
+        plan (Optional[str]): path to a plan written by `kalash plan`,
+            its tests are run instead of collecting them (see: `kalash.plan`)
+        timings (Optional[int]): print the time spent in each phase of
+            the run with this many slowest files per collection phase
+            and write it next to the reports (see: `kalash.timings`)
+        profile (Optional[str]): run every test under a profiler,
+            `cprofile` or `sampling` (see: `kalash.profiling`)
     """
     file:        Optional[str] = None
     # if not running in CLI context we initialize reasonable defaults:
@@ -103,6 +139,22 @@ class CliConfig:
     log_format:  str           = '%(message)s'
     what_if:     Optional[str] = None
     fail_fast:   bool          = False
+    retries:     Optional[int] = None
+    retry_budget: Optional[int] = None
+    output_limit: Optional[int] = None
+    events:      Optional[str] = None
+    log_async:   bool          = False
+    log_queue_size: int        = 10000
+    log_overflow: str          = 'block'
+    log_echo_rate: Optional[int] = None
+    log_max_bytes: Optional[int] = None
+    log_backups: int           = 1
+    log_compress: bool         = False
+    log_json:    bool          = False
+    run_id:      Optional[str] = None
+    plan:        Optional[str] = None
+    timings:     Optional[int] = None
+    profile:     Optional[str] = None
 
     def __post_init__(self):
         spec_abspath = os.path.join(os.path.dirname(__file__), self.spec_path)
@@ -179,6 +231,7 @@ class SharedMetaElements:
         Returns: interpolated string
         """
         if ipt:
+            from toolz import pipe
             return pipe(
                 self._interpolate_this_file(ipt, yaml_abspath),
                 self._interpolate_workdir
@@ -191,6 +244,74 @@ class SharedMetaElements:
                 setattr(o, k, self._interpolate_all(v, yaml_abspath))
 
 
+class LazyJsonSchemaMixin:
+    """Provides `json_schema()` of `dataclasses_jsonschema.JsonSchemaMixin`
+    to the configuration classes.
+
+    `dataclasses_jsonschema` (with `jsonschema` behind it) takes longer
+    to import than the rest of Kalash and is only needed to export the
+    schema. It is imported by the first `json_schema()` call, which
+    builds a `JsonSchemaMixin` counterpart of the class to generate
+    the schema with.
+    """
+
+    @classmethod
+    def json_schema(cls, *args, **kwargs) -> Dict[str, Any]:
+        """JSON schema of the class, takes the arguments
+        of `dataclasses_jsonschema.JsonSchemaMixin.json_schema`.
+        """
+        return _schema_class(cls).json_schema(*args, **kwargs)
+
+    def to_dict(self, *args, **kwargs) -> Dict[str, Any]:
+        """Dictionary of the object, takes the arguments
+        of `dataclasses_jsonschema.JsonSchemaMixin.to_dict`.
+        """
+        counterpart = object.__new__(_schema_class(type(self)))
+        counterpart.__dict__.update(self.__dict__)
+        return counterpart.to_dict(*args, **kwargs)
+
+
+_SCHEMA_CLASSES: Dict[type, type] = {}
+
+
+def _schema_type(hint: Any) -> Any:
+    """Replaces `LazyJsonSchemaMixin` classes in a type hint
+    with their `JsonSchemaMixin` counterparts."""
+    if isinstance(hint, type) and issubclass(hint, LazyJsonSchemaMixin):
+        return _schema_class(hint)
+    args = getattr(hint, '__args__', None)
+    if args:
+        schema_args = tuple(_schema_type(a) for a in args)
+        if any(a is not s for a, s in zip(args, schema_args)):
+            return hint.copy_with(schema_args)
+    return hint
+
+
+def _schema_class(cls: type) -> type:
+    """`JsonSchemaMixin` counterpart of a `LazyJsonSchemaMixin` class,
+    named like the class. Its bases and field types refer to other
+    counterparts, so nested classes land in the schema definitions.
+    """
+    if cls not in _SCHEMA_CLASSES:
+        from dataclasses_jsonschema import JsonSchemaMixin
+        bases = tuple(
+            _schema_class(base) for base in cls.__bases__
+            if issubclass(base, LazyJsonSchemaMixin) and base is not LazyJsonSchemaMixin
+        ) or (JsonSchemaMixin,)
+        hints = get_type_hints(cls)
+        annotations = {}
+        for f in fields(cls):
+            hint = _schema_type(hints[f.name])
+            if hint is not hints[f.name]:
+                annotations[f.name] = hint
+        _SCHEMA_CLASSES[cls] = type(cls.__name__, bases + (cls,), {
+            '__doc__': cls.__doc__,
+            '__module__': cls.__module__,
+            '__annotations__': annotations
+        })
+    return _SCHEMA_CLASSES[cls]
+
+
 @dataclass
 class Base:
     """Base config class. `Meta`, `Config` and `Test`
@@ -208,7 +329,7 @@ class Base:
 
 
 @dataclass
-class Meta(Base, JsonSchemaMixin):
+class Meta(Base, LazyJsonSchemaMixin):
     """Provides a specification outline for the Metadata tag
     in test templates.
 
@@ -238,15 +359,6 @@ class Meta(Base, JsonSchemaMixin):
     functionality: Optional[OneOrList[FunctionalityItem]] = None
     cli_config:    CliConfig = CliConfig()
 
-    def __post_init__(self):
-        frame = inspect.stack()[1]
-        module = inspect.getmodule(frame[0])
-        if module:
-            module_path = os.path.abspath(module.__file__)  # type: ignore
-                                                            # `__file__` always exists
-                                                            # in this context
-            SharedMetaElements(self.cli_config).resolve_interpolables(self, module_path)
-
     @classmethod
     def from_yaml_obj(cls, yaml_obj: ArbitraryYamlObj, cli_config: CliConfig) -> Meta:
         block_spec = cli_config.spec.test
@@ -266,7 +378,7 @@ class Meta(Base, JsonSchemaMixin):
 
 
 @dataclass
-class Test(Meta, JsonSchemaMixin):
+class Test(Meta, LazyJsonSchemaMixin):
     """Provides a specification outline for a single category
     of tests that should be collected, e.g. by path, ID or any
     other parameter inherited from `Meta`.
@@ -282,30 +394,42 @@ class Test(Meta, JsonSchemaMixin):
         last_result (Optional[LastResult]): if `OK` then filters
             out only the tests that have passed in the last run,
             if `NOK` then it only filters out those tests that
-            have failed in the last run
+            have failed in the last run, if `FLAKY` then it only
+            filters out tests with a flakiness score of at least
+            `flaky_threshold` in the result history
+        last_result_runs (Optional[int]): evaluate `last_result`
+            over this many most recent runs of each test recorded
+            in the result history instead of the latest report
+        last_result_count (Optional[int]): minimal number of runs
+            in the result history matching `last_result`, by
+            default all considered runs have to match
+        last_result_since (Optional[str]): only consider runs in the
+            result history since a period back in time (`12h`,
+            `7d`, `2w`) or since an ISO date
+        flaky_threshold (Optional[float]): minimal flakiness score
+            (0 to 1) of tests selected by `last_result: FLAKY`
         setup (Optional[AuxiliaryPath]): path to a setup script;
             runs once at the start of the test category run
         teardown (Optional[AuxiliaryPath]): path to a teardown
             script; runs once at the end of the test category
             run
+        retries (Optional[int]): number of in-process re-runs of
+            a test from this category that failed or errored out,
+            overrides the run-wide default
     """
     path:          Optional[OneOrList[TestPath]] = None
     id:            Optional[OneOrList[TestId]] = None
     no_recurse:    Optional[Toggle] = None
     last_result:   Optional[LastResult] = None
+    last_result_runs:  Optional[int] = None
+    last_result_count: Optional[int] = None
+    last_result_since: Optional[str] = None
+    flaky_threshold:   Optional[float] = None
     setup:         Optional[AuxiliaryPath] = None
     teardown:      Optional[AuxiliaryPath] = None
+    retries:       Optional[int] = None
     cli_config:    CliConfig = CliConfig()
 
-    def __post_init__(self):
-        frame = inspect.stack()[1]
-        module = inspect.getmodule(frame[0])
-        if module:
-            module_path = os.path.abspath(module.__file__)  # type: ignore
-                                                            # `__file__` always exists
-                                                            # in this context
-            SharedMetaElements(self.cli_config).resolve_interpolables(self, module_path)
-
     @classmethod
     def from_yaml_obj(cls, yaml_obj: ArbitraryYamlObj, cli_config: CliConfig) -> Test:
         """Loads `Test` blocks from a YAML object."""
@@ -316,8 +440,13 @@ class Test(Meta, JsonSchemaMixin):
             path=yaml_obj.get(block_spec.path, None),
             no_recurse=yaml_obj.get(block_spec.no_recurse, None),
             last_result=yaml_obj.get(block_spec.last_result, None),
+            last_result_runs=yaml_obj.get(block_spec.last_result_runs, None),
+            last_result_count=yaml_obj.get(block_spec.last_result_count, None),
+            last_result_since=yaml_obj.get(block_spec.last_result_since, None),
+            flaky_threshold=yaml_obj.get(block_spec.flaky_threshold, None),
             setup=yaml_obj.get(block_spec.setup_script, None),
             teardown=yaml_obj.get(block_spec.teardown_script, None),
+            retries=yaml_obj.get(block_spec.retries, None),
             **base_class_instance.__dict__
         )
 
@@ -329,11 +458,13 @@ class Test(Meta, JsonSchemaMixin):
         # one ID (1 ID == 1 test case). Hence ID is handled
         # separately in the `apply_filters` function using
         # `match_id` helper
-        return ['setup', 'teardown', 'path', 'id']
+        return ['setup', 'teardown', 'path', 'id', 'retries',
+                'last_result_runs', 'last_result_count', 'last_result_since',
+                'flaky_threshold']
 
 
 @dataclass
-class Config(Base, JsonSchemaMixin):
+class Config(Base, LazyJsonSchemaMixin):
     """Provides a specification outline for the runtime
     parameters. Where `Test` defines what tests to collect,
     this class defines global parameters determining how
@@ -346,10 +477,23 @@ class Config(Base, JsonSchemaMixin):
             runs once at the start of the complete run
         teardown (Optional[AuxiliaryPath]): path to a teardown
             script; runs once at the end of the complete run
+        retries (Optional[int]): default number of in-process
+            re-runs of a failed or errored test
+        retry_budget (Optional[int]): total number of re-runs
+            allowed in the whole run
+        output_limit (Optional[int]): number of characters of
+            captured output per test kept in memory and in the
+            report, longer output is spilled to a file
+        events (Optional[str]): path to a JSON Lines file where
+            run events are appended as they happen
     """
     report: str = './kalash_reports'
     setup: Optional[AuxiliaryPath] = None
     teardown: Optional[AuxiliaryPath] = None
+    retries: Optional[int] = None
+    retry_budget: Optional[int] = None
+    output_limit: Optional[int] = None
+    events: Optional[str] = None
     cli_config: CliConfig = CliConfig()
 
     def __post_init__(self):
@@ -363,14 +507,18 @@ class Config(Base, JsonSchemaMixin):
             return Config(
                 yaml_obj.get(config_spec.report, None),
                 yaml_obj.get(config_spec.one_time_setup_script, None),
-                yaml_obj.get(config_spec.one_time_teardown_script, None)
+                yaml_obj.get(config_spec.one_time_teardown_script, None),
+                yaml_obj.get(config_spec.retries, None),
+                yaml_obj.get(config_spec.retry_budget, None),
+                yaml_obj.get(config_spec.output_limit, None),
+                yaml_obj.get(config_spec.events, None)
             )
         else:
             return Config()
 
 
 @dataclass
-class Trigger(JsonSchemaMixin):
+class Trigger(LazyJsonSchemaMixin):
     """Main configuration class collecting all information for
     a test run, passed down throughout the whole call stack.
 
@@ -394,7 +542,7 @@ class Trigger(JsonSchemaMixin):
     def from_file(cls, file_path: str, cli_config: CliConfig):
         """Creates a `Trigger` instance from a YAML or JSON file."""
         with open(file_path, 'r') as f:
-            yaml_obj: ArbitraryYamlObj = defaultdict(lambda: None, yaml.safe_load(f))
+            yaml_obj: ArbitraryYamlObj = defaultdict(lambda: None, yaml_backend.load(f))
         list_blocks: List[ArbitraryYamlObj] = \
             yaml_obj[cli_config.spec.test.tests]
         cfg_section: ArbitraryYamlObj = yaml_obj[cli_config.spec.config.cfg]
@@ -413,12 +561,31 @@ class Trigger(JsonSchemaMixin):
         """Creates the Trigger instance from a YAML file or
         a Python file.
 
+        A configuration file is read (or executed) and interpolated
+        once per process, later calls return the cached `Trigger`
+        until the file is modified or the working directory changes.
+        `Trigger`s loaded from the same YAML file with different
+        `CliConfig`s share their `tests` and `config`.
+
         Args:
             path (str): path to the configuration file.
 
         Returns: `Tests` object
         """
         path = cli_config.file if cli_config.file else default_path
+        stat = os.stat(path)
+        key = (cls, os.path.abspath(path), os.getcwd(), stat.st_mtime_ns, stat.st_size,
+               cli_config.spec)
+        trigger = _TRIGGER_CACHE.get(key)
+        if trigger is None:
+            trigger = _TRIGGER_CACHE[key] = cls._load_trigger(path, cli_config)
+        from_yaml = path.endswith('.yaml') or path.endswith('.json')
+        if from_yaml and trigger.cli_config is not cli_config:
+            return cls(trigger.tests, trigger.config, cli_config)
+        return trigger
+
+    @classmethod
+    def _load_trigger(cls, path: str, cli_config: CliConfig):
         if path.endswith('.yaml') or path.endswith('.json'):
             t = cls()
             t = Trigger.from_file(os.path.abspath(path), cli_config)
@@ -436,13 +603,18 @@ class Trigger(JsonSchemaMixin):
                 )
 
 
+# (class, path, working directory, mtime, size, spec) -> interpolated `Trigger`
+_TRIGGER_CACHE: Dict[Tuple[type, str, str, int, int, Spec], Trigger] = {}
+
 PathOrIdForWhatIf = List[str]
 CollectorArtifact = Tuple[unittest.TestSuite, PathOrIdForWhatIf]  # can be a list of IDs or paths
                                                                   # or a full test suite
-Collector = Callable[[TestPath, Trigger], CollectorArtifact]
+MethodFilter = Callable[[str, str], bool]  # (class name, method name) -> collect or not
+Collector = Callable[[TestPath, Trigger, Optional[MethodFilter]], CollectorArtifact]
 
 __doc__ += """
 * `PathOrIdForWhatIf` = `List[str]`
 * `CollectorArtifact` = `Tuple[unittest.TestSuite, PathOrIdForWhatIf]`
-* `Collector` = `Callable[[TestPath, Trigger], CollectorArtifact]`
+* `MethodFilter` = `Callable[[str, str], bool]`
+* `Collector` = `Callable[[TestPath, Trigger, Optional[MethodFilter]], CollectorArtifact]`
 """
@@ -0,0 +1,85 @@
+"""
+JSON Lines stream of run events.
+
+Every event is written as a single JSON object on its own line and
+flushed straight away, so that dashboards and other tools can follow
+a run while it's in progress (e.g. by tailing the file) instead of
+parsing the XML reports once it's over.
+
+Events:
+
+* `collection_started`
+* `collection_finished` - `tests` (number of collected tests), `duration`
+* `test_started` - `test`, `kalash_id`
+* `test_finished` - `test`, `kalash_id`, `status` (`passed`, `failed`,
+  `error` or `skipped`), `duration`, `log` (path to the log file),
+  `attempts`, `resources` (see: `resources`)
+* `run_finished` - `tests`, `failures`, `errors`, `skipped`,
+  `return_code`, `duration`
+
+Each line also carries `event`, `time` (ISO timestamp) and `run`
+(an ID shared by all events of one run).
+"""
+__docformat__ = "google"
+
+from typing import Any, IO, Optional
+
+from .log import log_file
+
+import datetime
+import json
+import os
+import uuid
+
+
+class EventStream:
+    """Appends run events to a JSON Lines file.
+
+    An `EventStream` without a `path` swallows all events,
+    so callers don't need to check whether events are enabled.
+
+    Args:
+        path (Optional[str]): path to the `.jsonl` file, events are
+            appended if the file already exists
+        run_id (Optional[str]): ID of the run, a random one by default
+    """
+
+    def __init__(self, path: Optional[str] = None, run_id: Optional[str] = None):
+        self.path = path
+        self.run_id = run_id if run_id else uuid.uuid4().hex
+        self._file: Optional[IO[str]] = None
+        if path:
+            directory = os.path.dirname(os.path.abspath(path))
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def emit(self, event: str, **fields: Any):
+        """Writes and flushes a single event line.
+
+        Args:
+            event (str): name of the event
+            **fields (Any): JSON-serializable event payload
+        """
+        if not self._file:
+            return
+        line = dict(
+            event=event,
+            time=datetime.datetime.now().isoformat(timespec='milliseconds'),
+            run=self.run_id,
+            **fields
+        )
+        self._file.write(json.dumps(line, default=str) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def log_path(test) -> Optional[str]:
+    """Returns the log file path of a Kalash test, if it has
+    one (log files are only created once something is logged)."""
+    # not `logger`, which would create a logger for a test that never logged
+    return log_file(getattr(test, '_logger', None))
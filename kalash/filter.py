@@ -1,6 +1,6 @@
 __docformat__ = "google"
 
-from typing import Dict, Union
+from typing import Dict, List, Optional, Tuple, Union
 from unittest import TestSuite
 from functools import reduce
 
@@ -8,11 +8,16 @@ import warnings
 
 from .metaparser import iterable_or_scalar, parse_metadata_section, match_id
 from .last_result_filter import is_test_fail_or_error,\
-    is_test_pass, filter_for_result
+    is_test_pass, method_key, LastResultIndex
 from .config import (
-    ArbitraryYamlObj, Collector, CollectorArtifact,
-    Meta, OneOrList, TemplateVersion, Test, TestPath, Trigger)
+    ArbitraryYamlObj, Collector, CollectorArtifact, Meta,
+    MethodFilter, OneOrList, TemplateVersion, Test, TestPath, Trigger)
 from .kalash_test_loader import make_test_loader
+from .timings import COLLECTING, FILTERING, timed
+from .spec import TestSpec
+from .history import (DEFAULT_FLAKY_THRESHOLD, DEFAULT_FLAKY_WINDOW,
+                      NOK_STATUSES, OK_STATUSES, ResultHistory,
+                      flakiness, matches_last_result, parse_since)
 
 
 def dict_intersection(selected: ArbitraryYamlObj, parsed: ArbitraryYamlObj):
@@ -41,11 +46,116 @@ def dict_intersection(selected: ArbitraryYamlObj, parsed: ArbitraryYamlObj):
         return True
 
 
+def uses_history(test_collection_config: Test, spec: TestSpec) -> bool:
+    """Checks whether a `Test` block evaluates `last_result`
+    against the result history instead of the latest report."""
+    last_result = str(test_collection_config.last_result or '')
+    return last_result.lower() == spec.flaky.lower() or any(v is not None for v in (
+        test_collection_config.last_result_runs,
+        test_collection_config.last_result_count,
+        test_collection_config.last_result_since
+    ))
+
+
+def last_result_filter(
+    test_collection_config: Test,
+    single_test_path: str,
+    trigger: Trigger,
+    last_result_index: Optional[LastResultIndex] = None,
+    history: Optional[ResultHistory] = None
+) -> Tuple[List[bool], Optional[MethodFilter]]:
+    """
+    Evaluates the `last_result` filter of a `Test` block
+    for the methods of a single test file.
+
+    Args:
+        test_collection_config (Test): a single `Test` collection
+            config block
+        single_test_path (str): path to the test file
+        trigger (Trigger): `Trigger` master instance
+        last_result_index (Optional[LastResultIndex]): index of the
+            latest reports
+        history (Optional[ResultHistory]): result history, used when
+            the block sets any of the `last_result_*` options
+
+    Returns:
+        A tuple of (array of booleans as used in `apply_filters()`,
+            `MethodFilter` selecting the matching methods of the file),
+            the filter is `None` when `last_result` isn't set
+    """
+    selected_last_result = test_collection_config.last_result
+    if not selected_last_result:
+        return [], None
+    spec = trigger.cli_config.spec.test
+    if selected_last_result.lower() == spec.ok.lower():
+        check, statuses = is_test_pass, OK_STATUSES
+    elif selected_last_result.lower() == spec.nok.lower():
+        check, statuses = is_test_fail_or_error, NOK_STATUSES
+    elif selected_last_result.lower() == spec.flaky.lower():
+        check, statuses = None, ()
+    else:
+        raise ValueError(f"Last result should be {spec.ok}, {spec.nok}, "
+                         f"{spec.flaky} or None!")
+
+    if check and not uses_history(test_collection_config, spec):
+        if last_result_index is None:
+            # the filtering function must be aware of the location of reports
+            last_result_index = LastResultIndex(trigger.config.report).refresh()
+        selected = {
+            key: check(tags)
+            for key, tags in last_result_index.results_for_methods(single_test_path).items()
+        }
+    else:
+        selected = _history_filter(test_collection_config, single_test_path,
+                                   trigger, history, statuses)
+
+    if not selected:
+        # no recorded results of this test yet
+        return [False], None
+    # the file is collected if any of its methods matches
+    # and only the matching methods are added to the suite
+    return [any(selected.values())], lambda cls, name: selected.get(method_key(cls, name), False)
+
+
+def _history_filter(
+    test_collection_config: Test,
+    single_test_path: str,
+    trigger: Trigger,
+    history: Optional[ResultHistory],
+    statuses: Tuple[str, ...]
+) -> Dict[Tuple[str, str], bool]:
+    """Evaluates `last_result` against the result history
+    for every method of a test file, `FLAKY` if no `statuses`
+    are given."""
+    if history is None:
+        history = ResultHistory.in_report_dir(trigger.config.report)
+    since = test_collection_config.last_result_since
+    last_runs = test_collection_config.last_result_runs
+    if not statuses and last_runs is None:
+        last_runs = DEFAULT_FLAKY_WINDOW
+    results = history.results_for_file(
+        single_test_path,
+        last_runs=last_runs,
+        since=parse_since(since) if since else None
+    )
+    threshold = test_collection_config.flaky_threshold
+    if threshold is None:
+        threshold = DEFAULT_FLAKY_THRESHOLD
+    return {
+        method_key(test_id.rpartition('.')[0], rows[0][1] or test_id.rpartition('.')[2]):
+            matches_last_result(rows, statuses, test_collection_config.last_result_count)
+            if statuses else flakiness(row[2] for row in rows) >= threshold
+        for test_id, rows in results.items()
+    }
+
+
 def apply_filters(
     test_collection_config: Test,
     tests_directory: OneOrList[TestPath],
     collector_functions: Dict[TemplateVersion, Collector],
-    trigger: Trigger
+    trigger: Trigger,
+    last_result_index: Optional[LastResultIndex] = None,
+    history: Optional[ResultHistory] = None
 ) -> CollectorArtifact:
     """
     Main filtering function allowing testers to dynamically
@@ -61,6 +171,11 @@ def apply_filters(
             a map of `Collector` functions that are tied
             to particular versions of the test template
         trigger (Trigger): `Trigger` master instance
+        last_result_index (Optional[LastResultIndex]): index of the
+            report directory used by the `last_result` filter, shared
+            by all collected tests (see: `run.prepare_suite()`)
+        history (Optional[ResultHistory]): result history used by
+            the `last_result` filter, shared by all collected tests
 
     Returns:
         A `CollectorArtifact`.
@@ -110,22 +225,15 @@ def apply_filters(
         # Last result filter:
         # -----------------------------
 
-        # last result is expected to be OK or NOK
-        selected_last_result = test_collection_config.last_result
-        if selected_last_result:
-            if selected_last_result.lower() == cli_config.spec.test.ok.lower():
-                parsed_last_result = filter_for_result(is_test_pass)(
-                    single_test_path, trigger.config.report
-                )  # the filtering function must be aware of the location of reports
-            elif selected_last_result.lower() == cli_config.spec.test.nok.lower():
-                parsed_last_result = filter_for_result(is_test_fail_or_error)(
-                    single_test_path, trigger.config.report
-                )
-            else:
-                raise ValueError(f"Last result should be {cli_config.spec.test.ok} or "
-                                 f"{cli_config.spec.test.ok} or None!")
-        else:
-            parsed_last_result = []
+        # last result is expected to be OK, NOK or FLAKY
+        with timed(FILTERING, single_test_path):
+            parsed_last_result, method_filter = last_result_filter(
+                test_collection_config,
+                single_test_path,
+                trigger,
+                last_result_index,
+                history
+            )
 
         # -----------------------------
         # CALLBACK SWITCH:
@@ -145,20 +253,24 @@ def apply_filters(
         # MAIN FILTER BOOLEAN REDUCER:
         # -----------------------------
         try:
-            # create an array of booleans to reduce over, each represent a 'voice'
-            # of a filter saying whether the test should run:
-            run_this_test = [
-                # TODO: generic way of filtering without the need to specify separate filter tags
-                dict_intersection(
-                    _get_filterables(parsed_meta),
-                    _get_filterables(test_collection_config)
-                ),
-                match_id(parsed_meta.id, iterable_or_scalar(test_collection_config.id))
-            ] + parsed_last_result
+            with timed(FILTERING, single_test_path):
+                # create an array of booleans to reduce over, each represent a 'voice'
+                # of a filter saying whether the test should run:
+                run_this_test = [
+                    # TODO: generic way of filtering without the need
+                    #       to specify separate filter tags
+                    dict_intersection(
+                        _get_filterables(parsed_meta),
+                        _get_filterables(test_collection_config)
+                    ),
+                    match_id(parsed_meta.id, iterable_or_scalar(test_collection_config.id))
+                ] + parsed_last_result
+                selected = reduce(lambda x, y: x and y, run_this_test)
 
             # if all filters applied evaluate to true for a given test, run callback:
-            if reduce(lambda x, y: x and y, run_this_test):
-                return callback(single_test_path, trigger)
+            if selected:
+                with timed(COLLECTING, single_test_path):
+                    return callback(single_test_path, trigger, method_filter)
             else:
                 return TestSuite(), []
         except KeyError:
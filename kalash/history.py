@@ -0,0 +1,299 @@
+"""
+Result history of consecutive runs.
+
+Every run appends the outcome of each test to an SQLite database
+kept in the report directory (`kalash_history.sqlite`). The
+`last_result` filter of a `Test` block can then look at more
+than the latest report, e.g. select tests that failed at least
+twice in the last week:
+
+```yaml
+tests:
+  - path: './tests'
+    last_result: NOK
+    last_result_count: 2
+    last_result_since: 7d
+```
+
+Statuses stored in the history are `passed`, `failed`, `error`
+and `skipped` - the same ones as in the run events.
+
+The flakiness score of a test is the share of status changes
+(passed to failed or back) between consecutive runs within a
+window of its most recent runs: 0 for a test that always passes
+or always fails, 1 for a test that flips on every run. Tests
+scoring at least a threshold are selected by `last_result: FLAKY`
+and listed by `kalash stats flaky`.
+"""
+__docformat__ = "google"
+
+from itertools import groupby, islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import datetime
+import os
+import re
+import sqlite3
+import uuid
+
+HISTORY_FILE_NAME = 'kalash_history.sqlite'
+
+PASSED = 'passed'
+FAILED = 'failed'
+ERROR = 'error'
+SKIPPED = 'skipped'
+
+# statuses counting as `OK` and `NOK` in the `last_result` filter
+OK_STATUSES = (PASSED, SKIPPED)
+NOK_STATUSES = (FAILED, ERROR)
+
+DEFAULT_FLAKY_WINDOW = 10  # runs
+DEFAULT_FLAKY_THRESHOLD = 0.2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    run_id    TEXT NOT NULL,
+    test_id   TEXT NOT NULL,
+    file      TEXT,
+    method    TEXT,
+    status    TEXT NOT NULL,
+    duration  REAL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_file ON results (file, timestamp);
+CREATE INDEX IF NOT EXISTS results_test ON results (test_id, timestamp);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id);
+"""
+
+_PERIOD_RE = re.compile(r'^\s*(\d+)\s*([wdhm])\s*$')
+_PERIOD_UNITS = dict(w='weeks', d='days', h='hours', m='minutes')
+
+# (test_id, method, status, timestamp)
+HistoryRow = Tuple[str, str, str, str]
+
+
+def normalize_path(path: str) -> str:
+    """Normalizes a test file path the way it's stored in the history."""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def parse_since(since: str, now: Optional[datetime.datetime] = None) -> str:
+    """Turns a `last_result_since` value into an ISO timestamp.
+
+    Args:
+        since (str): either a period back from `now` (`30m`, `12h`,
+            `7d`, `2w`) or an ISO date/timestamp
+        now (Optional[datetime.datetime]): reference time, current
+            time by default
+
+    Returns:
+        ISO timestamp comparable with the stored ones
+    """
+    match = _PERIOD_RE.match(str(since))
+    if match:
+        now = now if now else datetime.datetime.now()
+        delta = datetime.timedelta(**{_PERIOD_UNITS[match.group(2)]: int(match.group(1))})
+        return (now - delta).replace(microsecond=0).isoformat()
+    try:
+        return datetime.datetime.fromisoformat(str(since)).replace(microsecond=0).isoformat()
+    except ValueError:
+        raise ValueError(
+            f"Invalid period {since}, use a number of minutes, hours, days "
+            "or weeks (e.g. `12h`, `7d`) or an ISO date"
+        )
+
+
+class ResultHistory:
+    """SQLite store of test results of consecutive runs.
+
+    Results are buffered by `add` and written in one transaction
+    by `flush`, so recording a run costs one commit.
+
+    Args:
+        path (str): path to the database file, created if needed
+        run_id (Optional[str]): ID of the run recorded through this
+            instance, a random one by default
+    """
+
+    def __init__(self, path: str, run_id: Optional[str] = None):
+        self.path = path
+        self.run_id = run_id if run_id else uuid.uuid4().hex
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(_SCHEMA)
+        self._pending: List[Tuple[str, str, Optional[str], Optional[str], str, float, str]] = []
+
+    @classmethod
+    def in_report_dir(cls, report_dir: str, run_id: Optional[str] = None) -> 'ResultHistory':
+        """Opens the history kept in a report directory."""
+        return cls(os.path.join(report_dir, HISTORY_FILE_NAME), run_id)
+
+    def add(
+        self,
+        test_id: str,
+        file: Optional[str],
+        method: Optional[str],
+        status: str,
+        duration: float,
+        timestamp: str
+    ):
+        """Buffers the result of a single test of this run."""
+        self._pending.append((
+            self.run_id,
+            test_id,
+            normalize_path(file) if file else None,
+            method,
+            status,
+            duration,
+            timestamp
+        ))
+
+    def flush(self):
+        """Writes buffered results to the database."""
+        if not self._pending:
+            return
+        with self._connection:
+            self._connection.executemany(
+                'INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?)', self._pending
+            )
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    def results_for_file(
+        self,
+        file: str,
+        last_runs: Optional[int] = None,
+        since: Optional[str] = None
+    ) -> Dict[str, List[HistoryRow]]:
+        """Returns recorded results of every test of a test file.
+
+        Args:
+            file (str): path to the test file
+            last_runs (Optional[int]): only return the results of
+                the `last_runs` most recent runs of each test
+            since (Optional[str]): only return results recorded at
+                or after this ISO timestamp
+
+        Returns:
+            Rows of every test ID, newest first
+        """
+        query = 'SELECT test_id, method, status, timestamp FROM results WHERE file = ?'
+        params: List[str] = [normalize_path(file)]
+        if since:
+            query += ' AND timestamp >= ?'
+            params.append(since)
+        query += ' ORDER BY timestamp DESC, rowid DESC'
+        results: Dict[str, List[HistoryRow]] = {}
+        for row in self._connection.execute(query, params):
+            rows = results.setdefault(row[0], [])
+            if last_runs is None or len(rows) < last_runs:
+                rows.append(row)
+        return results
+
+    def flakiness_scores(
+        self,
+        window: int = DEFAULT_FLAKY_WINDOW,
+        since: Optional[str] = None
+    ) -> Dict[str, Tuple[float, int]]:
+        """Computes flakiness scores of all tests in the history.
+
+        The whole table is read in a single scan ordered by the
+        `(test_id, timestamp)` index, so the cost stays linear in
+        the number of recorded results.
+
+        Args:
+            window (int): number of most recent runs of each
+                test the score is computed over
+            since (Optional[str]): only consider results recorded
+                at or after this ISO timestamp
+
+        Returns:
+            Tuples of (score, number of runs considered) by test ID
+        """
+        query = 'SELECT test_id, status FROM results'
+        params: List[str] = []
+        if since:
+            query += ' WHERE timestamp >= ?'
+            params.append(since)
+        query += ' ORDER BY test_id, timestamp DESC, rowid DESC'
+        scores: Dict[str, Tuple[float, int]] = {}
+        rows = self._connection.execute(query, params)
+        for test_id, test_rows in groupby(rows, key=lambda row: row[0]):
+            statuses = [status for _, status in islice(test_rows, window)]
+            scores[test_id] = (flakiness(statuses), len(statuses))
+        return scores
+
+
+def flakiness(statuses: Iterable[str]) -> float:
+    """Computes the flakiness score of a test.
+
+    Args:
+        statuses (Iterable[str]): statuses of consecutive runs of
+            the test, skipped runs are ignored
+
+    Returns:
+        Share of consecutive runs with a different outcome,
+            from 0 (stable) to 1 (flipping on every run)
+    """
+    outcomes = [status in NOK_STATUSES for status in statuses if status != SKIPPED]
+    if len(outcomes) < 2:
+        return 0.0
+    transitions = sum(1 for a, b in zip(outcomes, outcomes[1:]) if a != b)
+    return transitions / (len(outcomes) - 1)
+
+
+def flaky_tests(
+    history: ResultHistory,
+    window: Optional[int] = None,
+    threshold: Optional[float] = None,
+    since: Optional[str] = None
+) -> List[Tuple[str, float, int]]:
+    """Lists tests with a flakiness score of at least `threshold`.
+
+    Args:
+        history (ResultHistory): the result history
+        window (Optional[int]): number of most recent runs of each test
+            the score is computed over, `DEFAULT_FLAKY_WINDOW` if not given
+        threshold (Optional[float]): minimal score, `DEFAULT_FLAKY_THRESHOLD`
+            if not given
+        since (Optional[str]): only consider runs since a period back
+            in time or an ISO date (see: `parse_since()`)
+
+    Returns:
+        Tuples of (test ID, score, number of runs), most flaky first
+    """
+    window = DEFAULT_FLAKY_WINDOW if window is None else window
+    threshold = DEFAULT_FLAKY_THRESHOLD if threshold is None else threshold
+    scores = history.flakiness_scores(window, parse_since(since) if since else None)
+    return sorted(
+        [(test_id, score, runs) for test_id, (score, runs) in scores.items()
+         if score >= threshold],
+        key=lambda t: (-t[1], t[0])
+    )
+
+
+def matches_last_result(
+    rows: List[HistoryRow],
+    statuses: Tuple[str, ...],
+    count: Optional[int] = None
+) -> bool:
+    """Checks the recorded results of a single test.
+
+    Args:
+        rows (List[HistoryRow]): results of the test
+        statuses (Tuple[str, ...]): statuses searched for
+        count (Optional[int]): minimal number of matching results,
+            if not given all results have to match
+
+    Returns:
+        `True` if the test matches
+    """
+    matching = len([row for row in rows if row[2] in statuses])
+    if count is None:
+        return len(rows) > 0 and matching == len(rows)
+    return matching >= count
@@ -6,6 +6,7 @@ import unittest
 
 from .config import (Collector, CollectorArtifact,
                      OneOrList, PathOrIdForWhatIf, TestPath, Trigger)
+from .timings import WALKING, timed
 
 
 def make_test_loader(trigger: Trigger) -> Callable[
@@ -64,26 +65,27 @@ def make_test_loader(trigger: Trigger) -> Callable[
             paths = [paths]
 
         for path in paths:
-            if path.endswith(".py"):
-                # if it's a path to a single test, just run it
-                merger_suite, merger_identifiers = callback(path, trigger)
-                for test in merger_suite:
-                    suite.addTest(test)
-                identifiers.extend(merger_identifiers)
-            else:
-                try:
-                    if not trigger.cli_config.no_recurse:
-                        # default into recursive test grabbing
-                        for root, dirs, files in os.walk(path):
-                            for file in files:
+            with timed(WALKING, path):
+                if path.endswith(".py"):
+                    # if it's a path to a single test, just run it
+                    merger_suite, merger_identifiers = callback(path, trigger)
+                    for test in merger_suite:
+                        suite.addTest(test)
+                    identifiers.extend(merger_identifiers)
+                else:
+                    try:
+                        if not trigger.cli_config.no_recurse:
+                            # default into recursive test grabbing
+                            for root, dirs, files in os.walk(path):
+                                for file in files:
+                                    suite, identifiers = \
+                                        _handle_one_test(root, file, suite, identifiers)
+                        else:
+                            for file in os.listdir(path):
                                 suite, identifiers = \
-                                    _handle_one_test(root, file, suite, identifiers)
-                    else:
-                        for file in os.listdir(path):
-                            suite, identifiers = \
-                                _handle_one_test(path, file, suite, identifiers)
-                except NotADirectoryError:
-                    raise NotADirectoryError("The path must be a valid folder or .py file")
+                                    _handle_one_test(path, file, suite, identifiers)
+                    except NotADirectoryError:
+                        raise NotADirectoryError("The path must be a valid folder or .py file")
         return suite, identifiers
 
     return test_loader
@@ -1,10 +1,14 @@
+from __future__ import annotations
+
 __docformat__ = "google"
 
+from typing import Any, Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+
+import json
 import os
 import re
-import datetime
-
-from xml.etree import ElementTree
+import sys
 
 
 def is_test_result(xml_attribute):
@@ -29,6 +33,278 @@ is_test_fail_or_error = lambda x: is_test_result('failure')(x) or is_test_result
 is_test_pass = lambda attr_list: not is_test_fail_or_error(attr_list)
 
 
+# A single `testcase` read from a report:
+# (file attribute, classname, name, timestamp, child element tags)
+CaseResult = Tuple[str, str, str, str, List[str]]
+
+INDEX_FILE_NAME = '.kalash_last_result_index.json'
+
+# number of reports to read below which a process pool isn't worth starting
+PARALLEL_THRESHOLD = 32
+
+SPAWN_SAFE = False
+"""Whether the main module can be imported again by spawned worker
+processes without side effects. Set by the `kalash` command; a
+script calling `kalash.run.run()` at its top level would be run
+again in every worker, so reports are only parsed in parallel
+on platforms that fork unless this is set."""
+
+
+def process_xml_tree(path_to_xml: str) -> Optional[List[CaseResult]]:
+    """
+    Processes a single XML report and returns its `testcase` sections
+    if the report isn't spawned from `unittest._ErrorHolder`.
+
+    The report is read incrementally and every element is cleared
+    once it's been looked at, so that large `system-out` and
+    `system-err` payloads are never kept in memory all at once.
+
+    Args:
+        path_to_xml (str): path to a valid XML report
+
+    Returns:
+        List of `CaseResult` tuples, an empty list when `_ErrorHolder`
+            is encountered or `None` if the report can't be parsed
+    """
+    cases: List[CaseResult] = []
+    root = None
+    case = None
+    depth = 0
+    try:
+        for event, element in ElementTree.iterparse(path_to_xml, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth == 1:
+                    root = element
+                    if re.search(r'_ErrorHolder', element.attrib.get('name', '')):
+                        # parsing unittest._ErrorHolder cases is not supported
+                        return list()
+                elif depth == 2 and element.tag == 'testcase' and 'file' in element.attrib:
+                    case = (
+                        element.attrib['file'],
+                        element.attrib.get('classname', ''),
+                        element.attrib.get('name', ''),
+                        element.attrib.get('timestamp', ''),
+                        []
+                    )
+                elif depth == 3 and case:
+                    case[4].append(element.tag)
+                continue
+            depth -= 1
+            if depth == 1:
+                if case and element.tag == 'testcase':
+                    cases.append(case)
+                case = None
+                # drop the finished `testcase` together with its output
+                element.clear()
+                if root is not None:
+                    root.clear()
+            elif depth > 1:
+                element.clear()
+    except ElementTree.ParseError:
+        # reports of a run that crashed are not finalised
+        return None
+    return cases
+
+
+def _pool_context():
+    """Start method of the worker processes, `None` when workers
+    can't be started without importing the main module again."""
+    import multiprocessing
+    # forking is unsafe on macOS, where `spawn` is the default
+    if sys.platform != 'darwin' and 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    if SPAWN_SAFE:
+        return multiprocessing.get_context('spawn')
+    return None
+
+
+def _process_xml_trees(
+    paths: List[str],
+    workers: Optional[int]
+) -> List[Optional[List[CaseResult]]]:
+    """Processes reports with `process_xml_tree` on a pool of
+    processes if there are enough of them to make it worthwhile."""
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(paths) >= PARALLEL_THRESHOLD:
+        # multiprocessing is costly to import and rarely needed
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+        context = _pool_context()
+        if context is not None:
+            try:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                    return list(executor.map(
+                        process_xml_tree, paths, chunksize=max(len(paths) // (workers * 4), 1)
+                    ))
+            except (OSError, RuntimeError, BrokenProcessPool):
+                pass  # no processes available here, parse in this one
+    return [process_xml_tree(path) for path in paths]
+
+
+def _norm(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def method_key(classname: str, name: str) -> Tuple[str, str]:
+    """
+    Identifies a test method across runs by the name of its class
+    (without the module name, which depends on how the test file
+    was imported) and its name (without the subtest description).
+
+    Args:
+        classname (str): `classname` of a `testcase` or the ID
+            of a test without the method name
+        name (str): `name` of a `testcase` or a test method name
+
+    Returns:
+        A tuple of (class name, method name)
+    """
+    return classname.rpartition('.')[2], name.split(' ')[0]
+
+
+class LastResultIndex:
+    """
+    Index of the latest results of every test file found in
+    a report directory.
+
+    The `testcase` sections of all reports are read once and cached
+    on disk (in the report directory, keyed by report path, size and
+    modification time), so consecutive runs only read reports that
+    have appeared or changed since. Looking up the last result of
+    a test file is a dictionary lookup.
+
+    Reports that need reading are parsed in parallel on a pool
+    of processes when there are many of them.
+
+    Args:
+        reports_path (str): path to the reports folder
+        workers (Optional[int]): number of processes parsing reports,
+            the number of CPUs by default
+    """
+
+    def __init__(self, reports_path: str, workers: Optional[int] = None):
+        self.reports_path = os.path.abspath(reports_path)
+        self.workers = workers
+        self.cache_path = os.path.join(self.reports_path, INDEX_FILE_NAME)
+        self._reports: Dict[str, Dict[str, Any]] = {}
+        # normalized test file path -> (timestamp, report path)
+        self._latest_report: Dict[str, Tuple[str, str]] = {}
+        # normalized test file path -> `method_key` -> (timestamp, tags)
+        self._latest_cases: Dict[str, Dict[Tuple[str, str], Tuple[str, List[str]]]] = {}
+
+    def refresh(self) -> LastResultIndex:
+        """Reads reports that are new or have changed since the index
+        was last saved, forgets deleted ones and saves the index."""
+        self._load()
+        seen = set()
+        changed = False
+        to_read: List[Tuple[str, os.stat_result]] = []
+        for root, dirs, files in os.walk(self.reports_path):
+            for name in files:
+                if not name.endswith('.xml'):
+                    continue
+                report_path = os.path.join(root, name)
+                seen.add(report_path)
+                try:
+                    stat = os.stat(report_path)
+                except OSError:
+                    continue
+                cached = self._reports.get(report_path)
+                if cached and cached['mtime'] == stat.st_mtime and cached['size'] == stat.st_size:
+                    continue
+                to_read.append((report_path, stat))
+        parsed = _process_xml_trees([path for path, _ in to_read], self.workers)
+        for (report_path, stat), cases in zip(to_read, parsed):
+            if cases is None:
+                # not readable (yet), try again next time
+                self._reports.pop(report_path, None)
+                continue
+            self._reports[report_path] = dict(
+                mtime=stat.st_mtime, size=stat.st_size, cases=cases
+            )
+            changed = True
+        for report_path in set(self._reports) - seen:
+            del self._reports[report_path]
+            changed = True
+        if changed:
+            self._save()
+        self._build()
+        return self
+
+    def _load(self):
+        try:
+            with open(self.cache_path, 'r') as f:
+                self._reports = json.load(f)
+        except (OSError, ValueError):
+            self._reports = {}
+
+    def _save(self):
+        if not os.path.isdir(self.reports_path):
+            return
+        tmp_path = self.cache_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._reports, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            pass  # the index will simply be rebuilt next time
+
+    def _build(self):
+        self._latest_report = {}
+        self._latest_cases = {}
+        for report_path, report in self._reports.items():
+            for file, classname, name, timestamp, tags in report['cases']:
+                file = _norm(file)
+                latest = self._latest_report.get(file)
+                # on equal timestamps the report listed later wins
+                if not latest or timestamp >= latest[0]:
+                    self._latest_report[file] = (timestamp, report_path)
+                cases = self._latest_cases.setdefault(file, {})
+                key = method_key(classname, name)
+                latest_case = cases.get(key)
+                if latest_case and timestamp == latest_case[0]:
+                    # subtests of one method
+                    latest_case[1].extend(tags)
+                elif not latest_case or timestamp > latest_case[0]:
+                    cases[key] = (timestamp, list(tags))
+
+    def results_for_file(self, single_test_path: str) -> Optional[List[List[str]]]:
+        """Returns the child element tags of every `testcase` of
+        a test file in its most recent report, or `None` if the
+        file doesn't appear in any report."""
+        file = _norm(single_test_path)
+        latest = self._latest_report.get(file)
+        if not latest:
+            return None
+        return [
+            tags for f, _, _, _, tags in self._reports[latest[1]]['cases']
+            if _norm(f) == file
+        ]
+
+    def results_for_methods(self, single_test_path: str) -> Dict[Tuple[str, str], List[str]]:
+        """Returns the child element tags of the most recent `testcase`
+        of every test method of a test file by `method_key`. Methods
+        are looked up independently, so a method that has only been
+        re-run on its own still keeps its last result."""
+        return {
+            key: tags
+            for key, (_, tags) in self._latest_cases.get(_norm(single_test_path), {}).items()
+        }
+
+    def result_for_method(
+        self,
+        single_test_path: str,
+        classname: str,
+        name: str
+    ) -> Optional[List[str]]:
+        """Returns the child element tags of the most recent `testcase`
+        of a single test method or `None` if it's not in any report."""
+        cases = self._latest_cases.get(_norm(single_test_path), {})
+        latest = cases.get(method_key(classname, name))
+        return latest[1] if latest else None
+
+
 def filter_for_result(check_lr_tag_function):
     """
     Last result filtering function.
@@ -42,28 +318,7 @@ def filter_for_result(check_lr_tag_function):
         A closure function bound to specific "OK"/"NOK" `last_result`
     """
 
-    def process_xml_tree(path_to_xml):
-        """
-        Processes a single XML report and returns `testcase` section
-        if the report isn't spawned from `unittest._ErrorHolder`.
-
-        Args:
-            path_to_xml (str): path to a valid XMLRunner report
-
-        Returns:
-            List of XML Elements (xml.etree.ElementTree.Element)
-            or an empty list when `_ErrorHolder` is encountered
-        """
-        if str(path_to_xml).endswith('.xml'):
-            xml_tree = ElementTree.parse(path_to_xml)
-            xml_tree_root = xml_tree.getroot()
-            if re.search(r'_ErrorHolder', xml_tree_root.attrib['name']):
-                # parsing unittest._ErrorHolder cases is not supported
-                return list()
-            else:
-                return xml_tree_root.findall('testcase')
-
-    def closure(single_test_path, reports_path):
+    def closure(single_test_path, reports_path, index: Optional[LastResultIndex] = None):
         """
         Last result filtering closure.
 
@@ -72,41 +327,18 @@ def filter_for_result(check_lr_tag_function):
                 by the callback in `kalash`'s test loader
                 (see: `metaparser.apply_filters()`)
             reports_path (str): path to the reports folder
+            index (Optional[LastResultIndex]): index of the reports folder
+                shared by consecutive calls, built on the spot if not provided
 
         Returns:
             Array of booleans as used in `metaparser.apply_filters()`
         """
-        results = dict()
-        for root, dirs, files in os.walk(os.path.abspath(reports_path)):
-            for name in files:
-                single_report_path = os.path.join(root, name)
-                # extract all `testcase` sections from the XML:
-                test_cases = process_xml_tree(single_report_path)
-                if test_cases:
-                    for tc in test_cases:
-                        # record all underlying tags in XML tree
-                        result_tags = [child.tag for child in tc]
-                        file_path = tc.attrib['file']              # record file path
-                        # check the result tag in the report
-                        # (whether it is the one you want when filtering)
-                        # and if the file path is corresponding to the current test file:
-                        if (os.path.abspath(file_path) == os.path.abspath(single_test_path)):
-                            results[single_report_path] = \
-                                datetime.datetime.strptime(
-                                    tc.attrib['timestamp'], "%Y-%m-%dT%H:%M:%S")
-        try:
-            last_report_path = [k for k, _ in sorted(results.items(), key=lambda x: x[1])][-1]
-            test_cases_that_pass_predicate = []
-            test_cases = process_xml_tree(last_report_path)
-            if test_cases:
-                for tc in test_cases:
-                    result_tags = [child.tag for child in tc]
-                    test_cases_that_pass_predicate.append(check_lr_tag_function(result_tags))
-        except (KeyError, IndexError):
-            # when key error or IndexError encountered
-            # it means that the folder contains no reports yet
-            test_cases_that_pass_predicate = [False]
-
-        return test_cases_that_pass_predicate
+        if index is None:
+            index = LastResultIndex(reports_path).refresh()
+        results = index.results_for_file(single_test_path)
+        if not results:
+            # the folder contains no reports for this test yet
+            return [False]
+        return [check_lr_tag_function(result_tags) for result_tags in results]
 
     return closure
@@ -2,25 +2,439 @@ __docformat__ = "google"
 
 import os
 import sys
+import json
+import gzip
+import queue
+import shutil
 import logging
-from typing import List, Optional, Set, Union, Callable
+import threading
+import logging.handlers
+import datetime
+from dataclasses import dataclass, field
+from typing import Dict, IO, List, Optional, Union, Callable
 
 from .utils import get_ts
 from .config import CliConfig, Meta, OneOrList
+from .log_index import LOG_INDEX_FILE_NAME, LogIndex
 
 PathType = Union[os.PathLike, str]
 
-_LOGGERS: Set[logging.Logger] = set()
 
-HANDLERS: List[Callable[..., logging.Handler]] = [lambda n: logging.FileHandler(n)]
+def _gzip_file(source: str, dest: str):
+    """Appends a gzip member with the contents of `source`
+    to `dest` and removes `source`."""
+    with open(source, 'rb') as f_in, gzip.open(dest, 'ab') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
 
 
-def _get_logger_from_state(logger_name: str) -> Optional[logging.Logger]:
-    loggers = list(filter(lambda l: l.name == logger_name, _LOGGERS))
-    if len(loggers) > 0:
-        return loggers[0]
+class LazyFileHandler(logging.handlers.RotatingFileHandler):
+    """`FileHandler` that creates its log file (and the directories
+    leading to it) on the first record, so tests that never log
+    leave no empty log files behind and hold no file handles.
+    Its file can be closed between tests with `suspend` and is
+    reopened for appending on the next record.
+
+    Once the log file reaches `max_bytes` it's rotated to `.1`,
+    `.2`, ... up to `backups` files (gzipped with `compress`),
+    or started over if there are no backups. With `compress` the
+    log file itself is gzipped when the handler is closed. The
+    live log file always holds the latest records uncompressed
+    (see: `read_tail`).
+
+    Args:
+        filename (PathType): path to the log file
+        max_bytes (Optional[int]): size of the log file rotated,
+            `None` or 0 for no limit
+        backups (int): number of rotated files kept
+        compress (bool): gzip rotated and closed log files
+    """
+
+    def __init__(self, filename: PathType, max_bytes: Optional[int] = None,
+                 backups: int = 1, compress: bool = False):
+        super().__init__(filename, delay=True)
+        self.configure(max_bytes, backups, compress)
+
+    def configure(self, max_bytes: Optional[int], backups: int, compress: bool):
+        """Sets the size limit, number of backups and compression."""
+        self.maxBytes = max_bytes if max_bytes else 0
+        self.backupCount = backups
+        self.compress = compress
+        self.namer = (lambda name: name + '.gz') if compress else None
+        self.rotator = _gzip_file if compress else None
+
+    def _open(self):
+        _create_tree_if_not_exists(os.path.dirname(self.baseFilename))
+        return super()._open()
+
+    def doRollover(self):  # noqa: N802 `logging` API
+        if self.backupCount > 0:
+            return super().doRollover()
+        # no backups to rotate to, start over
+        if self.stream:
+            self.stream.close()
+        self.stream = open(self.baseFilename, 'w', encoding=self.encoding)
+
+    def close(self):
+        super().close()
+        if self.compress and os.path.isfile(self.baseFilename):
+            _gzip_file(self.baseFilename, self.baseFilename + '.gz')
+
+    def suspend(self):
+        """Closes the log file until the next record arrives."""
+        self.acquire()
+        try:
+            if self.stream:
+                self.flush()
+                self.stream.close()
+                self.stream = None
+        finally:
+            self.release()
+
+
+HANDLERS: List[Callable[..., logging.Handler]] = [lambda n: LazyFileHandler(n)]
+
+# attributes of every `LogRecord`, anything else was passed in `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonLinesHandler(logging.FileHandler):
+    """Writes records as JSON lines (see: `kalash.log_index`) and
+    adds the byte range written while a test was running to the
+    log index once the test finishes (see: `suspend`). Like
+    `LazyFileHandler` it only creates its file on the first record.
+
+    Args:
+        filename (PathType): path to the `.jsonl` file
+        test_id (Optional[str]): ID of the test written to every line
+        index_path (Optional[str]): path to the log index database,
+            no index is kept if not given
+        run_id (Optional[str]): ID of the run written to every line
+    """
+
+    def __init__(
+        self,
+        filename: PathType,
+        test_id: Optional[str] = None,
+        index_path: Optional[str] = None,
+        run_id: Optional[str] = None
+    ):
+        super().__init__(filename, delay=True, encoding='utf-8')
+        self.test_id = test_id
+        self.index_path = index_path
+        self.run_id = run_id
+        self._start = 0
+        self._class_name: Optional[str] = None
+        self._first_time: Optional[str] = None
+        self._last_time: Optional[str] = None
+        self._max_level = logging.NOTSET
+
+    def _open(self):
+        _create_tree_if_not_exists(os.path.dirname(self.baseFilename))
+        self._start = os.path.getsize(self.baseFilename) if os.path.exists(self.baseFilename) else 0
+        return super()._open()
+
+    def format(self, record: logging.LogRecord) -> str:
+        line: Dict[str, object] = dict(
+            time=datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            run=self.run_id,
+            test=self.test_id,
+            level=record.levelname,
+            message=record.getMessage()
+        )
+        line['class'] = record.name
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        if record.exc_text:
+            line['exc'] = record.exc_text
+        extra = {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRIBUTES}
+        if extra:
+            line['extra'] = extra
+        return json.dumps(line, default=str)
+
+    def emit(self, record: logging.LogRecord):
+        super().emit(record)
+        time = datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds')
+        if self._first_time is None:
+            self._first_time = time
+        self._last_time = time
+        self._class_name = record.name
+        self._max_level = max(self._max_level, record.levelno)
+
+    def _index_segment(self):
+        if self.stream:
+            self.flush()
+            self.stream.close()
+            self.stream = None
+        if self._first_time is None or not self._last_time or not self.index_path:
+            return
+        index = LogIndex(self.index_path)
+        try:
+            index.add(
+                self.run_id, self.test_id, self._class_name, self.baseFilename,
+                self._start, os.path.getsize(self.baseFilename),
+                self._first_time, self._last_time, self._max_level
+            )
+        finally:
+            index.close()
+        self._first_time = self._last_time = None
+        self._max_level = logging.NOTSET
+
+    def suspend(self):
+        """Closes the file and indexes what's been written since
+        it was opened, until the next record arrives."""
+        self.acquire()
+        try:
+            self._index_segment()
+        finally:
+            self.release()
+
+    def close(self):
+        self.suspend()
+        super().close()
+
+
+def read_tail(path: PathType, size: int = 64 * 1024) -> str:
+    """Reads the last `size` bytes of a log file, decompressing
+    it first if it's been gzipped.
+
+    Args:
+        path (PathType): path to a `.log` or `.log.gz` file
+        size (int): number of bytes to read
+
+    Returns:
+        The end of the log
+    """
+    if str(path).endswith('.gz'):
+        tail = b''
+        with gzip.open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(size), b''):
+                tail = (tail + chunk)[-size:]
     else:
-        return None
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - size, 0))
+            tail = f.read()
+    return tail.decode('utf-8', errors='replace')
+
+
+class ConsoleSink(logging.Handler):
+    """Console handler shared by all Kalash loggers echoing to STDOUT.
+
+    Without a `rate` lines are written straight away. With a `rate`
+    set, lines above `rate` per second (with bursts of up to one
+    second worth of lines) are left out and the echoed ones are
+    written in batches: when `batch_size` lines are waiting, at the
+    latest `batch_interval` seconds after the first of them, or on
+    `flush`. The file logs are not affected. Left-out lines are
+    counted per logger and summarized by `flush_console` once
+    a test finishes.
+
+    Args:
+        stream (Optional[IO[str]]): console stream, `sys.stdout`
+            at the time of writing by default (so that redirections
+            of STDOUT apply to the echoed lines too)
+        rate (Optional[int]): maximal number of lines per second,
+            `None` for no limit
+        batch_size (int): number of lines written at once
+        batch_interval (float): maximal delay of a line, in seconds
+    """
+
+    def __init__(self, stream: Optional[IO[str]] = None, rate: Optional[int] = None,
+                 batch_size: int = 64, batch_interval: float = 0.2):
+        super().__init__()
+        self.stream = stream
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.suppressed: Dict[str, int] = {}
+        self._lines: List[str] = []
+        self._timer: Optional[threading.Timer] = None
+        self.rate: Optional[int] = None
+        self._tokens = 0.0
+        self._last_refill: Optional[float] = None
+        self.set_rate(rate)
+
+    def set_rate(self, rate: Optional[int]):
+        rate = rate if rate else None
+        if rate != self.rate:
+            self.rate = rate
+            self._tokens = float(rate) if rate else 0.0
+            self._last_refill = None
+
+    def _allow(self, now: float) -> bool:
+        if not self.rate:
+            return True
+        if self._last_refill is not None:
+            self._tokens = min(float(self.rate),
+                               self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            if not self._allow(record.created):
+                self.suppressed[record.name] = self.suppressed.get(record.name, 0) + 1
+                return
+            self._lines.append(self.format(record))
+            if not self.rate or len(self._lines) >= self.batch_size:
+                self._write()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.batch_interval, self.flush)
+                self._timer.name = 'kalash-console-flush'
+                self._timer.daemon = True
+                self._timer.start()
+        except Exception:
+            self.handleError(record)
+
+    def _write(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._lines:
+            stream = self.stream if self.stream is not None else sys.stdout
+            stream.write('\n'.join(self._lines) + '\n')
+            stream.flush()
+            self._lines = []
+
+    def flush(self):
+        self.acquire()
+        try:
+            self._write()
+        finally:
+            self.release()
+
+    def summarize(self, logger_name: str):
+        """Writes out waiting lines and a summary of lines of
+        a logger left out since the last summary."""
+        self.acquire()
+        try:
+            suppressed = self.suppressed.pop(logger_name, 0)
+            if suppressed:
+                self._lines.append(
+                    f"[{suppressed} log lines of {logger_name} not echoed "
+                    f"(limit is {self.rate} lines per second), see the log file]"
+                )
+            self._write()
+        finally:
+            self.release()
+
+
+_CONSOLE = ConsoleSink()
+
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP = 'drop'
+
+
+@dataclass
+class _RegisteredLogger:
+    """A logger managed by Kalash together with the handlers
+    it owns and the number of its users. In the asynchronous mode
+    only `queue_handler` is attached to the logger and `handlers`
+    are called by the background listener."""
+    logger: logging.Logger
+    handlers: List[logging.Handler] = field(default_factory=list)
+    refs: int = 0
+    queue_handler: Optional[logging.Handler] = None
+
+
+# logger name -> registered logger
+_LOGGERS: Dict[str, _RegisteredLogger] = {}
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """`QueueHandler` for a bounded queue, applying the overflow
+    policy when the queue is full. Only the message itself is
+    rendered in the calling thread, formatting is left to the
+    handlers called by the listener."""
+
+    def __init__(self, log_queue: queue.Queue, overflow: str):
+        super().__init__(log_queue)
+        self.overflow = overflow
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # arguments may change once the call has returned
+        # and tracebacks keep whole frames alive:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.overflow == OVERFLOW_BLOCK:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    """Single background thread formatting and writing the records
+    of all Kalash loggers with the handlers registered for them."""
+
+    def handle(self, record: logging.LogRecord):
+        registered = _LOGGERS.get(record.name)
+        if registered:
+            for handler in registered.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def enqueue_sentinel(self):
+        # `put_nowait` raises `queue.Full` on a full bounded queue,
+        # wait for the listener to make room instead
+        self.queue.put(self._sentinel)
+
+
+class _AsyncSink:
+    """The bounded queue shared by all Kalash loggers in the
+    asynchronous mode and its listener thread."""
+
+    def __init__(self, maxsize: int, overflow: str):
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP):
+            raise ValueError(
+                f"Log overflow policy should be {OVERFLOW_BLOCK} or {OVERFLOW_DROP}, "
+                f"not {overflow}"
+            )
+        self.queue: queue.Queue = queue.Queue(maxsize)
+        self.handler = _QueueHandler(self.queue, overflow)
+        self.listener = _QueueListener(self.queue)
+        self.listener.start()
+
+    def flush(self):
+        """Waits until every queued record has been written."""
+        self.queue.join()
+
+    def stop(self) -> int:
+        """Writes the remaining records and stops the listener.
+
+        Returns:
+            Number of records dropped because the queue was full
+        """
+        self.flush()
+        self.listener.stop()
+        return self.handler.dropped
+
+
+_ASYNC_SINK: Optional[_AsyncSink] = None
+
+
+def _async_sink(config: CliConfig) -> _AsyncSink:
+    global _ASYNC_SINK
+    if _ASYNC_SINK is None:
+        _ASYNC_SINK = _AsyncSink(config.log_queue_size, config.log_overflow)
+    return _ASYNC_SINK
+
+
+def _get_logger_from_state(logger_name: str) -> Optional[logging.Logger]:
+    registered = _LOGGERS.get(logger_name)
+    return registered.logger if registered else None
 
 
 def _create_tree_if_not_exists(path: PathType) -> None:
@@ -70,11 +484,12 @@ def _make_log_tree_from_id(
 
 def _make_trunk(
     log_name: PathType,
-    log_base_path: Optional[PathType] = None
+    log_base_path: Optional[PathType] = None,
+    create: bool = True
 ):
     """Creates a trunk directory structure
-    for the logs if it does not exist, returns
-    the path to a concrete log file.
+    for the logs if it does not exist (unless `create`
+    is `False`), returns the path to a concrete log file.
     """
     if log_base_path:
         log_path = os.path.join(
@@ -89,7 +504,8 @@ def _make_trunk(
         )
 
     # create the trunk part (don't touch the log file name)
-    _create_tree_if_not_exists(os.path.dirname(log_path))
+    if create:
+        _create_tree_if_not_exists(os.path.dirname(log_path))
 
     # return the full path with `.log` to the caller
     return log_path + '.log'
@@ -100,12 +516,14 @@ def _make_tree(
     class_name: str,
     meta: Meta,
     log_base_path: Optional[PathType] = None,
-    groupby: str = None
+    groupby: str = None,
+    create: bool = True
 ):
     """Combines `_make_trunk_` with `_make_log_tree_from_id`."""
     return _make_trunk(
         _make_log_tree_from_id(id, class_name, meta, groupby=groupby),
-        log_base_path
+        log_base_path,
+        create
     )
 
 
@@ -113,35 +531,53 @@ def _register_logger(
     logger_name: str,
     log_handlers: List[logging.Handler],
     log_level: int,
-    log_format: logging.Formatter
+    log_format: logging.Formatter,
+    sink: Optional[_AsyncSink] = None
 ) -> Optional[logging.Logger]:
     """
-    Creates and registers logger instances.
+    Creates and registers logger instances. Registering a logger
+    name twice is a no-op: the handlers passed the second time
+    are closed instead of being attached next to the first ones.
+    With a `sink` the logger only enqueues records and the
+    handlers are called from the sink's listener thread.
     """
+    if logger_name in _LOGGERS:
+        for log_handler in log_handlers:
+            log_handler.close()
+        # return `None` if logger already existed!
+        return None
+
     logger = logging.getLogger(logger_name)
     logger.setLevel(log_level)
 
     for log_handler in log_handlers:
         log_handler.setFormatter(log_format)
-        logger.addHandler(log_handler)
+        if not sink:
+            logger.addHandler(log_handler)
 
-    if logger.name not in [l.name for l in _LOGGERS]:  # noqa: E741
-        _LOGGERS.add(logger)
-        return logger
-    # return `None` if logger already existed!
-    return None
+    registered = _RegisteredLogger(logger, list(log_handlers))
+    if sink:
+        registered.queue_handler = sink.handler
+        logger.addHandler(sink.handler)
+    _LOGGERS[logger_name] = registered
+    return logger
 
 
 def register_logger(
     logger_name: str,
     log_file_path: str,
-    config: CliConfig
+    config: CliConfig,
+    test_id: Optional[str] = None
 ) -> Optional[logging.Logger]:
     """
     Creates and registers logger instances.
     Declares default path handlers and if `no_log_echo`
     is `False` (default) a STDOUT handler will be added
     so all log calls will be echoed to the calling console.
+    If `log_async` is set, the handlers are fed from a background
+    thread (see: `close_all`). If `log_json` is set, records are
+    also written as JSON lines next to the log file and indexed
+    in the log base directory (see: `kalash.log_index`).
 
     Args:
         logger_name (str): class name that becomes the unique
@@ -152,22 +588,37 @@ def register_logger(
         config (CliConfig): a `CliConfig` instance representing
             the configuration that the application user
             provided via the CLI
+        test_id (Optional[str]): test ID written to the JSON lines
 
     Return:
         `logging.Logger` instance if a new logger instance
             has been created. `None` if the logger instance
             already existed for this particular `logger_name`
     """
+    if logger_name in _LOGGERS:
+        return None
     handlers = [f(log_file_path) for f in HANDLERS]
+    for handler in handlers:
+        if isinstance(handler, LazyFileHandler):
+            handler.configure(config.log_max_bytes, config.log_backups, config.log_compress)
+    if config.log_json:
+        handlers.append(JsonLinesHandler(
+            os.path.splitext(log_file_path)[0] + '.jsonl',
+            test_id,
+            os.path.join(config.log_dir or '.', LOG_INDEX_FILE_NAME),
+            config.run_id
+        ))
     if not config.no_log_echo:
-        # extend with a console handler piping to STDOUT
+        # extend with the console handler piping to STDOUT
         # (`logging` uses STDERR by default)
-        handlers += [logging.StreamHandler(sys.stdout)]
+        _CONSOLE.set_rate(config.log_echo_rate)
+        handlers += [_CONSOLE]
     return _register_logger(
         logger_name,
         handlers,
         config.log_level,
-        logging.Formatter(config.log_format)
+        logging.Formatter(config.log_format),
+        _async_sink(config) if config.log_async else None
     )
 
 
@@ -180,6 +631,11 @@ def get(
     """Creates or returns an existing `logging.Logger` instance
     associated with a particular `class_name`.
 
+    Every call takes a reference to the logger, which has to be
+    given back with `release` once the caller is done with it.
+    The log file and its directories are only created once
+    the logger is used for the first time.
+
     Args:
         id (str): unique ID of the test
         class_name (str): name of the test class
@@ -190,18 +646,106 @@ def get(
     Returns:
         Associated `logging.Logger` instance
     """
-    path = _make_tree(id, class_name, meta, config.log_dir, config.group_by)
+    registered = _LOGGERS.get(class_name)
+    if not registered:
+        path = _make_tree(id, class_name, meta, config.log_dir, config.group_by, create=False)
+        if not register_logger(class_name, path, config, id):
+            raise ValueError(f"Logger not registered correctly! {class_name}")
+        registered = _LOGGERS[class_name]
+    registered.refs += 1
+    return registered.logger
 
-    l = _get_logger_from_state(class_name)  # noqa: E741
 
-    if not l:
-        new_logger = register_logger(class_name, path, config)
-        if not new_logger:
-            raise ValueError(f"Logger not registered correctly! {class_name}")
-        else:
-            return new_logger
-    else:
-        return l
+def suspend(logger: logging.Logger):
+    """
+    Closes the files opened by the handlers of a `logger` without
+    closing the logger itself, they're reopened (for appending)
+    as soon as the logger is used again. Used between tests so
+    that file handles are only held while a test is running.
+
+    Args:
+        logger (logging.Logger): the `logging.Logger` instance
+    """
+    registered = _LOGGERS.get(logger.name)
+    if registered and registered.queue_handler and _ASYNC_SINK:
+        _ASYNC_SINK.flush()
+    handlers = registered.handlers if registered else logger.handlers
+    for h in handlers:
+        if isinstance(h, (LazyFileHandler, JsonLinesHandler)):
+            h.suspend()
+
+
+def open_files(logger: Optional[logging.Logger]) -> int:
+    """
+    Number of log files of a `logger` currently open, they stay
+    open until the logger is suspended after its test.
+
+    Args:
+        logger (Optional[logging.Logger]): the `logging.Logger` instance
+    """
+    if logger is None:
+        return 0
+    registered = _LOGGERS.get(logger.name)
+    handlers = registered.handlers if registered else logger.handlers
+    return sum(
+        1 for h in handlers
+        if isinstance(h, (LazyFileHandler, JsonLinesHandler)) and h.stream
+    )
+
+
+def log_file(logger: Optional[logging.Logger]) -> Optional[str]:
+    """
+    Path to the log file of a `logger`, if it has been created
+    (log files are only created once something is logged). With
+    asynchronous logging the queued records are written first.
+
+    Args:
+        logger (Optional[logging.Logger]): the `logging.Logger` instance
+    """
+    if logger is None:
+        return None
+    registered = _LOGGERS.get(logger.name)
+    if registered and registered.queue_handler and _ASYNC_SINK:
+        _ASYNC_SINK.flush()
+    handlers = registered.handlers if registered else logger.handlers
+    for h in handlers:
+        path = getattr(h, 'baseFilename', None)
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+def flush_console(logger: logging.Logger):
+    """
+    Writes out the console echo of a `logger` waiting to be
+    written, together with the number of lines left out by the
+    rate limit. Called when a test finishes.
+
+    Args:
+        logger (logging.Logger): the `logging.Logger` instance
+    """
+    registered = _LOGGERS.get(logger.name)
+    if registered and _CONSOLE in registered.handlers:
+        if registered.queue_handler and _ASYNC_SINK:
+            _ASYNC_SINK.flush()
+        _CONSOLE.summarize(logger.name)
+
+
+def release(logger: Union[str, logging.Logger]):
+    """
+    Gives back a reference taken by `get`. The logger is closed
+    once its last reference has been given back.
+
+    Args:
+        logger (Union[str, logging.Logger]): the `logging.Logger`
+            instance or its name
+    """
+    name = logger if type(logger) is str else getattr(logger, 'name', None)
+    registered = _LOGGERS.get(name) if name else None
+    if registered:
+        registered.refs -= 1
+        if registered.refs <= 0:
+            close(registered.logger)
 
 
 def close(logger: Union[str, logging.Logger]):
@@ -217,29 +761,49 @@ def close(logger: Union[str, logging.Logger]):
     Returns: `None`
     """
     if type(logger) is str:
-        l = _get_logger_from_state(logger)  # noqa: E741
-    elif type(logger) is logging.Logger:
-        l = logger  # noqa: E741
+        name = logger
+    elif isinstance(logger, logging.Logger):
+        name = logger.name
     else:
         raise NameError(
             f'{logger} is not a logger, nor a logger name! '
             'Make sure you use a string or logger instance '
             'with this method.'
         )
-    if l:
-        for h in l.handlers:
-            h.close()
-            l.removeHandler(h)
-        try:
-            _LOGGERS.remove(l)
-        except KeyError:
-            pass
+    registered = _LOGGERS.get(name)
+    if registered:
+        if registered.queue_handler:
+            registered.logger.removeHandler(registered.queue_handler)
+            if _ASYNC_SINK:
+                # write out what's been logged so far
+                _ASYNC_SINK.flush()
+        del _LOGGERS[name]
+        for h in registered.handlers:
+            if h is _CONSOLE:
+                # shared by all loggers, only flushed
+                h.summarize(name)
+            else:
+                h.close()
+            registered.logger.removeHandler(h)
 
 
 def close_all():
     """
     Forces all loggers to perform a managed `shutdown`.
     Should always be called by the method/function
-    running the Kalash tests.
+    running the Kalash tests. In the asynchronous mode
+    all queued log records are written out first.
     """
+    global _ASYNC_SINK
+    if _ASYNC_SINK:
+        for registered in _LOGGERS.values():
+            if registered.queue_handler:
+                registered.logger.removeHandler(registered.queue_handler)
+                registered.queue_handler = None
+        dropped = _ASYNC_SINK.stop()
+        _ASYNC_SINK = None
+        if dropped:
+            print(f"{dropped} log records were dropped, the log queue was full")
+    for name in list(_LOGGERS):
+        close(name)
     logging.shutdown()
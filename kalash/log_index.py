@@ -0,0 +1,236 @@
+"""
+Index of structured (JSON Lines) logs across runs.
+
+With `--log-json` every Kalash logger also writes its records as
+JSON lines (`.jsonl` next to the `.log` file, see:
+`kalash.log.JsonLinesHandler`). Each line holds `time`, `run`,
+`test` (the test ID), `class`, `level`, `message`, `exc` (when
+an exception was logged) and `extra` (fields passed with
+`logger.info(..., extra={...})`).
+
+Whenever a test finishes, the byte range it wrote to the `.jsonl`
+file is added to an SQLite index in the log base directory
+(`kalash_log_index.sqlite`), together with its run, test ID,
+class, time range and highest level. `search_logs` and the
+`kalash logs` command use the index to only read the ranges
+that can match, e.g. all errors of `ECU_A` tests in the last week:
+
+```bash
+kalash logs -ld ./logs -i 'ECU_A*' -l ERROR -s 7d
+```
+"""
+__docformat__ = "google"
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import json
+import logging
+import os
+import re
+import sqlite3
+
+from .history import parse_since
+
+LOG_INDEX_FILE_NAME = 'kalash_log_index.sqlite'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    run_id     TEXT,
+    test_id    TEXT,
+    class      TEXT,
+    file       TEXT NOT NULL,
+    start      INTEGER NOT NULL,
+    end        INTEGER NOT NULL,
+    first_time TEXT NOT NULL,
+    last_time  TEXT NOT NULL,
+    max_level  INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_test ON segments (test_id, last_time);
+CREATE INDEX IF NOT EXISTS segments_time ON segments (last_time);
+CREATE INDEX IF NOT EXISTS segments_run ON segments (run_id);
+"""
+
+# (file, start, end)
+Segment = Tuple[str, int, int]
+
+# length of an ISO timestamp without fractions of a second
+_SECONDS = len('2000-01-01T00:00:00')
+
+
+def parse_level(level: Union[int, str]) -> int:
+    """Turns a level name (`ERROR`) or number (`40`) into a number."""
+    if isinstance(level, int) or str(level).isdigit():
+        return int(level)
+    number = logging.getLevelName(str(level).upper())
+    if not isinstance(number, int):
+        raise ValueError(f"Unknown log level {level}")
+    return number
+
+
+class LogIndex:
+    """SQLite index of byte ranges of structured log files.
+
+    Args:
+        path (str): path to the database file, created if needed
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(_SCHEMA)
+
+    @classmethod
+    def in_log_dir(cls, log_dir: str) -> 'LogIndex':
+        """Opens the index kept in a log base directory."""
+        return cls(os.path.join(log_dir, LOG_INDEX_FILE_NAME))
+
+    def add(
+        self,
+        run_id: Optional[str],
+        test_id: Optional[str],
+        class_name: Optional[str],
+        file: str,
+        start: int,
+        end: int,
+        first_time: str,
+        last_time: str,
+        max_level: int
+    ):
+        """Adds the byte range `[start, end)` of a `.jsonl` file."""
+        with self._connection:
+            self._connection.execute(
+                'INSERT INTO segments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                # the first time is kept to the second, so that ranges
+                # starting within the second given as `until` match too
+                (run_id, test_id, class_name, os.path.abspath(file),
+                 start, end, first_time[:_SECONDS], last_time, max_level)
+            )
+
+    def close(self):
+        self._connection.close()
+
+    def segments(
+        self,
+        test_id: Optional[str] = None,
+        level: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        run_id: Optional[str] = None
+    ) -> List[Segment]:
+        """Returns byte ranges that may hold matching records.
+
+        Args:
+            test_id (Optional[str]): test ID, may contain `*` and `?`
+                wildcards
+            level (Optional[int]): minimal level
+            since (Optional[str]): ISO timestamp of the earliest record
+            until (Optional[str]): ISO timestamp of the latest record
+            run_id (Optional[str]): ID of the run
+
+        Returns:
+            (file, start, end) tuples in the order they were written
+        """
+        conditions: List[str] = []
+        params: List[Any] = []
+        for condition, value in (
+            ('test_id GLOB ?', test_id),
+            ('max_level >= ?', level),
+            ('last_time >= ?', since),
+            ('first_time <= ?', until),
+            ('run_id = ?', run_id),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        query = 'SELECT file, start, end FROM segments'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY first_time, rowid'
+        return list(self._connection.execute(query, params))
+
+
+def _record_level(record: Dict[str, Any]) -> int:
+    number = logging.getLevelName(record.get('level'))
+    return number if isinstance(number, int) else 0
+
+
+def _read_segment(segment: Segment) -> Iterator[Dict[str, Any]]:
+    file, start, end = segment
+    try:
+        with open(file, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+    except OSError:
+        # logs cleaned up since they were indexed
+        return
+    for line in data.splitlines():
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+
+def search_logs(
+    log_dir: str,
+    test_id: Optional[str] = None,
+    level: Optional[Union[int, str]] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    run_id: Optional[str] = None,
+    pattern: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """Finds structured log records across all indexed runs.
+
+    Args:
+        log_dir (str): log base directory holding the index
+        test_id (Optional[str]): test ID, may contain `*` and `?`
+            wildcards
+        level (Optional[Union[int, str]]): minimal level, a name
+            or a number
+        since (Optional[str]): a period back in time (e.g. `7d`)
+            or an ISO date (see: `kalash.history.parse_since`)
+        until (Optional[str]): same as `since`, for the latest record
+        run_id (Optional[str]): ID of the run
+        pattern (Optional[str]): regular expression searched for
+            in the messages
+
+    Yields:
+        Matching records as dictionaries
+    """
+    levelno = parse_level(level) if level is not None else None
+    since = parse_since(since) if since else None
+    until = parse_since(until) if until else None
+    regex = re.compile(pattern) if pattern else None
+    index = LogIndex.in_log_dir(log_dir)
+    try:
+        segments = index.segments(test_id, levelno, since, until, run_id)
+    finally:
+        index.close()
+    for segment in segments:
+        for record in _read_segment(segment):
+            if levelno is not None and _record_level(record) < levelno:
+                continue
+            if since and record.get('time', '') < since:
+                continue
+            if until and record.get('time', '')[:_SECONDS] > until:
+                continue
+            if regex and not regex.search(str(record.get('message', ''))):
+                continue
+            yield record
+
+
+def format_record(record: Dict[str, Any]) -> str:
+    """Renders a structured log record as a single line of text."""
+    extra = record.get('extra')
+    line = (
+        f"{record.get('time')} {record.get('level', ''):<8} "
+        f"{record.get('test')} {record.get('class')}: {record.get('message')}"
+    )
+    if extra:
+        line += ' ' + ' '.join(f'{k}={v}' for k, v in extra.items())
+    if record.get('exc'):
+        line += '\n' + record['exc']
+    return line
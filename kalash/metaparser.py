@@ -2,7 +2,6 @@ __docformat__ = "google"
 
 from typing import Any, Dict, List, Optional, Union
 
-import yaml
 import ast
 import re
 
@@ -10,6 +9,8 @@ from collections.abc import Iterable
 from functools import reduce
 
 from .config import CliConfig, OneOrList, TestModule, TestPath
+from . import yaml_backend
+from .timings import METADATA, timed
 
 
 def iterable_or_scalar(item: OneOrList[Any]):
@@ -129,6 +130,15 @@ def parse_metadata_section(
         A dictionary corresponding to the original YAML
             metadata tag.
     """
+    with timed(METADATA, test_script if type(test_script) is TestPath
+               else getattr(test_script, '__file__', None)):
+        return _parse_metadata_section(test_script, cli_config)
+
+
+def _parse_metadata_section(
+    test_script: Union[TestPath, TestModule],
+    cli_config: CliConfig
+) -> Dict[str, Any]:
     if type(test_script) is TestPath:
         try:
             trimmed_yaml = extract_meta_from_test_script_ast(test_script, cli_config)
@@ -143,7 +153,7 @@ def parse_metadata_section(
     # check if the file contains yaml data, if not, discard it
     if trimmed_yaml:
         try:
-            yaml_data = yaml.full_load(trimmed_yaml)
+            yaml_data = yaml_backend.load_metadata(trimmed_yaml)
             return yaml_data
         except Exception:
             return dict()
@@ -0,0 +1,146 @@
+"""
+Execution plans: collected tests frozen into a JSON file.
+
+`kalash plan -f .kalash.yaml -o plan.json` collects and filters the
+tests once and writes the result:
+
+```json
+{
+  "version": 1,
+  "created": "2022-03-01T10:00:00",
+  "source": "/ci/suite/.kalash.yaml",
+  "trigger": {"tests": [{"path": "/ci/suite/tests", ...}], "config": {"report": "...", ...}},
+  "tests": [
+    {"file": "/ci/suite/tests/test_flash.py", "class": "TestFlash", "method": "test_1",
+     "id": "000000001_Flash", "meta": {"id": "000000001_Flash", "devices": ["ECU_A"], ...},
+     "retries": 0}
+  ]
+}
+```
+
+`kalash run --plan plan.json` then runs exactly these tests, in this
+order, without walking directories, parsing metadata or filtering.
+Test files are only imported to get the test classes. Paths in the
+plan are absolute, so test files have to be at the same location on
+the machine running the plan. Filters on `last_result` are evaluated
+when the plan is made.
+"""
+__docformat__ = "google"
+
+from dataclasses import fields
+from typing import Any, Dict, Iterable, List
+
+import datetime
+import json
+import os
+
+from .config import CliConfig, Config, Meta, PathOrIdForWhatIf, Test, Trigger
+from .smuggle import smuggle
+from .test_case import TestCase
+from .timings import COLLECTING, timed
+
+PLAN_VERSION = 1
+
+Plan = Dict[str, Any]
+
+
+def _fields(obj: Any) -> Dict[str, Any]:
+    """Dataclass fields of a configuration object except `cli_config`."""
+    return {f.name: getattr(obj, f.name) for f in fields(obj) if f.name != 'cli_config'}
+
+
+def make_plan(trigger: Trigger, tests: Iterable[TestCase]) -> Plan:
+    """Freezes collected tests into a plan.
+
+    Args:
+        trigger (Trigger): `Trigger` the tests have been collected with
+        tests (Iterable[TestCase]): collected tests, in the order
+            they should run
+
+    Returns:
+        The plan, serializable to JSON
+    """
+    return dict(
+        version=PLAN_VERSION,
+        created=datetime.datetime.now().replace(microsecond=0).isoformat(),
+        source=os.path.abspath(trigger.cli_config.file) if trigger.cli_config.file else None,
+        trigger=dict(
+            tests=[_fields(t) for t in trigger.tests],
+            config=_fields(trigger.config)
+        ),
+        tests=[
+            {
+                'file': test.collected_from,
+                'class': type(test).__name__,
+                'method': test._testMethodName,
+                'id': test._id,
+                'meta': _fields(test.meta) if test.meta else {},
+                'retries': test.retries
+            }
+            for test in tests
+        ]
+    )
+
+
+def write_plan(plan: Plan, path: str):
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(plan, f, indent=2, default=str)
+
+
+def read_plan(path: str) -> Plan:
+    with open(path, 'r', encoding='utf-8') as f:
+        plan = json.load(f)
+    if plan.get('version') != PLAN_VERSION:
+        raise ValueError(
+            f"Plan {path} has version {plan.get('version')}, "
+            f"this version of Kalash runs plans of version {PLAN_VERSION}"
+        )
+    return plan
+
+
+def trigger_from_plan(plan: Plan, cli_config: CliConfig) -> Trigger:
+    """Rebuilds the (already interpolated) `Trigger` of a plan."""
+    if plan.get('source') and not cli_config.file:
+        cli_config.file = plan['source']
+    return Trigger(
+        [Test(**t) for t in plan['trigger']['tests']],
+        Config(**plan['trigger']['config']),
+        cli_config
+    )
+
+
+def tests_from_plan(plan: Plan, trigger: Trigger) -> List[TestCase]:
+    """Instantiates the tests of a plan. Each test file
+    is imported once, nothing else is collected.
+
+    Args:
+        plan (Plan): the plan
+        trigger (Trigger): `Trigger` passed to the tests
+
+    Returns:
+        Tests in the planned order
+    """
+    modules: Dict[str, Any] = {}
+    tests: List[TestCase] = []
+    for entry in plan['tests']:
+        file = entry['file']
+        with timed(COLLECTING, file):
+            if file not in modules:
+                modules[file] = smuggle(file)
+            test_class = getattr(modules[file], entry['class'])
+            test = test_class(entry['method'], entry['id'], Meta(**entry['meta']), trigger)
+            test.collected_from = file
+            if entry.get('retries'):
+                test.retries = entry['retries']
+        tests.append(test)
+    return tests
+
+
+def whatif_names(plan: Plan, cli_config: CliConfig) -> PathOrIdForWhatIf:
+    """IDs or paths of the planned tests for the what-if mode."""
+    if cli_config.what_if == cli_config.spec.cli_config.whatif_ids:
+        return list({entry['id'] for entry in plan['tests']})
+    return list({entry['file'] for entry in plan['tests']})
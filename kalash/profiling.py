@@ -0,0 +1,230 @@
+"""
+Per-test profiling (`--profile`).
+
+Every test of the run is executed under a profiler and its profile
+is saved in the `profiles/<timestamp>` subdirectory of the report
+directory, named after the test ID:
+
+* `cprofile` - deterministic profiling with `cProfile`, one `.prof`
+  file per test (open it with `pstats`, `snakeviz`, ...) and
+  `suite.prof` merging all of them
+* `sampling` - a background thread samples the stack of the thread
+  running the test every `SAMPLING_INTERVAL` seconds (or as soon as
+  it gets the GIL after that) and the stacks are saved as folded
+  stacks (`.folded`, the input format of `flamegraph.pl` and
+  speedscope) together with `suite.folded`.
+  Tests run at close to full speed, which keeps timing-sensitive
+  hardware tests working, at the price of statistical results
+
+At the end of the run the functions with the most own time across
+the whole suite are printed.
+"""
+__docformat__ = "google"
+
+from collections import Counter
+from contextlib import contextmanager
+from types import CodeType
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import os
+import re
+import sys
+import threading
+import time
+import unittest
+
+CPROFILE = 'cprofile'
+SAMPLING = 'sampling'
+MODES = (CPROFILE, SAMPLING)
+
+SAMPLING_INTERVAL = 0.005
+"""Seconds between two stack samples in the `sampling` mode."""
+DEFAULT_TOP = 20
+PROFILES_DIR = 'profiles'
+
+_UNSAFE_CHARS_RE = re.compile(r'[^\w.\-\[\]]')
+_TEST_RUN_CODE = unittest.TestCase.run.__code__
+
+
+def _file_name(test_id: str) -> str:
+    return _UNSAFE_CHARS_RE.sub('_', test_id)[:200]
+
+
+def _label(file: str, line: int, name: str) -> str:
+    if file == '~':  # built-in functions in `cProfile` stats
+        return name
+    return f"{name} ({os.path.basename(file)}:{line})"
+
+
+class _Sampler(threading.Thread):
+    """Collects stacks of one thread until stopped. Stacks are cut
+    at `unittest.TestCase.run`, frames of the test runner above it
+    are left out and samples taken outside of it are dropped.
+
+    Args:
+        thread_id (int): ident of the sampled thread
+        interval (float): seconds between samples
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='kalash-sampler', daemon=True)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.duration = 0.0
+        self._thread_id = thread_id
+        self._interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        start = time.perf_counter()
+        while not self._stopped.wait(self._interval):
+            self.samples += 1
+            frame = sys._current_frames().get(self._thread_id)
+            stack: List[CodeType] = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                if frame.f_code is _TEST_RUN_CODE:
+                    self.stacks[tuple(reversed(stack))] += 1
+                    break
+                frame = frame.f_back
+        self.duration = time.perf_counter() - start
+
+    def stop(self) -> Counter:
+        self._stopped.set()
+        self.join()
+        return self.stacks
+
+
+class SuiteProfiler:
+    """Profiles the tests of a run one by one and aggregates
+    the results. Set on every test of the run, like the
+    `retry.RetryBudget`.
+
+    Args:
+        mode (str): `cprofile` or `sampling`
+        output (str): directory the profiles are written to
+        interval (float): seconds between two stack samples
+            in the `sampling` mode
+    """
+
+    def __init__(self, mode: str, output: str, interval: float = SAMPLING_INTERVAL):
+        if mode not in MODES:
+            raise ValueError(f"Profiling mode should be one of {', '.join(MODES)}, got {mode}")
+        self.mode = mode
+        self.output = output
+        self.interval = interval
+        self.tests = 0
+        self._stats = None  # `pstats.Stats` of all tests
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._sampled_time = 0.0
+
+    @contextmanager
+    def profile(self, test) -> Iterator[None]:
+        """Profiles the execution of a single test."""
+        profile_test = self._cprofile if self.mode == CPROFILE else self._sample
+        with profile_test(test.id()):
+            yield
+        self.tests += 1
+
+    @contextmanager
+    def _cprofile(self, test_id: str) -> Iterator[None]:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(self._path(test_id, '.prof'))
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+
+    @contextmanager
+    def _sample(self, test_id: str) -> Iterator[None]:
+        sampler = _Sampler(threading.get_ident(), self.interval)
+        sampler.start()
+        try:
+            yield
+        finally:
+            stacks = sampler.stop()
+            self._write_folded(self._path(test_id, '.folded'), stacks)
+            self._stacks.update(stacks)
+            self._samples += sampler.samples
+            self._sampled_time += sampler.duration
+
+    def _path(self, test_id: str, extension: str) -> str:
+        if not os.path.exists(self.output):
+            os.makedirs(self.output)
+        return os.path.join(self.output, _file_name(test_id) + extension)
+
+    @staticmethod
+    def _write_folded(path: str, stacks: Counter):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.items():
+                frames = ';'.join(
+                    _label(code.co_filename, code.co_firstlineno, code.co_name) for code in stack
+                )
+                f.write(f"{frames} {count}\n")
+
+    def hottest(self, top: int = DEFAULT_TOP) -> List[Tuple[str, float, float]]:
+        """Functions with the most own time across the suite.
+
+        Returns:
+            A list of (function, own time, total time) tuples,
+                times in seconds (estimated from samples
+                in the `sampling` mode)
+        """
+        if self.mode == CPROFILE:
+            if self._stats is None:
+                return []
+            stats: Dict = getattr(self._stats, 'stats')
+            rows = [(_label(*func), tt, ct) for func, (_, _, tt, ct, _) in stats.items()]
+        else:
+            # samples are further apart than `interval` when the GIL
+            # isn't released often enough, use the measured period
+            period = self._sampled_time / self._samples if self._samples else 0.0
+            own: Counter = Counter()
+            total: Counter = Counter()
+            for stack, count in self._stacks.items():
+                own[stack[-1]] += count
+                for code in set(stack):
+                    total[code] += count
+            rows = [
+                (_label(code.co_filename, code.co_firstlineno, code.co_name),
+                 own[code] * period, total[code] * period)
+                for code in total
+            ]
+        return sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+
+    def close(self) -> Optional[str]:
+        """Writes the profile of the whole suite.
+
+        Returns:
+            Path to the written file, `None` if no test ran
+        """
+        if not self.tests:
+            return None
+        if self.mode == CPROFILE:
+            path = self._path('suite', '.prof')
+            self._stats.dump_stats(path)  # type: ignore
+        else:
+            path = self._path('suite', '.folded')
+            self._write_folded(path, self._stacks)
+        return path
+
+    def format(self, top: int = DEFAULT_TOP) -> str:
+        """Human-readable list of the hottest functions."""
+        unit = 's' if self.mode == CPROFILE else 's (sampled)'
+        lines = [f"Hottest functions across {self.tests} tests, own/total time in {unit}:"]
+        for label, own, total in self.hottest(top):
+            lines.append(f"  {own:10.3f} {total:10.3f}  {label}")
+        return '\n'.join(lines)
+
+
+def profiles_dir(report_dir: str) -> str:
+    """Directory for the profiles of a run started now."""
+    return os.path.join(report_dir, PROFILES_DIR, time.strftime("%Y%m%d%H%M%S"))
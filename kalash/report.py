@@ -0,0 +1,584 @@
+"""
+Streaming JUnit XML reports.
+
+`XMLTestResult` hands every finished `testcase` over to a background
+`ReportWriter` thread which appends it to the report file of its test
+class straight away, so neither results nor captured output pile up
+in memory and a crash keeps everything written so far. The files are
+finalised (counts and closing tags) when the run stops.
+
+The files follow the layout of `xmlrunner` reports: one
+`TEST-<module>.<Class>-<timestamp>.xml` file per test class with
+a `testsuite` root and `testcase` children carrying `classname`,
+`name`, `time`, `timestamp`, `file` and `line` attributes and
+`failure`, `error`, `skipped`, `system-out` and `system-err` elements.
+Resources used by each test (see: `resources`) are added as
+`property` elements.
+"""
+__docformat__ = "google"
+
+from dataclasses import dataclass, field
+from typing import Dict, IO, List, Optional, Tuple
+from unittest import TestResult, TextTestResult, TextTestRunner
+
+from .capture import DEFAULT_OUTPUT_LIMIT, OutputCapture
+from .events import EventStream, log_path
+from .history import ResultHistory
+from .log import open_files
+from .resources import Snapshot, Usage, leaked, snapshot, usage
+from .timings import REPORTS, timed
+
+import datetime
+import inspect
+import io
+import os
+import queue
+import re
+import sys
+import threading
+import time
+
+# characters that are not allowed anywhere in an XML 1.0 document
+_INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+# attributes of the `testsuite` start tag only known when the file is finalised
+_SUITE_ATTRS = ' tests="{tests}" failures="{failures}" errors="{errors}" ' \
+    'skipped="{skipped}" time="{time:.3f}" timestamp={timestamp}'
+# room reserved for them: 20-digit counts, a total time below 10^12 seconds
+# and an ISO timestamp with microseconds and a UTC offset
+_SUITE_ATTRS_RESERVED = len(_SUITE_ATTRS.format(
+    tests=2 ** 64, failures=2 ** 64, errors=2 ** 64, skipped=2 ** 64, time=1e12,
+    timestamp='"2000-01-01T00:00:00.000000+00:00"'
+))
+
+FAILURE = 'failure'
+ERROR = 'error'
+SKIPPED = 'skipped'
+
+
+def _safe(text: object) -> str:
+    return _INVALID_XML_RE.sub('', str(text))
+
+
+def _quoteattr(text: str) -> str:
+    # `xml.sax.saxutils` pulls in `urllib.request`, don't import it before a report is written
+    from xml.sax.saxutils import quoteattr
+    return quoteattr(text)
+
+
+def _resolve_filename(filename: str) -> str:
+    """Makes `filename` relative to the current directory
+    unless it's outside of it (same as `xmlrunner` does).
+    """
+    try:
+        rel_filename = os.path.relpath(filename)
+    except ValueError:
+        return filename
+    return filename if rel_filename.startswith('..') else rel_filename
+
+
+def _suite_name(test) -> str:
+    module = type(test).__module__ + '.'
+    if module == '__main__.':
+        module = ''
+    return module + type(test).__name__
+
+
+def _source_location(test) -> Tuple[Optional[str], Optional[int]]:
+    """Finds the file and line where a test method is defined.
+    Uses the code object of the method, so test modules loaded
+    under the same name from different directories don't mix up.
+    """
+    method_name = getattr(test, '_testMethodName', None)
+    if not method_name:
+        return None, None  # e.g. `_ErrorHolder` of a failed `setUpClass`
+    try:
+        code = inspect.unwrap(getattr(test, method_name)).__code__
+        return code.co_filename, code.co_firstlineno
+    except AttributeError:
+        try:
+            return inspect.getsourcefile(type(test)), None
+        except TypeError:
+            return None, None
+
+
+@dataclass
+class TestCaseRecord:
+    """Everything needed to write one `testcase` element.
+
+    Args:
+        suite (str): name of the report (test class) the record belongs to
+        classname (str): `classname` attribute
+        name (str): `name` attribute (test method or sub-test)
+        outcome (Optional[str]): `failure`, `error`, `skipped`
+            or `None` for a success
+        exc_type (str): exception type name or skip marker
+        message (str): exception message or skip reason
+        details (str): formatted traceback
+        file (Optional[str]): path to the test file
+        line (Optional[int]): line of the test method
+        time (float): duration in seconds
+        timestamp (str): ISO timestamp of the end of the test
+        stdout (str): captured standard output
+        stderr (str): captured standard error
+        properties (Dict[str, str]): extra `property` elements
+    """
+    suite: str
+    classname: str
+    name: str
+    outcome: Optional[str] = None
+    exc_type: str = ''
+    message: str = ''
+    details: str = ''
+    file: Optional[str] = None
+    line: Optional[int] = None
+    time: float = 0.0
+    timestamp: str = ''
+    stdout: str = ''
+    stderr: str = ''
+    properties: Dict[str, str] = field(default_factory=dict)
+
+
+class _SuiteFile:
+    """Book-keeping of a single report file that is being streamed."""
+
+    def __init__(self, path: str, name: str, source_file: str):
+        self.path = path
+        self.tests = 0
+        self.failures = 0
+        self.errors = 0
+        self.skipped = 0
+        self.time = 0.0
+        self.timestamp = ''
+        self.attrs_offset = 0
+        start = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+            f'<testsuite name={_quoteattr(_safe(name))} file={_quoteattr(source_file)}'
+        with open(path, 'wb') as f:
+            f.write(start.encode('utf-8'))
+            self.attrs_offset = f.tell()
+            f.write(b' ' * _SUITE_ATTRS_RESERVED + b'>\n')
+
+    def count(self, record: TestCaseRecord):
+        self.tests += 1
+        self.time += record.time
+        self.timestamp = max(self.timestamp, record.timestamp)
+        if record.outcome == FAILURE:
+            self.failures += 1
+        elif record.outcome == ERROR:
+            self.errors += 1
+        elif record.outcome == SKIPPED:
+            self.skipped += 1
+
+    def finalize(self):
+        attrs = _SUITE_ATTRS.format(
+            tests=self.tests, failures=self.failures, errors=self.errors,
+            skipped=self.skipped, time=self.time, timestamp=_quoteattr(_safe(self.timestamp))
+        ).encode('utf-8')
+        if len(attrs) > _SUITE_ATTRS_RESERVED:
+            raise ValueError(
+                f"testsuite attributes of {self.path} don't fit in the "
+                f"{_SUITE_ATTRS_RESERVED} bytes reserved for them: {attrs.decode('utf-8')}"
+            )
+        with open(self.path, 'r+b') as f:
+            f.seek(self.attrs_offset)
+            f.write(attrs.ljust(_SUITE_ATTRS_RESERVED))
+            f.seek(0, io.SEEK_END)
+            f.write(b'</testsuite>\n')
+
+
+class ReportWriter:
+    """Writes `TestCaseRecord`s to report files from a background thread.
+
+    Args:
+        output (str): report directory
+        outsuffix (Optional[str]): suffix of the report file names,
+            a timestamp by default
+        max_pending (int): how many records may wait for the writer
+            before `submit` blocks, bounds the memory used when the
+            disk is slower than the tests
+    """
+
+    def __init__(self, output: str, outsuffix: Optional[str] = None, max_pending: int = 64):
+        self.output = output
+        self.outsuffix = time.strftime("%Y%m%d%H%M%S") if outsuffix is None else outsuffix
+        self.reports: List[str] = []
+        self._suites: Dict[str, _SuiteFile] = {}
+        self._open: Optional[Tuple[str, IO[bytes]]] = None
+        # held while report files are opened or closed
+        self.files_lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._work, name='kalash-report-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, record: TestCaseRecord):
+        self._queue.put(record)
+
+    @property
+    def open_files(self) -> int:
+        """Number of report files currently open, stays
+        the same while `files_lock` is held."""
+        return 1 if self._open else 0
+
+    def close(self):
+        """Waits for pending records, finalises all report files
+        and re-raises a write error if one happened.
+        """
+        self._queue.put(None)
+        self._thread.join()
+        if self._error:
+            raise self._error
+
+    def _work(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            if self._error:
+                continue  # keep draining so that `submit` never blocks forever
+            try:
+                self._write(record)
+            except Exception as e:
+                self._error = e
+        try:
+            self._close_open_file()
+        except Exception as e:
+            self._error = self._error or e
+        for suite in self._suites.values():
+            try:
+                suite.finalize()
+            except Exception as e:
+                self._error = self._error or e
+
+    def _close_open_file(self):
+        with self.files_lock:
+            if self._open:
+                self._open[1].close()
+                self._open = None
+
+    def _file_for(self, record: TestCaseRecord) -> Tuple[_SuiteFile, IO[bytes]]:
+        suite = self._suites.get(record.suite)
+        if not suite:
+            if not os.path.exists(self.output):
+                os.makedirs(self.output)
+            name = record.suite if not self.outsuffix else f'{record.suite}-{self.outsuffix}'
+            path = os.path.join(self.output, f'TEST-{name}.xml')
+            source_file = record.suite.rpartition('.')[0].replace('.', '/') + '.py'
+            suite = _SuiteFile(path, name, source_file)
+            self._suites[record.suite] = suite
+            self.reports.append(path)
+        # keep only one report file open at a time
+        if not self._open or self._open[0] != record.suite:
+            self._close_open_file()
+            with self.files_lock:
+                self._open = (record.suite, open(suite.path, 'ab'))
+        return suite, self._open[1]
+
+    def _write(self, record: TestCaseRecord):
+        suite, f = self._file_for(record)
+        attrs = [
+            ('classname', record.classname),
+            ('name', record.name),
+            ('time', f'{record.time:.3f}'),
+            ('timestamp', record.timestamp)
+        ]
+        if record.file is not None:
+            attrs.append(('file', _resolve_filename(record.file)))
+        if record.line is not None:
+            attrs.append(('line', str(record.line)))
+        out = ['\t<testcase']
+        out.extend(f' {k}={_quoteattr(_safe(v))}' for k, v in attrs)
+        out.append('>\n')
+        if record.properties:
+            out.append('\t\t<properties>\n')
+            out.extend(
+                f'\t\t\t<property name={_quoteattr(_safe(k))} value={_quoteattr(_safe(v))}/>\n'
+                for k, v in record.properties.items()
+            )
+            out.append('\t\t</properties>\n')
+        if record.outcome:
+            out.append(f'\t\t<{record.outcome} type={_quoteattr(_safe(record.exc_type))} '
+                       f'message={_quoteattr(_safe(record.message))}>')
+            out.append(_cdata(record.details))
+            out.append(f'</{record.outcome}>\n')
+        f.write(''.join(out).encode('utf-8'))
+        for tag, text in (('system-out', record.stdout), ('system-err', record.stderr)):
+            if text:
+                f.write(f'\t\t<{tag}>{_cdata(text)}</{tag}>\n'.encode('utf-8'))
+        f.write(b'\t</testcase>\n')
+        f.flush()
+        suite.count(record)
+
+
+def _cdata(text: str) -> str:
+    if not text:
+        return ''
+    return '<![CDATA[' + _safe(text).replace(']]>', ']]]]><![CDATA[>') + ']]>'
+
+
+class _Tee(io.TextIOBase):
+    """Writes to the original stream and to a capture buffer."""
+
+    def __init__(self, first, second):
+        super().__init__()
+        self._first = first
+        self._second = second
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        self._first.write(s)
+        self._second.write(s)
+        return len(s)
+
+    def flush(self):
+        self._first.flush()
+
+
+class XMLTestResult(TextTestResult):
+    """`TextTestResult` that streams JUnit XML reports through
+    a `ReportWriter` while the tests are running.
+
+    Only lightweight references to the tests are kept in
+    `successes`, captured output is released as soon as a test
+    has been handed over to the writer. Output above `output_limit`
+    characters is spilled to files in the `output` subdirectory
+    of the reports and truncated in the reports themselves.
+    Test start and finish are emitted to `events` and the outcome
+    of every test is recorded in the result `history`. Tests that
+    leave more file descriptors or threads open than there were
+    when they started are listed in `leaks` with their usage.
+    """
+
+    def __init__(self, stream, descriptions, verbosity, writer: ReportWriter,
+                 output_limit: int = DEFAULT_OUTPUT_LIMIT,
+                 events: Optional[EventStream] = None,
+                 history: Optional[ResultHistory] = None):
+        super().__init__(stream, descriptions, verbosity)
+        self.writer = writer
+        self.events = events if events else EventStream()
+        self.history = history
+        self.successes: list = []
+        self._records: List[TestCaseRecord] = []
+        self._in_test = False
+        self._start_time = 0.0
+        self._start_snapshot: Optional[Snapshot] = None
+        self.leaks: List[Tuple[str, Usage]] = []
+        spill_dir = os.path.join(writer.output, 'output')
+        self._stdout_capture = OutputCapture(output_limit, spill_dir)
+        self._stderr_capture = OutputCapture(output_limit, spill_dir)
+        self._saved_streams: Optional[Tuple[IO[str], IO[str]]] = None
+
+    def _setupStdout(self):  # noqa: N802 `unittest` API
+        super()._setupStdout()
+        self._saved_streams = (sys.stdout, sys.stderr)
+        sys.stdout = _Tee(sys.stdout, self._stdout_capture)
+        sys.stderr = _Tee(sys.stderr, self._stderr_capture)
+
+    def _restoreStdout(self):  # noqa: N802 `unittest` API
+        if self._saved_streams:
+            sys.stdout, sys.stderr = self._saved_streams
+            self._saved_streams = None
+        super()._restoreStdout()
+
+    def startTest(self, test):  # noqa: N802 `unittest` API
+        self._start_time = time.monotonic()
+        self._in_test = True
+        self._stdout_capture.reset(f'{test.id()}-stdout')
+        self._stderr_capture.reset(f'{test.id()}-stderr')
+        self.events.emit('test_started', test=test.id(), kalash_id=getattr(test, '_id', None))
+        super().startTest(test)
+        self._start_snapshot = self._snapshot(test)
+
+    def stopTest(self, test):  # noqa: N802 `unittest` API
+        super().stopTest(test)
+        self._in_test = False
+        with timed(REPORTS):
+            self._flush_records(test)
+
+    def stopTestRun(self):  # noqa: N802 `unittest` API
+        super().stopTestRun()
+        with timed(REPORTS):
+            self.writer.close()
+            if self.history:
+                self.history.flush()
+
+    def _flush_records(self, test):
+        elapsed = time.monotonic() - self._start_time if self._start_time else 0.0
+        timestamp = datetime.datetime.now().replace(microsecond=0).isoformat()
+        stdout = self._stdout_capture.getvalue()
+        stderr = self._stderr_capture.getvalue()
+        properties = self._properties(test)
+        for key, capture in (('stdout_file', self._stdout_capture),
+                             ('stderr_file', self._stderr_capture)):
+            if capture.path:
+                properties[key] = os.path.abspath(capture.path)
+            capture.reset()
+        resources = self._usage(test)
+        properties.update((key, str(value)) for key, value in resources.items())
+        for record in self._records:
+            record.time = elapsed
+            record.timestamp = timestamp
+            record.stdout = stdout
+            record.stderr = stderr
+            record.properties.update(properties)
+            self.writer.submit(record)
+        status = self._status(self._records)
+        if self.history:
+            self.history.add(
+                test.id(),
+                _source_location(test)[0],
+                getattr(test, '_testMethodName', None),
+                status,
+                round(elapsed, 6),
+                timestamp
+            )
+        self.events.emit(
+            'test_finished',
+            test=test.id(),
+            kalash_id=getattr(test, '_id', None),
+            status=status,
+            duration=round(elapsed, 6),
+            log=log_path(test),
+            attempts=getattr(test, 'attempts', 1),
+            resources=resources
+        )
+        self._records = []
+        self._start_time = 0.0
+        self._start_snapshot = None
+
+    def _usage(self, test) -> Usage:
+        if self._start_snapshot is None:
+            return {}
+        used = usage(self._start_snapshot, self._snapshot(test))
+        if leaked(used):
+            self.leaks.append((test.id(), used))
+        return used
+
+    def _snapshot(self, test) -> Snapshot:
+        # the writer opens report files in the background while tests
+        # run and log files of a test are only closed after `stopTest`
+        with self.writer.files_lock:
+            return snapshot(self.writer.open_files + open_files(getattr(test, '_logger', None)))
+
+    @staticmethod
+    def _status(records: List[TestCaseRecord]) -> str:
+        outcomes = [r.outcome for r in records]
+        if ERROR in outcomes:
+            return 'error'
+        if FAILURE in outcomes:
+            return 'failed'
+        if outcomes and all(o == SKIPPED for o in outcomes):
+            return 'skipped'
+        return 'passed'
+
+    def _properties(self, test) -> Dict[str, str]:
+        properties = {}
+        attempts = getattr(test, 'attempts', 1)
+        if attempts > 1:
+            properties['attempts'] = str(attempts)
+            properties['passed_on_retry'] = str(getattr(test, 'passed_on_retry', False)).lower()
+        return properties
+
+    def _add_record(self, test, outcome=None, err=None, exc_type='', message='', subtest=None):
+        test_id = subtest.id() if subtest else test.id()
+        classname = re.sub(r'^__main__.', '', test_id).split(' ')[0].rpartition('.')[0]
+        name = test_id.split(' ')
+        name = ' '.join([name[0].split('.')[-1]] + name[1:])
+        file, line = _source_location(test)
+        details = ''
+        if err is not None and outcome in (FAILURE, ERROR):
+            exc_type = err[0].__name__
+            message = str(err[1])
+            details = self._exc_info_to_string(err, test)
+        self._records.append(TestCaseRecord(
+            suite=_suite_name(test),
+            classname=classname,
+            name=name,
+            outcome=outcome,
+            exc_type=exc_type,
+            message=message,
+            details=details,
+            file=file,
+            line=line
+        ))
+        if not self._in_test:
+            # e.g. `setUpClass` errors are reported without `startTest`
+            with timed(REPORTS):
+                self._flush_records(test)
+
+    def addSuccess(self, test):  # noqa: N802 `unittest` API
+        super().addSuccess(test)
+        self.successes.append(test)
+        self._add_record(test)
+
+    def addFailure(self, test, err):  # noqa: N802 `unittest` API
+        super().addFailure(test, err)
+        self._add_record(test, FAILURE, err)
+
+    def addError(self, test, err):  # noqa: N802 `unittest` API
+        super().addError(test, err)
+        self._add_record(test, ERROR, err)
+
+    def addSubTest(self, test, subtest, err):  # noqa: N802 `unittest` API
+        super().addSubTest(test, subtest, err)
+        if err is not None:
+            outcome = FAILURE if issubclass(err[0], test.failureException) else ERROR
+            self._add_record(test, outcome, err, subtest=subtest)
+
+    def addSkip(self, test, reason):  # noqa: N802 `unittest` API
+        super().addSkip(test, reason)
+        self._add_record(test, SKIPPED, exc_type='skip', message=reason)
+
+    def addExpectedFailure(self, test, err):  # noqa: N802 `unittest` API
+        super().addExpectedFailure(test, err)
+        self._add_record(test, SKIPPED, exc_type='XFAIL',
+                         message=f'expected failure: {err[1]}')
+
+    def addUnexpectedSuccess(self, test):  # noqa: N802 `unittest` API
+        super().addUnexpectedSuccess(test)
+        self._add_record(test, ERROR, exc_type='UnexpectedSuccess',
+                         message='Unexpected success: This test was marked as expected '
+                                 'failure but passed, please review it')
+
+
+class XMLTestRunner(TextTestRunner):
+    """`TextTestRunner` writing streamed JUnit XML reports
+    to the `output` directory.
+
+    Args:
+        output (str): report directory
+        outsuffix (Optional[str]): suffix of the report file names,
+            a timestamp by default
+        max_pending (int): how many finished tests may wait
+            for the report writer thread
+        output_limit (Optional[int]): number of characters of captured
+            output per test kept in memory and in the report
+        events (Optional[EventStream]): stream receiving test events
+        history (Optional[ResultHistory]): result history the outcomes
+            of the tests are appended to
+    """
+
+    def __init__(self, output: str = '.', outsuffix: Optional[str] = None,
+                 max_pending: int = 64, output_limit: Optional[int] = None,
+                 events: Optional[EventStream] = None,
+                 history: Optional[ResultHistory] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.events = events
+        self.history = history
+        self.output = output
+        self.outsuffix = outsuffix
+        self.max_pending = max_pending
+        self.output_limit = DEFAULT_OUTPUT_LIMIT if output_limit is None else output_limit
+
+    def _makeResult(self) -> TestResult:  # noqa: N802 `unittest` API
+        return XMLTestResult(
+            self.stream,
+            self.descriptions,
+            self.verbosity,
+            ReportWriter(self.output, self.outsuffix, self.max_pending),
+            self.output_limit,
+            self.events,
+            self.history
+        )
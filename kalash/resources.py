@@ -0,0 +1,138 @@
+"""
+Resource usage of single tests.
+
+`XMLTestResult` takes a `snapshot` of the process when a test
+starts and another one when it stops. The difference (`usage`)
+ends up as `property` elements of the `testcase` in the reports
+and as `resources` of the `test_finished` run event:
+
+* `wall_time` - seconds between the start and the end of the test
+* `cpu_user`, `cpu_system` - CPU seconds spent by the process
+* `max_rss_delta_kb` - growth of the peak resident set size of the
+  process in KiB (0 unless the test pushed the peak higher)
+* `open_fds`, `open_fds_delta` - open file descriptors at the end
+  of the test and how many more than at its start
+* `threads`, `threads_delta` - threads of the process at the end
+  of the test and how many more than at its start
+
+CPU times come from `os.times()`, the peak RSS from the `resource`
+module, open descriptors from `/proc/self/fd` (`/dev/fd` on macOS)
+and threads from `/proc/self/status` (`threading.active_count()`
+elsewhere). What a platform doesn't provide is left out. Threads
+Kalash runs itself (named `kalash-...`, e.g. the report writer)
+aren't counted.
+"""
+__docformat__ = "google"
+
+from dataclasses import dataclass
+from typing import Dict, Optional, Union
+
+import os
+import sys
+import threading
+import time
+
+KALASH_THREAD_PREFIX = 'kalash-'
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore
+
+Usage = Dict[str, Union[int, float]]
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Resources of the process at one point in time.
+
+    Args:
+        wall (float): `time.monotonic()`
+        cpu_user (float): user CPU seconds of the process
+        cpu_system (float): system CPU seconds of the process
+        max_rss_kb (Optional[int]): peak resident set size in KiB
+        open_fds (Optional[int]): number of open file descriptors
+        threads (int): number of threads, without the ones of Kalash
+    """
+    wall: float
+    cpu_user: float
+    cpu_system: float
+    max_rss_kb: Optional[int]
+    open_fds: Optional[int]
+    threads: int
+
+
+def _max_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB everywhere else
+    return max_rss // 1024 if sys.platform == 'darwin' else max_rss
+
+
+def _open_fds() -> Optional[int]:
+    for fd_dir in ('/proc/self/fd', '/dev/fd'):
+        try:
+            # the directory is open while it's listed
+            return len(os.listdir(fd_dir)) - 1
+        except OSError:
+            continue
+    return None
+
+
+def _all_threads() -> int:
+    try:
+        with open('/proc/self/status', 'rb') as f:
+            for line in f:
+                if line.startswith(b'Threads:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return threading.active_count()
+
+
+def _threads() -> int:
+    own = sum(1 for t in threading.enumerate() if t.name.startswith(KALASH_THREAD_PREFIX))
+    return _all_threads() - own
+
+
+def snapshot(own_fds: int = 0) -> Snapshot:
+    """Takes a snapshot of the resources used by this process.
+
+    Args:
+        own_fds (int): descriptors held by Kalash itself for the
+            test (e.g. its log files), left out of `open_fds`
+    """
+    times = os.times()
+    open_fds = _open_fds()
+    return Snapshot(
+        wall=time.monotonic(),
+        cpu_user=times.user,
+        cpu_system=times.system,
+        max_rss_kb=_max_rss_kb(),
+        open_fds=open_fds - own_fds if open_fds is not None else None,
+        threads=_threads()
+    )
+
+
+def usage(before: Snapshot, after: Snapshot) -> Usage:
+    """Resources used between two snapshots."""
+    used: Usage = {
+        'wall_time': round(after.wall - before.wall, 6),
+        'cpu_user': round(after.cpu_user - before.cpu_user, 6),
+        'cpu_system': round(after.cpu_system - before.cpu_system, 6),
+    }
+    if before.max_rss_kb is not None and after.max_rss_kb is not None:
+        used['max_rss_delta_kb'] = after.max_rss_kb - before.max_rss_kb
+    if before.open_fds is not None and after.open_fds is not None:
+        used['open_fds'] = after.open_fds
+        used['open_fds_delta'] = after.open_fds - before.open_fds
+    used['threads'] = after.threads
+    used['threads_delta'] = after.threads - before.threads
+    return used
+
+
+def leaked(used: Usage) -> bool:
+    """Whether a test left more descriptors or threads open
+    than there were when it started."""
+    return used.get('open_fds_delta', 0) > 0 or used.get('threads_delta', 0) > 0
@@ -0,0 +1,164 @@
+"""
+In-process retries of failed and errored tests.
+
+A test that fails is re-run immediately on the same, already
+collected `TestCase` instance, so no collection is repeated.
+Every attempt is recorded on a throwaway result object and only
+the outcome of the final attempt is forwarded to the real test
+result (and therefore to the reports). A run-wide `RetryBudget`
+caps the total number of re-runs, so a widespread breakage does
+not multiply the duration of the run.
+"""
+__docformat__ = "google"
+
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+import unittest
+
+DEFAULT_RETRY_BUDGET = 10
+
+
+class RetryBudget:
+    """Run-wide counter of the re-runs still allowed.
+
+    Args:
+        total (Optional[int]): total number of re-runs allowed
+            for the whole run, `None` falls back to
+            `DEFAULT_RETRY_BUDGET`
+    """
+
+    def __init__(self, total: Optional[int] = None):
+        self.total = DEFAULT_RETRY_BUDGET if total is None else total
+        self.used = 0
+
+    @property
+    def remaining(self) -> int:
+        return max(self.total - self.used, 0)
+
+    def consume(self) -> bool:
+        """Takes one re-run from the budget.
+
+        Returns:
+            `True` if the budget allowed another re-run,
+                `False` if it has been exhausted
+        """
+        if self.remaining > 0:
+            self.used += 1
+            return True
+        return False
+
+
+class _RecordingResult(unittest.TestResult):
+    """`TestResult` that remembers outcome calls so that
+    they can be replayed on another result object.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.calls: List[Tuple[str, Tuple[Any, ...]]] = []
+
+    def _record(self, name: str, *args):
+        self.calls.append((name, args))
+
+    def addSuccess(self, test):  # noqa: N802 `unittest` API
+        super().addSuccess(test)
+        self._record('addSuccess', test)
+
+    def addFailure(self, test, err):  # noqa: N802 `unittest` API
+        super().addFailure(test, err)
+        self._record('addFailure', test, err)
+
+    def addError(self, test, err):  # noqa: N802 `unittest` API
+        super().addError(test, err)
+        self._record('addError', test, err)
+
+    def addSkip(self, test, reason):  # noqa: N802 `unittest` API
+        super().addSkip(test, reason)
+        self._record('addSkip', test, reason)
+
+    def addExpectedFailure(self, test, err):  # noqa: N802 `unittest` API
+        super().addExpectedFailure(test, err)
+        self._record('addExpectedFailure', test, err)
+
+    def addUnexpectedSuccess(self, test):  # noqa: N802 `unittest` API
+        super().addUnexpectedSuccess(test)
+        self._record('addUnexpectedSuccess', test)
+
+    def addSubTest(self, test, subtest, err):  # noqa: N802 `unittest` API
+        super().addSubTest(test, subtest, err)
+        self._record('addSubTest', test, subtest, err)
+
+    def addDuration(self, test, elapsed):  # noqa: N802 `unittest` API (3.12+)
+        self._record('addDuration', test, elapsed)
+
+    @property
+    def failed(self) -> bool:
+        return len(self.failures) > 0 or len(self.errors) > 0
+
+    def replay(self, result: unittest.TestResult):
+        for name, args in self.calls:
+            method = getattr(result, name, None)
+            if method:
+                method(*args)
+
+
+def iterate_tests(suite: unittest.TestSuite) -> Iterator[unittest.TestCase]:
+    """Flattens (possibly nested) test suites into single tests."""
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from iterate_tests(test)
+        else:
+            yield test
+
+
+def run_with_retries(
+    test: unittest.TestCase,
+    run_once: Callable[[unittest.TestResult], Any],
+    result: unittest.TestResult,
+    retries: int,
+    budget: Optional[RetryBudget] = None
+):
+    """Runs a single test, re-running it on failure or error
+    until it passes, `retries` re-runs have been made or
+    the `budget` has been exhausted.
+
+    The real `result` sees a single test start and stop around
+    all attempts (so captured output of every attempt ends up
+    in the report) and only the outcome of the final attempt.
+    The number of `attempts` and whether the test `passed_on_retry`
+    are set on the test before the outcome is forwarded, so that
+    the result can report them.
+
+    Args:
+        test (unittest.TestCase): the test to run
+        run_once (Callable[[unittest.TestResult], Any]): runs one
+            attempt of the test against a given result object
+        result (unittest.TestResult): the real test result
+        retries (int): maximum number of re-runs for this test
+        budget (Optional[RetryBudget]): run-wide budget of re-runs,
+            `None` for no limit other than `retries`
+    """
+    attempt = 0
+    passed_on_retry = False
+    result.startTest(test)
+    try:
+        while True:
+            attempt += 1
+            recorder = _RecordingResult()
+            run_once(recorder)
+            if not recorder.failed \
+                    or attempt > retries \
+                    or getattr(result, 'shouldStop', False):
+                break
+            if budget is not None and not budget.consume():
+                print(f"Retry budget exhausted, not retrying {test.id()}")
+                break
+            print(f"{test.id()} did not pass on attempt {attempt}, "
+                  f"retrying ({attempt}/{retries})")
+        if attempt > 1 and not recorder.failed:
+            passed_on_retry = True
+            print(f"{test.id()} passed on retry (attempt {attempt})")
+        test.attempts = attempt  # type: ignore
+        test.passed_on_retry = passed_on_retry  # type: ignore
+        recorder.replay(result)
+    finally:
+        result.stopTest(test)
@@ -1,12 +1,10 @@
 __docformat__ = "google"
 
 import unittest
-import argparse
-import xmlrunner
 import os.path
-import platform
-import inspect
-import webbrowser
+import sys
+import time
+import uuid
 
 from unittest import TextTestRunner, TestLoader
 from unittest import TestResult
@@ -14,28 +12,51 @@ from unittest.result import failfast
 from unittest.main import TestProgram
 
 from types import ModuleType
-from parameterized import parameterized
-from typing import Callable, Dict, Iterator, Optional, Tuple
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, Optional, Tuple
 
 from .utils import get_ts
-from .filter import apply_filters
+from .filter import apply_filters, uses_history
+from .history import ResultHistory, flaky_tests
+from .last_result_filter import LastResultIndex
 from .smuggle import smuggle
 from .config import (Collector, CollectorArtifact, Config,
                      PathOrIdForWhatIf, CliConfig, Trigger)
 from .test_case import TestCase
 from .log import close_all
+from .events import EventStream
+from .log_index import format_record, search_logs
+from .report import XMLTestResult, XMLTestRunner
+from .retry import RetryBudget, iterate_tests
+from . import last_result_filter, timings
+from .timings import DEFAULT_TOP, SETUP, TEARDOWN, TESTS, timed
+from .profiling import MODES as PROFILING_MODES, SuiteProfiler, profiles_dir
+from .plan import make_plan, read_plan, tests_from_plan, trigger_from_plan, whatif_names, write_plan
 from .collectors import (_collect_test_case_v1_x, _collect_test_case_v2_0,
                          _collect_test_case_from_module)
 
+if TYPE_CHECKING:
+    import argparse
+
 kalash = ModuleType('kalash')
 
 
-__all__ = (
+__all__ = (  # noqa: F822 `parameterized` is provided by `__getattr__`
     'unittest', 'TextTestRunner', 'TestResult',
     'TestProgram', 'failfast', 'MetaLoader', 'main', 'TestCase',
     'get_ts', 'parameterized'
 )
 
+
+def __getattr__(name: str):
+    # `parameterized` imports `unittest.mock` and `asyncio` with it,
+    # import it only when a test file asks for it
+    if name == 'parameterized':
+        from parameterized import parameterized
+        globals()[name] = parameterized
+        return parameterized
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # ====================
 # Public Utilities
 # ====================
@@ -79,6 +100,15 @@ COLLECTOR_FUNC_LOOKUP['2.0'] = _collect_test_case_v2_0
 # =============================================================================
 
 
+def _cli_or_config(kalash_trigger: Trigger, name: str):
+    """Returns a run option set on the command line or,
+    if it wasn't, in the `config` section."""
+    value = getattr(kalash_trigger.cli_config, name, None)
+    if value is None and kalash_trigger.config:
+        value = getattr(kalash_trigger.config, name, None)
+    return value
+
+
 def prepare_suite(
     kalash_trigger: Trigger
 ) -> Iterator[CollectorArtifact]:
@@ -100,6 +130,11 @@ def prepare_suite(
         One or more `CollectArtifact` elements.
     """
 
+    # the report directory is indexed (or the result history opened)
+    # once and shared by all `Test` blocks that filter on `last_result`
+    last_result_index: Optional[LastResultIndex] = None
+    history: Optional[ResultHistory] = None
+
     for test_idx, test_conf in enumerate(kalash_trigger.tests):
 
         # set up path (if exists) and non-filter keys
@@ -114,13 +149,36 @@ def prepare_suite(
         if no_recurse_from_file is not None:
             cli_config.no_recurse = cli_config.no_recurse or no_recurse_from_file
 
-        yield apply_filters(
+        if test_conf.last_result:
+            if uses_history(test_conf, cli_config.spec.test):
+                if history is None:
+                    history = ResultHistory.in_report_dir(kalash_trigger.config.report)
+            elif last_result_index is None:
+                last_result_index = LastResultIndex(kalash_trigger.config.report).refresh()
+
+        suite, identifiers = apply_filters(
             test_conf,
             path,
             COLLECTOR_FUNC_LOOKUP,
-            kalash_trigger
+            kalash_trigger,
+            last_result_index,
+            history
         )
 
+        # retries declared on the `Test` block win over the run-wide default
+        # which comes from the CLI or the `config` section (in that order)
+        retries = test_conf.retries
+        if retries is None:
+            retries = _cli_or_config(kalash_trigger, 'retries')
+        if retries:
+            for test in iterate_tests(suite):
+                test.retries = retries
+
+        yield suite, identifiers
+
+    if history:
+        history.close()
+
 
 class MetaLoader(TestLoader):
 
@@ -250,11 +308,33 @@ class MetaLoader(TestLoader):
 
     def one_time_setup(self):
         """Runs One-time-setup script"""
-        self._smuggle_fixture_module(True)
+        with timed(SETUP):
+            self._smuggle_fixture_module(True)
 
     def one_time_teardown(self):
         """Runs One-time-teardown script"""
-        self._smuggle_fixture_module(False)
+        with timed(TEARDOWN):
+            self._smuggle_fixture_module(False)
+
+
+class PlanLoader(MetaLoader):
+
+    def __init__(self, plan_path: str, cli_config: CliConfig):
+        """
+        `MetaLoader` loading the tests of a plan written by
+        `kalash plan` instead of collecting them (see: `kalash.plan`).
+
+        Args:
+            plan_path (str): path to the plan
+            cli_config (CliConfig): `CliConfig` of this run
+        """
+        self._plan = read_plan(plan_path)
+        super().__init__(trigger=trigger_from_plan(self._plan, cli_config), local=False)
+
+    def loadTestsFromKalashYaml(self) -> CollectorArtifact:  # noqa: E501,N802 keeping in line with `unittest` camelCase naming
+        """Loads the planned tests"""
+        self.suite.addTests(tests_from_plan(self._plan, self.trigger))
+        return self.suite, whatif_names(self._plan, self.trigger.cli_config)
 
 
 # -----------------------------------------------------------------
@@ -270,7 +350,7 @@ def run_test_suite(
     loader: MetaLoader,
     kalash_trigger: Trigger,
     whatif_callback: Callable[[str], None] = print
-) -> Tuple[Optional[xmlrunner.runner._XMLTestResult], int]:
+) -> Tuple[Optional[XMLTestResult], int]:
     """Accepts a loader and a `Trigger` object
     and triggers the test run.
 
@@ -288,7 +368,40 @@ def run_test_suite(
             a tuple of (`None`, return code) when running
             in the what-if mode
     """
+    cli_config = kalash_trigger.cli_config
+    if cli_config.run_id:
+        return _run_test_suite(loader, kalash_trigger, whatif_callback)
+    # one ID per run, shared by the run events, timings, the result
+    # history and the JSON logs; a cached `Trigger` may be run again
+    cli_config.run_id = uuid.uuid4().hex
+    try:
+        return _run_test_suite(loader, kalash_trigger, whatif_callback)
+    finally:
+        cli_config.run_id = None
+
+
+def _run_test_suite(
+    loader: MetaLoader,
+    kalash_trigger: Trigger,
+    whatif_callback: Callable[[str], None]
+) -> Tuple[Optional[XMLTestResult], int]:
+    events = EventStream(
+        _cli_or_config(kalash_trigger, 'events'),
+        kalash_trigger.cli_config.run_id
+    )
+    run_start = time.monotonic()
+    if kalash_trigger.cli_config.timings is not None:
+        timings.start(events.run_id)
+
+    events.emit('collection_started')
     suite, whatif_names = loader.loadTestsFromKalashYaml()
+    # keep references, `TestSuite` drops its tests once they have run
+    tests = list(iterate_tests(suite))
+    events.emit(
+        'collection_finished',
+        tests=len(tests),
+        duration=round(time.monotonic() - run_start, 6)
+    )
 
     return_code = 0
 
@@ -302,11 +415,42 @@ def run_test_suite(
                     "Missing report directory configuration. Check if the YAML config you used "
                     "declares an output directory path for the test reports"
                 )
-        result: xmlrunner.runner._XMLTestResult = xmlrunner.XMLTestRunner(
-            output=report,
-            failfast=kalash_trigger.cli_config.fail_fast
-        ).run(suite)
+        budget = RetryBudget(_cli_or_config(kalash_trigger, 'retry_budget'))
+        profiler = None
+        if kalash_trigger.cli_config.profile:
+            profiler = SuiteProfiler(kalash_trigger.cli_config.profile, profiles_dir(report))
+        for test in tests:
+            test.retry_budget = budget
+            test.profiler = profiler
+        history = ResultHistory.in_report_dir(report, events.run_id)
+        try:
+            with timed(TESTS):
+                result: XMLTestResult = XMLTestRunner(
+                    output=report,
+                    failfast=kalash_trigger.cli_config.fail_fast,
+                    output_limit=_cli_or_config(kalash_trigger, 'output_limit'),
+                    events=events,
+                    history=history
+                ).run(suite)
+        finally:
+            history.close()
         loader.one_time_teardown()
+        _report_timings(kalash_trigger)
+        if profiler and profiler.close():
+            print(profiler.format())
+            print(f"Profiles written to {profiler.output}")
+
+        passed_on_retry = [t.id() for t in tests if getattr(t, 'passed_on_retry', False)]
+        if budget.used:
+            print(f"Retries used: {budget.used}/{budget.total}, "
+                  f"passed on retry: {len(passed_on_retry)}")
+            for test_id in passed_on_retry:
+                print(f"  {test_id}")
+        if result.leaks:
+            print(f"Tests leaving file descriptors or threads open: {len(result.leaks)}")
+            for test_id, used in result.leaks:
+                print(f"  {test_id} (file descriptors: {used.get('open_fds_delta', 0):+d}, "
+                      f"threads: {used.get('threads_delta', 0):+d})")
 
         # PRODTEST-4708 -> Jenkins needs a non-zero return code
         #                  on test failure
@@ -316,14 +460,44 @@ def run_test_suite(
         elif len(result.errors) > 0:
             return_code = 2
 
+        events.emit(
+            'run_finished',
+            tests=result.testsRun,
+            failures=len(result.failures),
+            errors=len(result.errors),
+            skipped=len(result.skipped),
+            return_code=return_code,
+            duration=round(time.monotonic() - run_start, 6)
+        )
+        events.close()
+
         return result, return_code
 
     else:
         for n in whatif_names:
             whatif_callback(n)
+        _report_timings(kalash_trigger)
+        events.emit(
+            'run_finished',
+            tests=0,
+            return_code=return_code,
+            duration=round(time.monotonic() - run_start, 6)
+        )
+        events.close()
         return None, return_code
 
 
+def _report_timings(kalash_trigger: Trigger):
+    """Prints the recorded timings, if any, and writes
+    them into the report directory."""
+    recorded = timings.stop()
+    if recorded:
+        top = kalash_trigger.cli_config.timings
+        print(recorded.format(top))
+        if kalash_trigger.config and kalash_trigger.config.report:
+            print(f"Timings written to {recorded.write(kalash_trigger.config.report, top)}")
+
+
 def run(
     kalash_trigger: Trigger,
     whatif_callback: Callable[[str], None] = print
@@ -342,9 +516,9 @@ def run(
         Return code, 0 if all collected tests are passing.
             A non-zero return code indicates failure.
     """
-    frame = inspect.stack()[1]
-    module = inspect.getmodule(frame[0])
-    module_path = module.__file__ if module else None
+    # path of the calling module, without `inspect.stack()` which
+    # reads the source of every frame on the stack:
+    module_path = sys._getframe(1).f_globals.get('__file__')
     loader = MetaLoader(
         module_path,
         local=False,
@@ -362,7 +536,8 @@ def make_loader_and_trigger_object(
     config: CliConfig
 ) -> Tuple[MetaLoader, Trigger]:
     """Prepares a ``MetaLoader`` based
-    on the YAML file parameters.
+    on the YAML file parameters, or a ``PlanLoader``
+    if a plan should be run (`plan` on the `CliConfig`).
 
     Args:
         cli_config (CliConfig): a `CliConfig` object representing
@@ -374,6 +549,10 @@ def make_loader_and_trigger_object(
     Returns:
         A tuple of (`MetaLoader` instance, `Trigger` instance)
     """
+    if config.plan:
+        loader: MetaLoader = PlanLoader(config.plan, config)
+        return loader, loader.trigger
+
     kalash_trigger = Trigger.infer_trigger(config)
 
     loader = MetaLoader(
@@ -386,6 +565,9 @@ def make_loader_and_trigger_object(
 
 def docs():
     """Open bundled documentation in the web browser."""
+    import platform
+    import webbrowser
+
     base_dir = os.path.dirname(__file__)
     rel_docpath = ['built_docs', 'kalash.html']
     docpath = os.path.join(base_dir, *rel_docpath)
@@ -399,11 +581,129 @@ def docs():
     webbrowser.open(url, new=2)
 
 
+def print_flaky_tests(
+    report_dir: str,
+    window: Optional[int] = None,
+    threshold: Optional[float] = None,
+    since: Optional[str] = None,
+    print_callback: Callable[[str], None] = print
+):
+    """Prints tests of the result history in a report directory
+    whose flakiness score is at least `threshold`.
+
+    Args:
+        report_dir (str): report directory holding the result history
+        window (Optional[int]): number of most recent runs of each test
+            the score is computed over
+        threshold (Optional[float]): minimal flakiness score
+        since (Optional[str]): only consider runs since a period back
+            in time (e.g. `7d`) or an ISO date
+        print_callback (Callable[[str], None]): the function
+            to call for every printed line
+    """
+    history = ResultHistory.in_report_dir(report_dir)
+    try:
+        flaky = flaky_tests(history, window, threshold, since)
+    finally:
+        history.close()
+    if not flaky:
+        print_callback("No flaky tests found")
+        return
+    print_callback(f"{'score':>6} {'runs':>5}  test")
+    for test_id, score, runs in flaky:
+        print_callback(f"{score:>6.2f} {runs:>5}  {test_id}")
+
+
+def print_logs(
+    log_dir: str,
+    test_id: Optional[str] = None,
+    level: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    run_id: Optional[str] = None,
+    pattern: Optional[str] = None,
+    print_callback: Callable[[str], None] = print
+):
+    """Prints structured log records of all indexed runs
+    matching the given criteria (see: `kalash.log_index.search_logs`).
+
+    Args:
+        log_dir (str): log base directory holding the log index
+        test_id (Optional[str]): test ID, may contain wildcards
+        level (Optional[str]): minimal level name or number
+        since (Optional[str]): earliest record, a period back in time
+            (e.g. `7d`) or an ISO date
+        until (Optional[str]): latest record, same format as `since`
+        run_id (Optional[str]): ID of the run
+        pattern (Optional[str]): regular expression searched for
+            in the messages
+        print_callback (Callable[[str], None]): the function
+            to call for every printed record
+    """
+    for record in search_logs(log_dir, test_id, level, since, until, run_id, pattern):
+        print_callback(format_record(record))
+
+
+def write_plan_file(
+    config: CliConfig,
+    output: str,
+    print_callback: Callable[[str], None] = print
+) -> int:
+    """Collects and filters the tests of a configuration file once
+    and writes them into a plan to be run with `run --plan`
+    (see: `kalash.plan`).
+
+    Args:
+        config (CliConfig): `CliConfig` pointing to the configuration file
+        output (str): path to the plan file
+        print_callback (Callable[[str], None]): the function
+            to call for the summary line
+
+    Returns:
+        Number of planned tests
+    """
+    _, kalash_trigger = make_loader_and_trigger_object(config)
+    tests = [
+        test
+        for suite, _ in prepare_suite(kalash_trigger)
+        for test in iterate_tests(suite)
+    ]
+    write_plan(make_plan(kalash_trigger, tests), output)
+    print_callback(f"Planned {len(tests)} tests in {output}")
+    return len(tests)
+
+
+def _plan_command(args: 'argparse.Namespace', config: CliConfig) -> int:
+    write_plan_file(config, args.output)
+    return 0
+
+
+def _stats_command(args: 'argparse.Namespace', config: CliConfig) -> int:
+    report_dir = args.report_dir
+    if not report_dir:
+        _, kalash_trigger = make_loader_and_trigger_object(config)
+        report_dir = kalash_trigger.config.report
+    print_flaky_tests(report_dir, args.window, args.threshold, args.since)
+    return 0
+
+
+def _logs_command(args: 'argparse.Namespace', config: CliConfig) -> int:
+    print_logs(
+        args.log_dir, args.id, args.level, args.since, args.until, args.run, args.grep
+    )
+    return 0
+
+
 def main_cli():
     """
     Main function. Expected to be run from CLI and used
     only in automated context.
     """
+    import argparse
+
+    # the `kalash` command guards its entry point, worker processes
+    # spawned to parse reports can import it again safely
+    last_result_filter.SPAWN_SAFE = True
     config = CliConfig()
 
     parser = argparse.ArgumentParser(description='Test automation runner')
@@ -421,6 +721,7 @@ def main_cli():
 
     # `run` subcommand:
     parser_run = subparsers.add_parser('run', help='run an analysis')
+    parser_run.set_defaults(command='run')
     parser_run.add_argument(
         '-f', '--file',
         type=str, help='Path to .kalash.yaml')
@@ -433,6 +734,20 @@ def main_cli():
     parser_run.add_argument(
         '-ff', '--fail-fast',
         action='store_true', help='Fail suite if at least one test fails')
+    parser_run.add_argument(
+        '-r', '--retries',
+        type=int, help='Re-run failed or errored tests in-process up to this many times')
+    parser_run.add_argument(
+        '-rb', '--retry-budget',
+        type=int, help='Total number of re-runs allowed in the whole run '
+                       '(default is 10)')
+    parser_run.add_argument(
+        '-ol', '--output-limit',
+        type=int, help='Characters of output per test kept in memory and in the report, '
+                       'longer output is truncated and stored in full next to the reports')
+    parser_run.add_argument(
+        '-ev', '--events',
+        type=str, help='Append run events to this JSON Lines file as they happen')
     parser_run.add_argument(
         '-nl', '--no-log',
         action='store_true', help='Disable logging')
@@ -454,11 +769,57 @@ def main_cli():
     parser_run.add_argument(
         '-lf', '--log-format',
         type=str, help=f'Log format string, default is %{config.spec.cli_config.log_formatter}')
+    parser_run.add_argument(
+        '-la', '--log-async',
+        action='store_true', help='Write logs from a background thread so that '
+                                  'logging never blocks tests on disk or console I/O')
+    parser_run.add_argument(
+        '-lq', '--log-queue-size',
+        type=int, help='Log records waiting for the background thread '
+                       'when using --log-async (default is 10000)')
+    parser_run.add_argument(
+        '-lo', '--log-overflow',
+        type=str, choices=['block', 'drop'],
+        help='What to do with a log record when the --log-async queue is full: '
+             'wait for the background thread (block, default) or discard the record (drop)')
+    parser_run.add_argument(
+        '-lr', '--log-echo-rate',
+        type=int, help='Maximal number of log lines per second echoed to STDOUT, '
+                       'the log files still get every line')
+    parser_run.add_argument(
+        '-lm', '--log-max-bytes',
+        type=int, help='Rotate a log file once it reaches this size')
+    parser_run.add_argument(
+        '-lb', '--log-backups',
+        type=int, help='Number of rotated files kept per log (default is 1), '
+                       'with 0 a full log file is started over')
+    parser_run.add_argument(
+        '-lc', '--log-compress',
+        action='store_true', help='Gzip rotated log files and log files of finished tests')
+    parser_run.add_argument(
+        '-lj', '--log-json',
+        action='store_true', help='Also write logs as JSON lines indexed in the log '
+                                  'directory, to be searched with `kalash logs`')
     parser_run.add_argument(
         '-g', '--group-by',
         type=str, help='Log directories grouping: '
                        f'<{config.spec.cli_config.group_device}|'
                        f'{config.spec.cli_config.group_group}>')
+    parser_run.add_argument(
+        '-p', '--plan',
+        type=str, help='Run the tests of a plan written by `kalash plan` '
+                       'instead of collecting them')
+    parser_run.add_argument(
+        '-pr', '--profile',
+        type=str, nargs='?', const=PROFILING_MODES[0], choices=PROFILING_MODES,
+        help='Run every test under a profiler and save the profiles into the report '
+             'directory: `cprofile` (default) or the low-overhead `sampling`')
+    parser_run.add_argument(
+        '-tm', '--timings',
+        type=int, nargs='?', const=DEFAULT_TOP,
+        help='Print the time spent in each phase of the run, with the given number '
+             f'of slowest files per collection phase ({DEFAULT_TOP} by default), '
+             'and write it as JSON into the report directory')
     parser_run.add_argument(
         '-wi', '--what-if',
         type=str, help='Collects the tests but does not run them '
@@ -469,19 +830,82 @@ def main_cli():
                        'to modify the output behavior of the what-if flag.'
     )
 
+    # `plan` subcommand:
+    parser_plan = subparsers.add_parser(
+        'plan', help='collect tests into a plan run with `run --plan`')
+    parser_plan.set_defaults(command='plan', handler=_plan_command)
+    parser_plan.add_argument(
+        '-f', '--file',
+        type=str, help='Path to .kalash.yaml')
+    parser_plan.add_argument(
+        '-o', '--output',
+        type=str, default='kalash_plan.json', help='Path to the plan file '
+                                                   '(default is `kalash_plan.json`)')
+
+    # `stats` subcommand:
+    parser_stats = subparsers.add_parser('stats', help='show statistics from the result history')
+    parser_stats.set_defaults(command='stats', handler=_stats_command)
+    parser_stats.add_argument(
+        'statistic',
+        choices=['flaky'], help='`flaky` lists tests by their flakiness score')
+    parser_stats.add_argument(
+        '-f', '--file',
+        type=str, help='Path to .kalash.yaml, the history is read from its report directory')
+    parser_stats.add_argument(
+        '-rd', '--report-dir',
+        type=str, help='Report directory holding the result history')
+    parser_stats.add_argument(
+        '-w', '--window',
+        type=int, help='Number of most recent runs of each test to score (default is 10)')
+    parser_stats.add_argument(
+        '-t', '--threshold',
+        type=float, help='Minimal flakiness score from 0 to 1 (default is 0.2)')
+    parser_stats.add_argument(
+        '-s', '--since',
+        type=str, help='Only consider runs since a period back in time (e.g. `7d`) '
+                       'or an ISO date')
+
+    # `logs` subcommand:
+    parser_logs = subparsers.add_parser('logs', help='search JSON logs of past runs')
+    parser_logs.set_defaults(command='logs', handler=_logs_command)
+    parser_logs.add_argument(
+        '-ld', '--log-dir',
+        type=str, default='.', help='Log base directory holding the log index')
+    parser_logs.add_argument(
+        '-i', '--id',
+        type=str, help='Test ID, `*` and `?` wildcards are allowed')
+    parser_logs.add_argument(
+        '-l', '--level',
+        type=str, help='Minimal log level, a name (e.g. `ERROR`) or a number')
+    parser_logs.add_argument(
+        '-s', '--since',
+        type=str, help='Earliest record, a period back in time (e.g. `7d`) or an ISO date')
+    parser_logs.add_argument(
+        '-u', '--until',
+        type=str, help='Latest record, a period back in time or an ISO date')
+    parser_logs.add_argument(
+        '-ru', '--run',
+        type=str, help='ID of the run (as in the run events)')
+    parser_logs.add_argument(
+        '-g', '--grep',
+        type=str, help='Regular expression searched for in the messages')
+
     args = parser.parse_args()
 
     if args.docs:
         docs()
         return 0
 
-    if args.file:
+    if getattr(args, 'file', None):
         config.file = args.file
 
     if args.spec_config:
         config.spec_path = args.spec_config
     config.__post_init__()
 
+    if getattr(args, 'handler', None):
+        return args.handler(args, config)
+
     if args.log_dir:
         config.log_dir = args.log_dir
     if args.group_by:
@@ -492,6 +916,14 @@ def main_cli():
         config.log_format = args.log_format
     if args.what_if:
         config.what_if = args.what_if
+    # options passed on to `CliConfig` as they are, when given:
+    for option in ('retries', 'retry_budget', 'output_limit', 'events',
+                   'log_async', 'log_queue_size', 'log_overflow', 'log_echo_rate',
+                   'log_max_bytes', 'log_backups', 'log_compress', 'log_json', 'plan',
+                   'timings', 'profile'):
+        value = getattr(args, option)
+        if value is not None:
+            setattr(config, option, value)
 
     loader, kalash_trigger = make_loader_and_trigger_object(
         config
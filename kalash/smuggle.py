@@ -4,12 +4,13 @@ related to path handling.
 """
 __docformat__ = "google"
 
-import inspect
 import os
 import sys
 import importlib.util
 from types import ModuleType
 
+from .timings import IMPORTING, timed
+
 
 def smuggle(module_file: str) -> ModuleType:
     """
@@ -29,7 +30,7 @@ def smuggle(module_file: str) -> ModuleType:
         if os.path.isabs(module_file):
             abs_path = module_file
         else:
-            directory = os.path.dirname(inspect.stack()[1][1])
+            directory = os.path.dirname(sys._getframe(1).f_code.co_filename)
             abs_path = os.path.normpath(os.path.join(directory, module_file))
 
         sys.path.append(os.path.dirname(abs_path))
@@ -40,7 +41,8 @@ def smuggle(module_file: str) -> ModuleType:
             sys.modules[module_name] = module
             if spec.loader:
                 exec_module = getattr(spec.loader, 'exec_module')
-                exec_module(module)
+                with timed(IMPORTING, abs_path):
+                    exec_module(module)
 
             return module
 
@@ -3,15 +3,17 @@ from __future__ import annotations
 __docformat__ = "google"
 
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, Tuple, Type
 
-import yaml
+import os
+
+from . import yaml_backend
 
 SpecPath = str
 SpecKey = str
 
 
-@dataclass
+@dataclass(frozen=True)
 class BaseSpec:
 
     @classmethod
@@ -19,7 +21,7 @@ class BaseSpec:
         return cls(**kwargs)
 
 
-@dataclass
+@dataclass(frozen=True)
 class CliConfigSpec(BaseSpec):
     """
     `CliConfig` specification.
@@ -38,7 +40,7 @@ class CliConfigSpec(BaseSpec):
     log_formatter: SpecKey
 
 
-@dataclass
+@dataclass(frozen=True)
 class MetaSpec(BaseSpec):
     """
     Metadata section Spec.
@@ -67,7 +69,7 @@ class MetaSpec(BaseSpec):
     functionality: SpecKey
 
 
-@dataclass
+@dataclass(frozen=True)
 class TestSpec(BaseSpec):
     """
     A block is a single element in the YAML array
@@ -80,6 +82,11 @@ class TestSpec(BaseSpec):
         usecase (SpecKey): use cases to filter against
         no_recurse (SpecKey): disable recursive iteration over test directories
         last_result (SpecKey): filtering by last result
+        last_result_runs (SpecKey): number of recorded runs `last_result` looks at
+        last_result_count (SpecKey): minimal number of recorded runs matching `last_result`
+        last_result_since (SpecKey): period of recorded runs `last_result` looks at
+        flaky (SpecKey): value used for a test with a flakiness score above a threshold
+        flaky_threshold (SpecKey): minimal flakiness score of tests selected as flaky
         devices (SpecKey): devices section (experimental device injection)
         parameters (SpecKey): parameters (experimental parameters injection)
         workbench (SpecKey): workbench that the filtered test is supposed to run on
@@ -88,6 +95,7 @@ class TestSpec(BaseSpec):
         interp_this_file (SpecKey): points to the current YAML file path
         ok (SpecKey): value used for a test that passed last time
         nok (SpecKey): value used for a test that failed or errored out last time
+        retries (SpecKey): number of in-process re-runs of failed tests
         non_filters (SpecKey): list of properties that cannot be used like standard filters
     """
     tests: SpecKey
@@ -106,19 +114,31 @@ class TestSpec(BaseSpec):
     interp_this_file: SpecKey
     ok: SpecKey
     nok: SpecKey
+    retries: SpecKey = 'retries'
+    last_result_runs: SpecKey = 'last_result_runs'
+    last_result_count: SpecKey = 'last_result_count'
+    last_result_since: SpecKey = 'last_result_since'
+    flaky: SpecKey = 'FLAKY'
+    flaky_threshold: SpecKey = 'flaky_threshold'
 
     def __post_init__(self):
-        self.non_filters: List[SpecKey] = [
+        # frozen, see: `Spec.load_spec`
+        object.__setattr__(self, 'non_filters', (
             self.path,
             self.no_recurse,
             self.setup_script,
             self.teardown_script,
+            self.retries,
+            self.last_result_runs,
+            self.last_result_count,
+            self.last_result_since,
+            self.flaky_threshold,
             self.interp_cwd,
             self.interp_this_file
-        ]
+        ))
 
 
-@dataclass
+@dataclass(frozen=True)
 class ConfigSpec(BaseSpec):
     """
     Config section is free to have any other elements.
@@ -130,22 +150,34 @@ class ConfigSpec(BaseSpec):
         report (SpecKey): location of the report folder
         one_time_setup_script (SpecKey): setup script key
         one_time_teardown_script (SpecKey): teardown script key
+        retries (SpecKey): default number of in-process re-runs of failed tests
+        retry_budget (SpecKey): total number of re-runs allowed in a run
+        output_limit (SpecKey): captured output per test kept in memory and in the report
+        events (SpecKey): JSON Lines file receiving run events
     """
     cfg: SpecKey
     report: SpecKey
     one_time_setup_script: SpecKey
     one_time_teardown_script: SpecKey
     run_only_with: SpecKey
+    retries: SpecKey = 'retries'
+    retry_budget: SpecKey = 'retry_budget'
+    output_limit: SpecKey = 'output_limit'
+    events: SpecKey = 'events'
 
     def __post_init__(self):
-        self.non_attachable: List[SpecKey] = [
+        object.__setattr__(self, 'non_attachable', (
             self.report,
             self.one_time_setup_script,
-            self.one_time_teardown_script
-        ]
+            self.one_time_teardown_script,
+            self.retries,
+            self.retry_budget,
+            self.output_limit,
+            self.events
+        ))
 
 
-@dataclass
+@dataclass(frozen=True)
 class Spec(BaseSpec):
     """
     This class defines naming patterns for
@@ -159,6 +191,9 @@ class Spec(BaseSpec):
     this file. You should always use the `load_spec`
     classmethod to instantiate `Spec`. The default
     constructor remains there for true hackers.
+
+    `Spec` instances are immutable, a single instance
+    per specification file is shared by all `CliConfig`s.
     """
 
     cli_config: CliConfigSpec
@@ -168,8 +203,27 @@ class Spec(BaseSpec):
 
     @classmethod
     def load_spec(cls, spec_path: SpecPath) -> Spec:
+        """Loads a specification file, parsing it only once per
+        process unless it has been modified since.
+
+        Args:
+            spec_path (SpecPath): path to the specification YAML
+
+        Returns:
+            The shared `Spec` instance of the file
+        """
+        path = os.path.realpath(spec_path)
+        stat = os.stat(path)
+        key = (cls, path, stat.st_mtime_ns, stat.st_size)
+        spec = _SPEC_CACHE.get(key)
+        if spec is None:
+            spec = _SPEC_CACHE[key] = cls._parse_spec(path)
+        return spec
+
+    @classmethod
+    def _parse_spec(cls, spec_path: SpecPath) -> Spec:
         with open(spec_path, 'r') as f:
-            yaml_obj = yaml.full_load(f)
+            yaml_obj = yaml_backend.load(f, full=True)
         yaml_obj: Dict[str, Dict[str, SpecKey]] = yaml_obj
         return cls(
             CliConfigSpec.from_kwargs(
@@ -185,3 +239,7 @@ class Spec(BaseSpec):
                 **yaml_obj['meta']
             )
         )
+
+
+# (class, real path, mtime, size) -> parsed `Spec`
+_SPEC_CACHE: Dict[Tuple[Type[Spec], str, int, int], Spec] = {}
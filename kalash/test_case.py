@@ -1,11 +1,15 @@
 __docformat__ = "google"
 
+from contextlib import nullcontext
 from typing import List, Optional
+import sys
 import unittest
 import logging
 
 from .config import CliConfig, Meta, Trigger
-from .log import get, close
+from .log import flush_console, get, release, suspend
+from .profiling import SuiteProfiler
+from .retry import RetryBudget, run_with_retries
 
 
 class TestCase(unittest.TestCase):
@@ -41,8 +45,32 @@ class TestCase(unittest.TestCase):
         methodName (str): test method
         id (str): test ID from the metadata tag
         trigger (Trigger): `Trigger` instance
+
+    Attributes:
+        retries (int): how many times the test is re-run
+            if it fails or errors out, set at collection time
+        retry_budget (Optional[RetryBudget]): run-wide budget
+            of re-runs shared by all tests of a run
+        attempts (int): number of attempts made in the last run
+        passed_on_retry (bool): `True` if the test failed at first
+            and passed on one of the re-runs
+        collected_from (Optional[str]): absolute path to the test
+            file the test has been collected from
+        profiler (Optional[SuiteProfiler]): run-wide profiler the
+            test runs under when profiling is on (`--profile`)
+        logger (logging.Logger): logger of the test class, created
+            when the test starts running (or when first accessed),
+            its log file is only created once something is logged
+            and closed as soon as the test finishes
     """
 
+    retries: int = 0
+    retry_budget: Optional[RetryBudget] = None
+    attempts: int = 0
+    passed_on_retry: bool = False
+    collected_from: Optional[str] = None
+    profiler: Optional[SuiteProfiler] = None
+
     def __init__(
         self,
         methodName: str,  # noqa: N803 `methodName` is a `unittest` arg, we don't modify the name
@@ -58,25 +86,39 @@ class TestCase(unittest.TestCase):
         self.no_log_echo = cli_config.no_log_echo if cli_config else None
         self.meta = meta
         self.trigger = trigger
-
-        # inject logger:
-        if cli_config:
-            if not cli_config.no_log:
-                self.logger = get(
-                    id,
+        self._cli_config = cli_config
+        self._logger: Optional[logging.Logger] = None
+        self._logger_acquired = False
+
+    @property
+    def logger(self) -> logging.Logger:
+        # the logger is injected lazily, so that collecting
+        # thousands of tests doesn't touch the file system
+        if self._logger is None:
+            cli_config = self._cli_config
+            if cli_config and not cli_config.no_log:
+                self._logger = get(
+                    self._id,
                     self.__class__.__name__,
                     self.meta,
                     cli_config
                 )
+                self._logger_acquired = True
             else:
                 # create dummy non-functional logger on the spot when
                 # running with `log=False`
-                self.logger = logging.getLogger(self.__class__.__name__)
-                # close and clear all handlers that sb could have opened
-                # by accident
-                for h in self.logger.handlers:
-                    h.close()
-                self.logger.handlers = []
+                self._logger = logging.getLogger(self.__class__.__name__)
+                if cli_config:
+                    # close and clear all handlers that sb could have opened
+                    # by accident
+                    for h in self._logger.handlers:
+                        h.close()
+                    self._logger.handlers = []
+        return self._logger
+
+    @logger.setter
+    def logger(self, logger: logging.Logger):
+        self._logger = logger
 
     def allow_when(self, allowed_parameters_config_property: str, parameter_on_test_case: str):
         """When running with a custom configuration class, you can use this
@@ -109,10 +151,29 @@ class TestCase(unittest.TestCase):
                 if parameter_on_test_case in run_with:
                     return
                 else:
-                    import inspect
-                    caller = inspect.stack()[1].function
+                    caller = sys._getframe(1).f_code.co_name
                     self.skipTest(f"{parameter_on_test_case} made test function {caller} skip")
 
+    def run(self, result=None):
+        logger = self.logger
+        try:
+            with self.profiler.profile(self) if self.profiler else nullcontext():
+                if not self.retries or result is None:
+                    self.attempts = 1
+                    return super().run(result)
+                run_with_retries(
+                    self,
+                    super().run,
+                    result,
+                    self.retries,
+                    self.retry_budget
+                )
+                return result
+        finally:
+            flush_console(logger)
+            # don't hold file handles between tests
+            suspend(logger)
+
     def __del__(self):
-        if hasattr(self, 'logger'):
-            close(self.logger)
+        if getattr(self, '_logger_acquired', False):
+            release(self._logger)
@@ -0,0 +1,173 @@
+"""
+Per-phase timings of a run (`--timings`).
+
+Collection and the run are instrumented with `timed` blocks. They
+cost next to nothing until `start` makes a `Timings` instance the
+active one, usually in `run.run_test_suite` when `--timings` is set.
+Time is accounted exclusively: a block nested in another one (e.g.
+`importing` a test file while `collecting` it) is subtracted from
+the outer block, so the phases add up to the duration of the run.
+
+Blocks are only recorded on the thread that started the timings,
+the report writer thread and threads started by tests are ignored.
+Everything nested in `setup` and `teardown` (e.g. importing the
+setup script) is counted as setup or teardown.
+"""
+__docformat__ = "google"
+
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List, Optional
+
+import datetime
+import json
+import os
+import threading
+import time
+
+WALKING = 'walking'
+METADATA = 'metadata'
+FILTERING = 'filtering'
+IMPORTING = 'importing'
+COLLECTING = 'collecting'
+SETUP = 'setup'
+TESTS = 'tests'
+TEARDOWN = 'teardown'
+REPORTS = 'reports'
+OTHER = 'other'
+
+PHASES = (WALKING, METADATA, FILTERING, IMPORTING, COLLECTING, SETUP, TESTS, TEARDOWN, REPORTS)
+"""Phases in the order they're listed."""
+COLLECTION_PHASES = (WALKING, METADATA, FILTERING, IMPORTING, COLLECTING)
+"""Phases recorded per file (or per walked path)."""
+_OPAQUE = (SETUP, TEARDOWN)
+
+DEFAULT_TOP = 10
+TIMINGS_FILE_PREFIX = 'kalash_timings'
+
+_NOT_TIMED = nullcontext()
+_active: Optional['Timings'] = None
+
+
+class Timings:
+    """Time spent in each phase of a run.
+
+    Args:
+        run_id (Optional[str]): ID of the run, written to the JSON output
+    """
+
+    def __init__(self, run_id: Optional[str] = None):
+        self.run_id = run_id
+        self.phases: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.files: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self.total = 0.0
+        self._thread = threading.get_ident()
+        self._stack: List[List[Any]] = []
+        self._start = time.perf_counter()
+        self._created = datetime.datetime.now().replace(microsecond=0).isoformat()
+
+    @contextmanager
+    def phase(self, name: str, file: Optional[str] = None) -> Iterator[None]:
+        """Times a block of the run.
+
+        Args:
+            name (str): name of the phase
+            file (Optional[str]): file the block works on, collection
+                phases list the slowest files
+        """
+        if self._stack and self._stack[-1][0] in _OPAQUE:
+            yield
+            return
+        frame = [name, 0.0]  # name, time spent in nested blocks
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            own = elapsed - frame[1]
+            self.phases[name] = self.phases.get(name, 0.0) + own
+            if file and name in COLLECTION_PHASES:
+                self.files[name][os.path.abspath(file)] += own
+            if self._stack:
+                self._stack[-1][1] += elapsed
+
+    def stop(self):
+        self.total = time.perf_counter() - self._start
+
+    @property
+    def other(self) -> float:
+        """Time of the run not spent in any phase."""
+        return max(self.total - sum(self.phases.values()), 0.0)
+
+    def slowest(self, phase: str, top: int = DEFAULT_TOP) -> List[Dict[str, Any]]:
+        files = sorted(self.files.get(phase, {}).items(), key=lambda f: f[1], reverse=True)
+        return [{'file': file, 'time': round(seconds, 6)} for file, seconds in files[:top]]
+
+    def to_dict(self, top: int = DEFAULT_TOP) -> Dict[str, Any]:
+        return {
+            'run': self.run_id,
+            'created': self._created,
+            'total': round(self.total, 6),
+            'phases': {
+                **{name: round(seconds, 6) for name, seconds in self.phases.items()},
+                OTHER: round(self.other, 6)
+            },
+            'files': {phase: len(self.files.get(phase, {})) for phase in COLLECTION_PHASES},
+            'slowest': {phase: self.slowest(phase, top) for phase in COLLECTION_PHASES}
+        }
+
+    def format(self, top: int = DEFAULT_TOP) -> str:
+        """Human-readable phase breakdown."""
+        lines = [f"Timings (total {self.total:.3f} s):"]
+        total = self.total or 1.0
+        for name, seconds in (*self.phases.items(), (OTHER, self.other)):
+            lines.append(f"  {name:<12}{seconds:10.3f} s {seconds * 100 / total:6.1f}%")
+            for entry in self.slowest(name, top) if name in COLLECTION_PHASES else ():
+                lines.append(f"    {entry['time'] * 1000:10.1f} ms  {entry['file']}")
+        return '\n'.join(lines)
+
+    def write(self, directory: str, top: int = DEFAULT_TOP) -> str:
+        """Writes the timings as JSON into a directory.
+
+        Returns:
+            Path to the written file
+        """
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        name = f'{TIMINGS_FILE_PREFIX}-{time.strftime("%Y%m%d%H%M%S")}.json'
+        path = os.path.join(directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(top), f, indent=2)
+        return path
+
+
+def start(run_id: Optional[str] = None) -> Timings:
+    """Starts recording timings on this thread."""
+    global _active
+    _active = Timings(run_id)
+    return _active
+
+
+def stop() -> Optional[Timings]:
+    """Stops recording, returns what has been recorded."""
+    global _active
+    timings, _active = _active, None
+    if timings:
+        timings.stop()
+    return timings
+
+
+def timed(name: str, file: Optional[str] = None):
+    """Context manager timing a block as a phase of the active
+    `Timings`, does nothing when no timings are recorded.
+
+    Args:
+        name (str): name of the phase
+        file (Optional[str]): file the block works on
+    """
+    timings = _active
+    if timings is None or threading.get_ident() != timings._thread:
+        return _NOT_TIMED
+    return timings.phase(name, file)
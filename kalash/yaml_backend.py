@@ -0,0 +1,128 @@
+"""
+YAML loading used for metadata sections, `.kalash.yaml` files
+and the specification.
+
+`load` uses libyaml's `CSafeLoader` when PyYAML has been built
+with it and the pure-Python `SafeLoader` otherwise.
+
+Metadata sections of test files are usually a handful of flat
+`key: value` and `key:` + `- item` lines. `load_metadata` reads
+those with `load_flat`, a restricted parser that skips PyYAML
+altogether, and hands anything else (flow collections, quoting,
+nesting, anchors, tags, multi-line scalars, ...) to `load`. Scalars
+are typed with PyYAML's own resolver and only plain strings are
+accepted by `load_flat`, so both paths give the same result.
+"""
+__docformat__ = "google"
+
+from typing import Any, Dict, IO, List, Optional, Union
+
+import re
+import yaml
+
+HAS_LIBYAML = hasattr(yaml, 'CSafeLoader')
+
+SafeLoader = yaml.CSafeLoader if HAS_LIBYAML else yaml.SafeLoader
+
+_KEY_RE = re.compile(r'^([A-Za-z_][\w-]*):(?:[ \t]+(.*))?$')
+_ITEM_RE = re.compile(r'^[ ]*-(?:[ \t]+(.*))?$')
+# characters a plain scalar can't start with in block context
+_INDICATORS = set('[]{},#&*!|>\'"%@`?:-')
+_STR_TAG = 'tag:yaml.org,2002:str'
+_RESOLVER = yaml.resolver.Resolver()
+
+
+class UnsupportedYaml(ValueError):
+    """Raised by `load_flat` for YAML it doesn't handle."""
+
+
+def load(stream: Union[str, IO[str]], full: bool = False) -> Any:
+    """Loads a YAML document with the fastest safe loader available.
+
+    Args:
+        stream (Union[str, IO[str]]): YAML text or a file
+        full (bool): fall back to `yaml.full_load` for documents
+            using tags the safe loader doesn't construct
+
+    Returns:
+        The loaded document
+    """
+    if full:
+        text = stream if isinstance(stream, str) else stream.read()
+        try:
+            return yaml.load(text, Loader=SafeLoader)
+        except yaml.constructor.ConstructorError:
+            return yaml.full_load(text)
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def _is_plain_str(value: str) -> bool:
+    return _RESOLVER.resolve(yaml.ScalarNode, value, (True, False)) == _STR_TAG
+
+
+def _scalar(value: str) -> str:
+    value = value.split(' #', 1)[0].split('\t#', 1)[0].strip()
+    if not value or value[0] in _INDICATORS or ': ' in value or value.endswith(':') \
+            or not _is_plain_str(value):
+        raise UnsupportedYaml(value)
+    return value
+
+
+def load_flat(text: str) -> Optional[Dict[str, Union[str, List[str], None]]]:
+    """Loads a mapping of plain string scalars and lists of plain
+    string scalars.
+
+    Args:
+        text (str): YAML text
+
+    Raises:
+        UnsupportedYaml: if the text uses anything else
+
+    Returns:
+        The mapping, `None` for an empty document
+    """
+    result: Dict[str, Union[str, List[str], None]] = {}
+    key: Optional[str] = None
+    indent = 0
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#') or (stripped == '---' and not result):
+            continue
+        item = _ITEM_RE.match(line)
+        if item:
+            value = result.get(key) if key else 'no list'
+            if value is None:
+                value = result[key] = []  # type: ignore
+                indent = len(line) - len(line.lstrip(' '))
+            if not isinstance(value, list) or item.group(1) is None \
+                    or len(line) - len(line.lstrip(' ')) != indent:
+                raise UnsupportedYaml(line)
+            value.append(_scalar(item.group(1)))
+            continue
+        match = _KEY_RE.match(line)
+        if not match or '\t' in line or not _is_plain_str(match.group(1)):
+            raise UnsupportedYaml(line)
+        key = match.group(1)
+        rest = (match.group(2) or '').strip()
+        result[key] = None if not rest or rest.startswith('#') else _scalar(rest)
+        if result[key] is not None:
+            key = None  # no list items can follow a scalar
+    return result if result else None
+
+
+def load_metadata(text: str, flat: bool = True) -> Any:
+    """Loads the metadata section of a test file.
+
+    Args:
+        text (str): YAML text of the metadata section
+        flat (bool): try the restricted parser (`load_flat`) first
+
+    Returns:
+        The loaded metadata
+    """
+    if flat:
+        try:
+            return load_flat(text)
+        except UnsupportedYaml:
+            pass
+    return load(text, full=True)
@@ -1,14 +1,16 @@
 from typing import List
 from kalash.testutils import clear_results
-from kalash.run import run_test_suite, make_loader_and_trigger_object
+from kalash.run import run_test_suite, make_loader_and_trigger_object, write_plan_file
 from kalash.config import CliConfig
 
 import os
+import json
+import sqlite3
 import time
 import shutil
 import glob
 
-from unittest import main, TestCase
+from unittest import main, mock, TestCase
 
 
 class TestKalash(TestCase):
@@ -56,6 +58,175 @@ class TestKalash(TestCase):
         # return code 1 denotes test failure
         self.assertEqual(return_code, 1)
 
+    def test_retries(self):
+        """
+        A test that fails only on its first attempt passes
+        when retries are enabled and is reported as such.
+        """
+        result, return_code = run_test_suite(*make_loader_and_trigger_object(CliConfig(
+            "./tests/test_yamls/test_retries.yaml",
+            "logs", "device",
+            False, self._debug, True)))
+        self.assertEqual(len(result.successes if result else []), 2)
+        self.assertEqual(len(result.failures if result else []), 0)
+        self.assertEqual(result.testsRun if result else 0, 2)
+        self.assertEqual(return_code, 0)
+
+    def test_retries_budget_exhausted(self):
+        """
+        With an empty retry budget the flaky test is not re-run.
+        """
+        result, return_code = run_test_suite(*make_loader_and_trigger_object(CliConfig(
+            "./tests/test_yamls/test_retries_no_budget.yaml",
+            "logs", "device",
+            False, self._debug, True)))
+        self.assertEqual(len(result.failures if result else []), 1)
+        self.assertEqual(return_code, 1)
+
+    def test_plan(self):
+        """
+        Tests run from a plan are the ones collected
+        when making it, including their retries.
+        """
+        plan_path = os.path.join("logs", "plan.json")
+        planned = write_plan_file(CliConfig(
+            "./tests/test_yamls/test_retries.yaml",
+            "logs", "device",
+            False, self._debug, True), plan_path, print_callback=lambda _: None)
+        self.assertEqual(planned, 2)
+        result, return_code = run_test_suite(*make_loader_and_trigger_object(CliConfig(
+            None, "logs", "device",
+            False, self._debug, True, plan=plan_path)))
+        self.assertEqual(len(result.successes if result else []), 2)
+        self.assertEqual(result.testsRun if result else 0, 2)
+        self.assertEqual(return_code, 0)
+
+        paths_actual = []
+        run_test_suite(*make_loader_and_trigger_object(CliConfig(
+            None, "logs", "device",
+            False, self._debug, True, plan=plan_path, what_if='paths')),
+            whatif_callback=lambda n: paths_actual.append(os.path.normcase(n)))
+        self.assertListEqual(
+            paths_actual,
+            [os.path.normcase(os.path.abspath("./tests/test_scripts/retries/test_flaky.py"))])
+
+    def test_timings(self):
+        """
+        `--timings` breaks the run down into phases and
+        writes the breakdown next to the reports.
+        """
+        printed = []
+        with mock.patch('builtins.print', lambda *a, **k: printed.append(' '.join(map(str, a)))):
+            run_test_suite(*make_loader_and_trigger_object(CliConfig(
+                "./tests/test_yamls/test_retries.yaml",
+                "logs", "device",
+                False, self._debug, True, timings=5)))
+        self.assertTrue(any(line.startswith('Timings (total') for line in printed))
+        written = [line for line in printed if line.startswith('Timings written to')]
+        written = written[0].rpartition(' ')[2]
+        with open(written) as f:
+            timings = json.load(f)
+        os.remove(written)
+        self.assertGreater(timings['phases']['tests'], 0)
+        self.assertEqual(
+            [os.path.basename(entry['file']) for entry in timings['slowest']['importing']],
+            ['test_flaky.py']
+        )
+        self.assertAlmostEqual(sum(timings['phases'].values()), timings['total'], places=3)
+
+    def test_events(self):
+        """
+        Every collection, test and run event lands in the events file.
+        """
+        events_path = os.path.join("logs", "events.jsonl")
+        if os.path.exists(events_path):
+            os.remove(events_path)
+        config = CliConfig(
+            "./tests/test_yamls/test_retries.yaml",
+            "logs", "device",
+            False, self._debug, True, events=events_path)
+        # the ID is assigned to the run, not to the configuration
+        self.assertIsNone(config.run_id)
+        _, return_code = run_test_suite(*make_loader_and_trigger_object(config))
+        self.assertIsNone(config.run_id)
+        with open(events_path) as f:
+            events = [json.loads(line) for line in f]
+        self.assertEqual(
+            [e['event'] for e in events],
+            ['collection_started', 'collection_finished',
+             'test_started', 'test_finished',
+             'test_started', 'test_finished',
+             'run_finished']
+        )
+        self.assertEqual(len(set(e['run'] for e in events)), 1)
+        self.assertEqual(events[1]['tests'], 2)
+        finished = [e for e in events if e['event'] == 'test_finished']
+        self.assertTrue(all(e['status'] == 'passed' for e in finished))
+        self.assertEqual(events[-1]['return_code'], return_code)
+
+    def test_events_async_logging(self):
+        """
+        Log files are found for the events with asynchronous logging,
+        where the file handlers aren't attached to the test loggers.
+        """
+        events_path = os.path.join("logs", "events_async.jsonl")
+        if os.path.exists(events_path):
+            os.remove(events_path)
+        run_test_suite(*make_loader_and_trigger_object(CliConfig(
+            "./tests/test_yamls/test_logging.yaml",
+            "logs", "devices",
+            False, self._debug, False, True, events=events_path, log_async=True)))
+        with open(events_path) as f:
+            finished = [e for e in map(json.loads, f) if e['event'] == 'test_finished']
+        self.assertEqual(len(finished), 4)
+        for event in finished:
+            self.assertIsNotNone(event['log'])
+            with open(event['log']) as f:
+                self.assertTrue(f.read().startswith('hello'))
+
+    def test_history(self):
+        """
+        Results of every run are recorded in the result history
+        and the `last_result` filter can select tests from it.
+        """
+        shutil.rmtree("./kalash_reports/history", ignore_errors=True)
+        run_test_suite(*make_loader_and_trigger_object(CliConfig(
+            "./tests/test_yamls/test_history_record.yaml",
+            "logs", "device",
+            False, self._debug, True)))
+        connection = sqlite3.connect("./kalash_reports/history/kalash_history.sqlite")
+        rows = connection.execute("SELECT method, status FROM results ORDER BY method").fetchall()
+        connection.close()
+        self.assertEqual(rows, [('test_1', 'passed'), ('test_2', 'passed')])
+        # passed in the last run, never failed this week, not flaky:
+        result, _ = run_test_suite(*make_loader_and_trigger_object(CliConfig(
+            "./tests/test_yamls/test_history.yaml",
+            "logs", "device",
+            False, self._debug, True)))
+        self.assertEqual(result.testsRun if result else 0, 2)
+
+    def test_last_result_methods(self):
+        """
+        `last_result` selects single methods, not whole test files.
+        """
+        shutil.rmtree("./kalash_reports/methods", ignore_errors=True)
+        result, _ = run_test_suite(*make_loader_and_trigger_object(CliConfig(
+            "./tests/test_yamls/test_last_result_record.yaml",
+            "logs", "device",
+            False, self._debug, True)))
+        self.assertEqual(len(result.failures if result else []), 1)
+        # only the failed `test_1` is collected, once from the reports
+        # and once from the result history:
+        result, _ = run_test_suite(*make_loader_and_trigger_object(CliConfig(
+            "./tests/test_yamls/test_last_result_methods.yaml",
+            "logs", "device",
+            False, self._debug, True)))
+        self.assertEqual(
+            [test.id().split('.')[-1] for test, _ in result.failures] if result else [],
+            ['test_1', 'test_1']
+        )
+        self.assertEqual(result.testsRun if result else 0, 2)
+
     def test_logging(self):
         result, return_code = run_test_suite(*make_loader_and_trigger_object(CliConfig(
             "./tests/test_yamls/test_logging.yaml",
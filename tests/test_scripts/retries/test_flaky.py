@@ -0,0 +1,30 @@
+"""
+META_START
+---
+id: 000000020_40-Flaky_1-RETRY_SomethingElse  # ID of the test
+use_cases:                              # JIRA codes of the related use cases
+  - PRODTEST-9997                             # Example JIRA code
+workbenches:                                  # Workbench where the test is meant to be runned
+  - Rammstein                                 # Example workbench
+META_END
+"""
+
+from kalash.run import MetaLoader, TestCase, main
+
+# survives re-runs of the same test instance, reset on every collection
+ATTEMPTS = {'test_1': 0}
+
+
+class TestFlaky(TestCase):
+
+    def test_1(self):
+        ATTEMPTS['test_1'] += 1
+        if ATTEMPTS['test_1'] < 2:
+            self.fail("Fails on the first attempt only")
+
+    def test_2(self):
+        pass
+
+
+if __name__ == '__main__':
+    main(testLoader=MetaLoader(yaml_path='./.kalash.yaml'))
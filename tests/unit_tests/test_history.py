@@ -0,0 +1,73 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from kalash.history import (
+    NOK_STATUSES, OK_STATUSES, ResultHistory, flakiness, flaky_tests,
+    matches_last_result, parse_since)
+
+
+class TestResultHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.directory, 'test_something.py')
+        statuses = [('passed', 'failed'), ('failed', 'failed'), ('passed', 'error')]
+        for day, (first, second) in enumerate(statuses):
+            history = ResultHistory.in_report_dir(self.directory, f'run{day}')
+            timestamp = f'2022-01-0{day + 1}T10:00:00'
+            history.add('t.T.test_1', self.test_file, 'test_1', first, 0.1, timestamp)
+            history.add('t.T.test_2', self.test_file, 'test_2', second, 0.1, timestamp)
+            history.close()
+        self.history = ResultHistory.in_report_dir(self.directory)
+
+    def tearDown(self):
+        self.history.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_windowed_queries(self):
+        results = self.history.results_for_file(self.test_file)
+        self.assertEqual([r[2] for r in results['t.T.test_1']], ['passed', 'failed', 'passed'])
+        results = self.history.results_for_file(self.test_file, last_runs=2)
+        self.assertEqual([r[2] for r in results['t.T.test_2']], ['error', 'failed'])
+        results = self.history.results_for_file(self.test_file, since='2022-01-02T00:00:00')
+        self.assertEqual(len(results['t.T.test_1']), 2)
+        self.assertEqual(self.history.results_for_file('elsewhere.py'), {})
+
+    def test_matches_last_result(self):
+        results = self.history.results_for_file(self.test_file)
+        self.assertTrue(matches_last_result(results['t.T.test_2'], NOK_STATUSES))
+        self.assertFalse(matches_last_result(results['t.T.test_1'], NOK_STATUSES))
+        self.assertTrue(matches_last_result(results['t.T.test_1'], OK_STATUSES, count=2))
+        self.assertFalse(matches_last_result(results['t.T.test_1'], NOK_STATUSES, count=2))
+        self.assertFalse(matches_last_result([], OK_STATUSES))
+
+    def test_flakiness(self):
+        self.assertEqual(flakiness(['passed', 'passed', 'passed']), 0.0)
+        self.assertEqual(flakiness(['failed', 'passed', 'error', 'passed']), 1.0)
+        self.assertEqual(flakiness(['failed', 'skipped', 'failed', 'passed']), 0.5)
+        self.assertEqual(flakiness(['failed']), 0.0)
+
+    def test_flaky_tests(self):
+        # test_1: passed, failed, passed; test_2: failed, failed, error
+        self.assertEqual(flaky_tests(self.history), [('t.T.test_1', 1.0, 3)])
+        self.assertEqual(flaky_tests(self.history, window=2), [('t.T.test_1', 1.0, 2)])
+        self.assertEqual(
+            flaky_tests(self.history, threshold=0.0),
+            [('t.T.test_1', 1.0, 3), ('t.T.test_2', 0.0, 3)]
+        )
+        self.assertEqual(flaky_tests(self.history, since='2022-01-03'), [])
+
+    def test_parse_since(self):
+        now = datetime.datetime(2022, 1, 10, 12, 0, 0)
+        self.assertEqual(parse_since('7d', now), '2022-01-03T12:00:00')
+        self.assertEqual(parse_since('12h', now), '2022-01-10T00:00:00')
+        self.assertEqual(parse_since('2022-01-05', now), '2022-01-05T00:00:00')
+        with self.assertRaises(ValueError):
+            parse_since('last week', now)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import re
+import subprocess
+import sys
+import unittest
+
+from kalash.config import Config, Trigger
+
+# cumulative `python -X importtime` time of `import kalash.run`, it was
+# ~300 ms with the dependencies below imported eagerly and is ~110 ms without
+IMPORT_BUDGET_US = 250_000
+
+LAZY_MODULES = (
+    'dataclasses_jsonschema',
+    'jsonschema',
+    'parameterized',
+    'toolz',
+    'webbrowser',
+    'xml.sax.saxutils',
+    'concurrent.futures.process',
+)
+
+
+def import_times(module: str):
+    """Cumulative import times in microseconds of all modules
+    imported by `import <module>` in a fresh interpreter."""
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True
+    ).stderr
+    times = {}
+    for line in output.splitlines():
+        match = re.match(r'import time:\s+\d+\s+\|\s+(\d+)\s+\|\s+(.*)$', line)
+        if match:
+            times[match.group(2).strip()] = int(match.group(1))
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_heavy_dependencies_are_lazy(self):
+        imported = import_times('kalash.run')
+        for module in LAZY_MODULES:
+            self.assertNotIn(module, imported)
+
+    def test_import_budget(self):
+        best = min(import_times('kalash.run')['kalash.run'] for _ in range(3))
+        self.assertLess(best, IMPORT_BUDGET_US)
+
+    def test_lazy_reexport(self):
+        from kalash.run import TestCase, parameterized  # noqa: F401
+        self.assertTrue(hasattr(parameterized, 'expand'))
+        import kalash.run
+        with self.assertRaises(AttributeError):
+            kalash.run.does_not_exist
+
+    def test_json_schema(self):
+        schema = Trigger.json_schema()
+        self.assertEqual(set(schema['definitions']), {'Test', 'Meta', 'Config'})
+        self.assertIn('allOf', schema['definitions']['Test'])
+        config = Config(report='./reports')
+        self.assertEqual(config.to_dict()['report'], config.report)
+
+
+if __name__ == '__main__':
+    unittest.main()
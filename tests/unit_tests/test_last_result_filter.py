@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from kalash.last_result_filter import (
+    INDEX_FILE_NAME, LastResultIndex, filter_for_result,
+    is_test_fail_or_error, is_test_pass)
+
+REPORT = """<?xml version="1.0" encoding="UTF-8"?>
+<testsuite name="{suite}" tests="2">
+<testcase classname="{suite}" name="test_1" file="{file}" timestamp="{timestamp}">
+{result}</testcase>
+<testcase classname="{suite}" name="test_2" file="{file}" timestamp="{timestamp}">
+</testcase>
+</testsuite>"""
+
+
+class TestLastResultIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.reports = tempfile.mkdtemp()
+        self.test_file = os.path.join(self.reports, 'test_something.py')
+
+    def tearDown(self):
+        shutil.rmtree(self.reports, ignore_errors=True)
+
+    def _report(self, name, timestamp, result=''):
+        with open(os.path.join(self.reports, name), 'w') as f:
+            f.write(REPORT.format(
+                suite='Suite', file=self.test_file, timestamp=timestamp, result=result
+            ))
+
+    def test_latest_report_wins(self):
+        self._report('TEST-old.xml', '2022-01-01T10:00:00', '<failure/>')
+        self._report('TEST-new.xml', '2022-01-02T10:00:00')
+        index = LastResultIndex(self.reports).refresh()
+        self.assertEqual(
+            filter_for_result(is_test_pass)(self.test_file, self.reports, index),
+            [True, True]
+        )
+        self.assertEqual(index.result_for_method(self.test_file, 'Suite', 'test_1'), [])
+
+    def test_index_is_cached_and_refreshed(self):
+        self._report('TEST-old.xml', '2022-01-01T10:00:00')
+        LastResultIndex(self.reports).refresh()
+        self.assertTrue(os.path.isfile(os.path.join(self.reports, INDEX_FILE_NAME)))
+        self._report('TEST-new.xml', '2022-01-02T10:00:00', '<error/>')
+        index = LastResultIndex(self.reports).refresh()
+        self.assertEqual(
+            filter_for_result(is_test_fail_or_error)(self.test_file, self.reports, index),
+            [True, False]
+        )
+        os.remove(os.path.join(self.reports, 'TEST-new.xml'))
+        index = LastResultIndex(self.reports).refresh()
+        self.assertEqual(
+            filter_for_result(is_test_fail_or_error)(self.test_file, self.reports, index),
+            [False, False]
+        )
+
+    def test_methods_keep_their_own_last_result(self):
+        self._report('TEST-old.xml', '2022-01-01T10:00:00', '<failure/>')
+        # a re-run of the failed method alone:
+        with open(os.path.join(self.reports, 'TEST-rerun.xml'), 'w') as f:
+            f.write(
+                '<testsuite name="Suite" tests="1">'
+                f'<testcase classname="module.Suite" name="test_1" file="{self.test_file}" '
+                'timestamp="2022-01-02T10:00:00"><error/></testcase>'
+                '</testsuite>'
+            )
+        index = LastResultIndex(self.reports).refresh()
+        self.assertEqual(index.results_for_methods(self.test_file), {
+            ('Suite', 'test_1'): ['error'],
+            ('Suite', 'test_2'): []
+        })
+
+    def test_unknown_file_and_broken_report(self):
+        with open(os.path.join(self.reports, 'TEST-broken.xml'), 'w') as f:
+            f.write('<testsuite name="Suite"><testcase')
+        self.assertEqual(
+            filter_for_result(is_test_pass)(self.test_file, self.reports),
+            [False]
+        )
+
+    def test_reports_parsed_in_parallel(self):
+        output = '<system-out><![CDATA[' + 'x' * 10000 + ']]></system-out>'
+        for i in range(8):
+            result = output + '<failure/>' if i == 7 else output
+            self._report(f'TEST-{i}.xml', f'2022-01-0{i + 1}T10:00:00', result)
+        with mock.patch('kalash.last_result_filter.PARALLEL_THRESHOLD', 4):
+            index = LastResultIndex(self.reports, workers=2).refresh()
+        self.assertEqual(
+            index.result_for_method(self.test_file, 'Suite', 'test_1'),
+            ['system-out', 'failure']
+        )
+        self.assertEqual(len(index.results_for_file(self.test_file)), 2)
+
+    def _parse(self):
+        for i in range(8):
+            self._report(f'TEST-{i}.xml', f'2022-01-0{i + 1}T10:00:00',
+                         '<failure/>' if i == 7 else '')
+        with mock.patch('kalash.last_result_filter.PARALLEL_THRESHOLD', 4):
+            index = LastResultIndex(self.reports, workers=2).refresh()
+        self.assertEqual(index.result_for_method(self.test_file, 'Suite', 'test_1'), ['failure'])
+
+    def test_no_pool_without_a_safe_start_method(self):
+        # e.g. spawning workers on Windows from a script calling `run()`
+        with mock.patch('concurrent.futures.ProcessPoolExecutor') as pool, \
+                mock.patch('kalash.last_result_filter._pool_context', return_value=None):
+            self._parse()
+        pool.assert_not_called()
+
+    def test_failing_pool_falls_back_to_serial(self):
+        with mock.patch('concurrent.futures.ProcessPoolExecutor',
+                        side_effect=RuntimeError('bootstrapping')):
+            self._parse()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import datetime
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from kalash.config import CliConfig, Meta
+from kalash.log import JsonLinesHandler, get, release, suspend
+from kalash.log_index import LOG_INDEX_FILE_NAME, LogIndex, search_logs
+
+
+class TestLogIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def _run(self, test_id, class_name, run_id):
+        config = CliConfig(None, log_dir=self.log_dir, no_log_echo=True,
+                           log_json=True, run_id=run_id)
+        logger = get(test_id, class_name, Meta(), config)
+        logger.info('starting', extra={'ecu': test_id})
+        try:
+            raise RuntimeError('boom')
+        except RuntimeError:
+            logger.exception('failed to flash')
+        suspend(logger)
+        logger.warning('second test')
+        suspend(logger)
+        release(logger)
+
+    def test_records_are_indexed_per_test_and_run(self):
+        self._run('ECU_A_1', 'TestFlashA', 'run1')
+        self._run('ECU_B_1', 'TestFlashB', 'run1')
+        self._run('ECU_A_1', 'TestFlashA2', 'run2')
+        index = LogIndex(os.path.join(self.log_dir, LOG_INDEX_FILE_NAME))
+        self.assertEqual(len(index.segments()), 6)
+        self.assertEqual(len(index.segments(test_id='ECU_A*', level=40)), 2)
+        index.close()
+
+        errors = list(search_logs(self.log_dir, test_id='ECU_A*', level='ERROR'))
+        self.assertEqual([r['run'] for r in errors], ['run1', 'run2'])
+        self.assertEqual(errors[0]['message'], 'failed to flash')
+        self.assertEqual(errors[0]['class'], 'TestFlashA')
+        self.assertIn('RuntimeError: boom', errors[0]['exc'])
+
+        records = list(search_logs(self.log_dir, run_id='run1', pattern='^start'))
+        self.assertEqual([r['extra'] for r in records], [{'ecu': 'ECU_A_1'}, {'ecu': 'ECU_B_1'}])
+        self.assertEqual(len(list(search_logs(self.log_dir, level=30, since='1h'))), 6)
+        tomorrow = (datetime.datetime.now() + datetime.timedelta(days=1)).date().isoformat()
+        self.assertEqual(list(search_logs(self.log_dir, since=tomorrow)), [])
+
+    def test_ranges_only_cover_their_test(self):
+        index_path = os.path.join(self.log_dir, LOG_INDEX_FILE_NAME)
+        handler = JsonLinesHandler(os.path.join(self.log_dir, 'test.jsonl'), 'ID_1', index_path)
+        handler.suspend()
+        self.assertFalse(os.path.exists(handler.baseFilename))
+        for message in ('first', 'second'):
+            handler.handle(logging.makeLogRecord(dict(msg=message, levelno=20, levelname='INFO')))
+            handler.suspend()
+        handler.close()
+        index = LogIndex(index_path)
+        (_, start1, end1), (_, start2, end2) = index.segments()
+        index.close()
+        self.assertEqual((start1, end1, end2), (0, start2, os.path.getsize(handler.baseFilename)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,17 @@
+import contextlib
 import unittest
 import shutil
 import os
 import glob
+import io
+import logging
+import queue
 import time
 
 from kalash.config import CliConfig, Meta
-from kalash.log import (_make_tree, _make_log_tree_from_id,
-                        register_logger, _LOGGERS, get, close, close_all)
+from kalash.log import (_make_tree, _make_log_tree_from_id, _QueueHandler, ConsoleSink,
+                        LazyFileHandler, register_logger, _LOGGERS, get, close, close_all,
+                        read_tail, release, suspend)
 
 
 class TestLogging(unittest.TestCase):
@@ -86,13 +91,151 @@ class TestLogging(unittest.TestCase):
         time.sleep(0.5)
         self.assertGreater(len(glob.glob('logs2/**/*.log')), 0)
 
+    def test_registration_is_idempotent(self):
+        config = CliConfig(None, log_dir='logs2', no_log_echo=True)
+        first = get(self.testid, "TestRefs", Meta(), config)
+        second = get(self.testid, "TestRefs", Meta(), config)
+        self.assertIs(first, second)
+        self.assertIsNone(register_logger("TestRefs", 'log.log', config))
+        self.assertEqual(len(first.handlers), 1)
+        # the logger stays open until its last user releases it
+        release(first)
+        self.assertIn("TestRefs", _LOGGERS)
+        self.assertEqual(len(first.handlers), 1)
+        release(second)
+        self.assertNotIn("TestRefs", _LOGGERS)
+        self.assertEqual(len(first.handlers), 0)
+
+    def test_log_file_created_on_first_record(self):
+        config = CliConfig(None, log_dir='logs3', no_log_echo=True)
+        logger = get(self.testid, "TestLazy", Meta(), config)
+        self.assertFalse(os.path.exists('logs3'))
+        logger.info('hello')
+        suspend(logger)
+        self.assertIsNone(logger.handlers[0].stream)
+        logger.info('again')
+        release(logger)
+        log_files = glob.glob('logs3/**/*.log')
+        self.assertEqual(len(log_files), 1)
+        with open(log_files[0]) as f:
+            self.assertEqual(f.read().split(), ['hello', 'again'])
+        shutil.rmtree('logs3', ignore_errors=True)
+
+    def test_async_logging(self):
+        config = CliConfig(None, log_dir='logs4', no_log_echo=True, log_async=True)
+        logger = get(self.testid, "TestAsync", Meta(), config)
+        for i in range(1000):
+            logger.info('record %d', i)
+        close_all()
+        log_files = glob.glob('logs4/**/*.log')
+        self.assertEqual(len(log_files), 1)
+        with open(log_files[0]) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 1000)
+        self.assertEqual(lines[-1], 'record 999')
+        shutil.rmtree('logs4', ignore_errors=True)
+
+    def test_async_logging_full_queue_on_close(self):
+        config = CliConfig(None, log_dir='logs4', no_log_echo=True, log_async=True,
+                           log_queue_size=10)
+        logger = get(self.testid, "TestAsyncFull", Meta(), config)
+
+        class SlowHandler(logging.Handler):
+            def emit(self, record):
+                time.sleep(0.002)
+
+        _LOGGERS["TestAsyncFull"].handlers.append(SlowHandler())
+        for i in range(50):
+            logger.info('record %d', i)
+        close_all()  # the queue is still full here
+        log_files = glob.glob('logs4/**/*.log')
+        with open(log_files[0]) as f:
+            self.assertEqual(len(f.read().splitlines()), 50)
+        shutil.rmtree('logs4', ignore_errors=True)
+
+    def test_async_logging_overflow(self):
+        handler = _QueueHandler(queue.Queue(1), 'drop')
+        for i in range(3):
+            handler.handle(logging.LogRecord('x', logging.INFO, __file__, 1, 'msg %d', (i,), None))
+        self.assertEqual(handler.dropped, 2)
+        self.assertEqual(handler.queue.get_nowait().msg, 'msg 0')
+
+    def test_console_rate_limit(self):
+        stream = io.StringIO()
+        sink = ConsoleSink(stream, rate=5)
+        for i in range(20):
+            record = logging.LogRecord(
+                'TestChatty', logging.INFO, __file__, 1, 'line %d', (i,), None)
+            record.created = 100.0
+            sink.handle(record)
+        sink.summarize('TestChatty')
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(lines[:5], [f'line {i}' for i in range(5)])
+        self.assertEqual(len(lines), 6)
+        self.assertIn('15 log lines of TestChatty not echoed', lines[-1])
+
+    def test_console_writes_to_current_stdout(self):
+        sink = ConsoleSink()
+        stream = io.StringIO()
+        with contextlib.redirect_stdout(stream):
+            sink.handle(logging.LogRecord('TestEcho', logging.INFO, __file__, 1, 'now', None, None))
+            # written straight away without a rate limit
+            self.assertEqual(stream.getvalue(), 'now\n')
+
+    def test_console_batch_written_without_more_records(self):
+        stream = io.StringIO()
+        sink = ConsoleSink(stream, rate=100, batch_interval=0.01)
+        sink.handle(logging.LogRecord('TestEcho', logging.INFO, __file__, 1, 'last', None, None))
+        self.assertEqual(stream.getvalue(), '')
+        time.sleep(0.2)
+        self.assertEqual(stream.getvalue(), 'last\n')
+
+    def test_console_sink_is_shared(self):
+        config = CliConfig(None, log_dir='logs2')
+        first = get(self.testid, "TestEcho1", Meta(), config)
+        second = get(self.testid, "TestEcho2", Meta(), config)
+        consoles = [h for h in first.handlers + second.handlers if isinstance(h, ConsoleSink)]
+        self.assertEqual(len(consoles), 2)
+        self.assertIs(consoles[0], consoles[1])
+        release(first)
+        release(second)
+
+    def test_rotation_and_compression(self):
+        config = CliConfig(None, log_dir='logs2', no_log_echo=True,
+                           log_max_bytes=1000, log_backups=2, log_compress=True)
+        logger = get(self.testid, "TestRotate", Meta(), config)
+        handler = [h for h in logger.handlers if isinstance(h, LazyFileHandler)][0]
+        path = handler.baseFilename
+        for i in range(100):
+            logger.info(f'line {i:03} ' + 'x' * 40)
+        self.assertLessEqual(os.path.getsize(path), 1000)
+        self.assertTrue(os.path.isfile(path + '.1.gz'))
+        self.assertTrue(os.path.isfile(path + '.2.gz'))
+        self.assertFalse(os.path.exists(path + '.3.gz'))
+        self.assertTrue(read_tail(path, 200).rstrip().endswith('line 099 ' + 'x' * 40))
+        close(logger)
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(read_tail(path + '.gz', 200).rstrip().endswith('line 099 ' + 'x' * 40))
+
+    def test_size_cap_without_backups(self):
+        config = CliConfig(None, log_dir='logs2', no_log_echo=True,
+                           log_max_bytes=500, log_backups=0)
+        logger = get(self.testid, "TestCap", Meta(), config)
+        handler = [h for h in logger.handlers if isinstance(h, LazyFileHandler)][0]
+        for i in range(100):
+            logger.info(f'line {i:03} ' + 'x' * 40)
+        self.assertLessEqual(os.path.getsize(handler.baseFilename), 500)
+        self.assertEqual(glob.glob(handler.baseFilename + '.*'), [])
+        close(logger)
+
     @classmethod
     def tearDownClass(cls) -> None:
         # need to sleep a while because it seems Windows doens't
         # want to release the file handle quickly enough
         time.sleep(0.5)
         shutil.rmtree('logs', ignore_errors=True)
-        os.unlink('log.log')
+        if os.path.exists('log.log'):  # only created once something is logged
+            os.unlink('log.log')
         shutil.rmtree('logs2', ignore_errors=True)
 
 
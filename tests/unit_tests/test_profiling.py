@@ -0,0 +1,74 @@
+import os
+import pstats
+import shutil
+import tempfile
+import time
+import unittest
+
+from kalash.config import CliConfig, Meta, Trigger
+from kalash.profiling import CPROFILE, SAMPLING, SuiteProfiler
+from kalash.test_case import TestCase
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def busy_test(trigger):
+    # defined here, so that the test loader doesn't collect it
+    class TestBusy(TestCase):
+
+        def test_busy(self):
+            busy_wait(0.1)
+
+    return TestBusy('test_busy', 'busy_1', Meta(), trigger)
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output, ignore_errors=True)
+
+    def _run(self, mode):
+        profiler = SuiteProfiler(mode, self.output, interval=0.001)
+        trigger = Trigger(cli_config=CliConfig(no_log=True, no_log_echo=True))
+        test = busy_test(trigger)
+        test.profiler = profiler
+        result = unittest.TestResult()
+        test.run(result)
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(profiler.tests, 1)
+        return profiler
+
+    def test_cprofile(self):
+        profiler = self._run(CPROFILE)
+        [path] = os.listdir(self.output)
+        self.assertTrue(path.endswith('TestBusy.test_busy.prof'))
+        self.assertIn('busy_wait', str(pstats.Stats(os.path.join(self.output, path)).stats))
+        self.assertTrue(profiler.close().endswith('suite.prof'))
+        self.assertTrue(any(label.startswith('busy_wait ') for label, _, _ in profiler.hottest()))
+
+    def test_sampling(self):
+        profiler = self._run(SAMPLING)
+        profiler.close()
+        with open(os.path.join(self.output, 'suite.folded')) as f:
+            stacks = f.read().splitlines()
+        self.assertTrue(stacks)
+        # stacks start at `unittest.TestCase.run`, runner frames are cut off
+        self.assertTrue(all(line.startswith('run (case.py:') for line in stacks))
+        label, own, total = profiler.hottest(1)[0]
+        self.assertTrue(label.startswith('busy_wait ') or 'perf_counter' in label)
+        self.assertGreater(total, 0.05)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            SuiteProfiler('line', self.output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from xml.etree import ElementTree
+
+from kalash.capture import OutputCapture
+from kalash.report import FAILURE, ReportWriter, TestCaseRecord, XMLTestRunner
+
+
+def _sample_suite():
+    # defined locally so that test discovery doesn't pick it up
+    class Sample(unittest.TestCase):
+
+        def test_pass(self):
+            print("some output")
+
+        def test_fail(self):
+            self.fail("boom")
+
+        @unittest.skip("not today")
+        def test_skip(self):
+            pass
+
+    return unittest.TestLoader().loadTestsFromTestCase(Sample)
+
+
+def _leaky_suite(leftovers):
+    class Leaky(unittest.TestCase):
+
+        def test_clean(self):
+            pass
+
+        def test_leaky(self):
+            stop = threading.Event()
+            thread = threading.Thread(target=stop.wait)
+            thread.start()
+            leftovers.append((open(__file__), thread, stop))
+
+    return unittest.TestLoader().loadTestsFromTestCase(Leaky)
+
+
+class TestStreamingReport(unittest.TestCase):
+
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output, ignore_errors=True)
+
+    def test_report_written_and_finalized(self):
+        result = XMLTestRunner(output=self.output, stream=io.StringIO()).run(_sample_suite())
+        self.assertEqual(len(result.successes), 1)
+        self.assertEqual(len(result.failures), 1)
+
+        reports = os.listdir(self.output)
+        self.assertEqual(len(reports), 1)
+        root = ElementTree.parse(os.path.join(self.output, reports[0])).getroot()
+        self.assertEqual(root.attrib['tests'], '3')
+        self.assertEqual(root.attrib['failures'], '1')
+        self.assertEqual(root.attrib['skipped'], '1')
+        cases = {tc.attrib['name']: [c.tag for c in tc] for tc in root.findall('testcase')}
+        self.assertIn('failure', cases['test_fail'])
+        self.assertIn('skipped', cases['test_skip'])
+        self.assertIn('system-out', cases['test_pass'])
+        for tc in root.findall('testcase'):
+            self.assertEqual(
+                os.path.normcase(os.path.abspath(tc.attrib['file'])),
+                os.path.normcase(os.path.abspath(__file__))
+            )
+
+    def test_long_suite_name_and_counts(self):
+        suite = 'test_' + 'long_' * 30 + 'module.Test' + 'Long' * 10
+        writer = ReportWriter(self.output, outsuffix='run')
+        for n in range(1200):
+            writer.submit(TestCaseRecord(
+                suite=suite,
+                classname=suite,
+                name=f'test_{n}',
+                outcome=FAILURE if n % 3 else None,
+                time=123456.789,
+                timestamp='2022-01-01T00:00:00.000000+00:00'
+            ))
+        writer.close()
+        root = ElementTree.parse(writer.reports[0]).getroot()
+        self.assertEqual(root.attrib['name'], f'{suite}-run')
+        self.assertEqual(root.attrib['tests'], '1200')
+        self.assertEqual(root.attrib['failures'], '800')
+        self.assertEqual(root.attrib['time'], f'{1200 * 123456.789:.3f}')
+        self.assertEqual(root.attrib['timestamp'], '2022-01-01T00:00:00.000000+00:00')
+        self.assertEqual(len(root.findall('testcase')), 1200)
+
+    def test_suite_attributes_overflow(self):
+        writer = ReportWriter(self.output, outsuffix='run')
+        writer.submit(TestCaseRecord(
+            suite='test_module.TestOdd', classname='test_module.TestOdd', name='test_1',
+            timestamp='not an ISO timestamp, but a much longer one ' * 5
+        ))
+        with self.assertRaisesRegex(ValueError, "don't fit"):
+            writer.close()
+
+    def test_chatty_output_is_spilled(self):
+        capture = OutputCapture(limit=100, spill_dir=self.output)
+        capture.reset('chatty')
+        capture.write('head' + 'x' * 1000)
+        capture.write('y' * 1000 + 'tail')
+        self.assertTrue(capture.spilled)
+        value = capture.getvalue()
+        self.assertTrue(value.startswith('head'))
+        self.assertTrue(value.endswith('tail'))
+        self.assertIn(os.path.abspath(capture.path), value)
+        self.assertLess(len(value), 500)
+        path = capture.path
+        capture.reset()
+        with open(path) as f:
+            self.assertEqual(len(f.read()), 2008)
+
+    def test_report_references_spilled_output(self):
+        result = XMLTestRunner(
+            output=self.output, stream=io.StringIO(), output_limit=4
+        ).run(_sample_suite())
+        self.assertEqual(len(result.successes), 1)
+        report = [f for f in os.listdir(self.output) if f.endswith('.xml')][0]
+        root = ElementTree.parse(os.path.join(self.output, report)).getroot()
+        tc = [tc for tc in root.findall('testcase') if tc.attrib['name'] == 'test_pass'][0]
+        props = {p.attrib['name']: p.attrib['value'] for p in tc.iter('property')}
+        with open(props['stdout_file']) as f:
+            self.assertEqual(f.read(), 'some output\n')
+
+    def test_resource_usage(self):
+        leftovers = []
+        try:
+            result = XMLTestRunner(
+                output=self.output, stream=io.StringIO()
+            ).run(_leaky_suite(leftovers))
+        finally:
+            for file, thread, stop in leftovers:
+                file.close()
+                stop.set()
+                thread.join()
+        [(test_id, used)] = result.leaks
+        self.assertTrue(test_id.endswith('test_leaky'))
+        self.assertEqual(used['threads_delta'], 1)
+        if 'open_fds_delta' in used:
+            self.assertEqual(used['open_fds_delta'], 1)
+        report = [f for f in os.listdir(self.output) if f.endswith('.xml')][0]
+        root = ElementTree.parse(os.path.join(self.output, report)).getroot()
+        for tc in root.findall('testcase'):
+            props = {p.attrib['name']: p.attrib['value'] for p in tc.iter('property')}
+            self.assertGreaterEqual(float(props['wall_time']), 0)
+            self.assertIn('cpu_user', props)
+            self.assertIn('threads', props)
+            leaky = tc.attrib['name'] == 'test_leaky'
+            self.assertEqual(props['threads_delta'], '1' if leaky else '0')
+
+
+if __name__ == "__main__":
+    unittest.main()
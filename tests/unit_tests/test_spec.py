@@ -0,0 +1,56 @@
+import dataclasses
+import os
+import shutil
+import tempfile
+import unittest
+
+import kalash
+from kalash.config import CliConfig, Trigger
+from kalash.spec import Spec
+
+BASELINE_SPEC = os.path.join(
+    os.path.dirname(__file__), os.pardir, 'test_yamls', 'spec_baseline.yaml'
+)
+
+
+class TestSpecCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.spec_path = os.path.join(self.tmp, 'custom_spec.yaml')
+        shutil.copy(os.path.join(os.path.dirname(kalash.__file__), 'spec.yaml'), self.spec_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_spec_is_shared_and_immutable(self):
+        spec = CliConfig().spec
+        self.assertIs(Trigger().cli_config.spec, spec)
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            spec.test.path = 'other'  # type: ignore
+
+    def test_custom_spec_is_reloaded_when_modified(self):
+        spec = CliConfig(spec_path=self.spec_path).spec
+        self.assertIsNot(spec, CliConfig().spec)
+        self.assertIs(Spec.load_spec(self.spec_path), spec)
+        with open(self.spec_path) as f:
+            content = f.read()
+        with open(self.spec_path, 'w') as f:
+            f.write(content.replace('path: "path"', 'path: "where"'))
+        stat = os.stat(self.spec_path)
+        os.utime(self.spec_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertEqual(CliConfig(spec_path=self.spec_path).spec.test.path, 'where')
+
+    def test_spec_without_newer_keys_loads(self):
+        # a custom spec written before retries, history, events etc. existed
+        spec = Spec.load_spec(BASELINE_SPEC)
+        self.assertEqual(spec.test.retries, 'retries')
+        self.assertEqual(spec.test.flaky, 'FLAKY')
+        self.assertEqual(spec.test.last_result_since, 'last_result_since')
+        self.assertEqual(spec.config.retry_budget, 'retry_budget')
+        self.assertEqual(spec.config.events, 'events')
+        self.assertIn('retries', spec.test.non_filters)
+
+
+if __name__ == '__main__':
+    unittest.main()
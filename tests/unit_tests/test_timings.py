@@ -0,0 +1,76 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from kalash import timings
+from kalash.timings import COLLECTING, IMPORTING, METADATA, SETUP, TESTS, timed
+
+
+class TestTimings(unittest.TestCase):
+
+    def tearDown(self):
+        timings.stop()
+
+    def test_not_recording(self):
+        self.assertIsNone(timings.stop())
+        with timed(TESTS):
+            pass
+
+    def test_nested_blocks_are_exclusive(self):
+        recorded = timings.start('run')
+        with timed(COLLECTING, 'test_a.py'):
+            time.sleep(0.01)
+            with timed(IMPORTING, 'test_a.py'):
+                time.sleep(0.02)
+        timings.stop()
+        self.assertGreaterEqual(recorded.phases[IMPORTING], 0.02)
+        self.assertLess(recorded.phases[COLLECTING], 0.02)
+        self.assertAlmostEqual(
+            recorded.phases[COLLECTING] + recorded.phases[IMPORTING] + recorded.other,
+            recorded.total, places=6
+        )
+        self.assertEqual(recorded.slowest(IMPORTING)[0]['file'], os.path.abspath('test_a.py'))
+
+    def test_setup_is_opaque(self):
+        recorded = timings.start()
+        with timed(SETUP):
+            with timed(IMPORTING, 'setup.py'):
+                time.sleep(0.01)
+        timings.stop()
+        self.assertEqual(recorded.phases[IMPORTING], 0.0)
+        self.assertGreaterEqual(recorded.phases[SETUP], 0.01)
+
+    def test_other_threads_are_ignored(self):
+        recorded = timings.start()
+        thread = threading.Thread(target=lambda: timed(METADATA, 'x.py').__enter__())
+        thread.start()
+        thread.join()
+        timings.stop()
+        self.assertEqual(recorded.phases[METADATA], 0.0)
+
+    def test_top_and_json(self):
+        recorded = timings.start('run')
+        for i in range(5):
+            with timed(METADATA, f'test_{i}.py'):
+                pass
+        timings.stop()
+        self.assertEqual(len(recorded.slowest(METADATA, 2)), 2)
+        self.assertIn(METADATA, recorded.format(2))
+        directory = tempfile.mkdtemp()
+        try:
+            with open(recorded.write(directory, 3)) as f:
+                data = json.load(f)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        self.assertEqual(data['run'], 'run')
+        self.assertEqual(data['files'][METADATA], 5)
+        self.assertEqual(len(data['slowest'][METADATA]), 3)
+        self.assertIn('other', data['phases'])
+
+
+if __name__ == '__main__':
+    unittest.main()
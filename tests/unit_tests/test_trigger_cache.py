@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from kalash.config import CliConfig, Trigger
+
+TRIGGER_YAML = """tests:
+  - path: '$(ThisFile)/tests'
+    id: {id}
+config:
+  report: './kalash_reports'"""
+
+TRIGGER_PY = """from kalash.config import Test, Trigger
+import builtins
+builtins.trigger_executions = getattr(builtins, 'trigger_executions', 0) + 1
+t = Trigger([Test(path='$(ThisFile)/tests')])"""
+
+
+class TestTriggerCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.yaml_path = os.path.join(self.tmp, 'cached.yaml')
+        with open(self.yaml_path, 'w') as f:
+            f.write(TRIGGER_YAML.format(id='first'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_yaml_parsed_once(self):
+        config = CliConfig(self.yaml_path)
+        with mock.patch.object(Trigger, 'from_file', wraps=Trigger.from_file) as from_file:
+            trigger = Trigger.infer_trigger(config)
+            self.assertIs(Trigger.infer_trigger(config), trigger)
+            other_config = CliConfig(self.yaml_path)
+            other = Trigger.infer_trigger(other_config)
+            self.assertEqual(from_file.call_count, 1)
+        self.assertIs(other.cli_config, other_config)
+        self.assertIs(other.tests, trigger.tests)
+        self.assertEqual(trigger.tests[0].path, os.path.join(self.tmp, 'tests'))
+
+    def test_modified_yaml_parsed_again(self):
+        config = CliConfig(self.yaml_path)
+        self.assertEqual(Trigger.infer_trigger(config).tests[0].id, 'first')
+        with open(self.yaml_path, 'w') as f:
+            f.write(TRIGGER_YAML.format(id='second'))
+        stat = os.stat(self.yaml_path)
+        os.utime(self.yaml_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertEqual(Trigger.infer_trigger(config).tests[0].id, 'second')
+
+    def test_python_trigger_executed_once(self):
+        import builtins
+        py_path = os.path.join(self.tmp, 'cached_trigger.py')
+        with open(py_path, 'w') as f:
+            f.write(TRIGGER_PY)
+        trigger = Trigger.infer_trigger(CliConfig(py_path))
+        self.assertIs(Trigger.infer_trigger(CliConfig(py_path)), trigger)
+        self.assertEqual(builtins.trigger_executions, 1)  # type: ignore
+        del builtins.trigger_executions  # type: ignore
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+import yaml
+
+from kalash.yaml_backend import UnsupportedYaml, load, load_flat, load_metadata
+
+FLAT = [
+    '',
+    '# only a comment',
+    '---\nid: 000000001_11-CMEth_1-FLASH_SomethingElse  # ID of the test\n',
+    'id: abc\nuse_cases:     # JIRA codes\n  - PRODTEST-9998   # Example\n  - PRODTEST-1\n',
+    'devices:\n- cancombo\n- lincombo\nversion:\n',
+    'id: a#b\nfunctionality:\n\n    - x:y\n',
+]
+
+NOT_FLAT = [
+    'id: 1',
+    'version: 1.5',
+    'id: 000000001_11',
+    'date: 2022-01-01',
+    'yes: x',
+    'enabled: on',
+    'id: ~',
+    "id: 'quoted'",
+    'devices: [a, b]',
+    'id: a\n  continued',
+    'devices:\n  - a\n    - b',
+    'devices:\n  - a: 1',
+    'config:\n  nested: x',
+    'id: &anchor x\nother: *anchor',
+    'id: !!str 1',
+    'id: |\n  block',
+    'list:\n  -\n',
+]
+
+
+class TestYamlBackend(unittest.TestCase):
+
+    def test_flat_documents(self):
+        for text in FLAT:
+            with self.subTest(text=text):
+                self.assertEqual(load_flat(text), yaml.full_load(text))
+
+    def test_other_documents_fall_back(self):
+        for text in NOT_FLAT:
+            with self.subTest(text=text):
+                with self.assertRaises(UnsupportedYaml):
+                    load_flat(text)
+                self.assertEqual(load_metadata(text), yaml.full_load(text))
+
+    def test_full_load_tags(self):
+        self.assertEqual(load('a: !!python/tuple [1, 2]', full=True), {'a': (1, 2)})
+        with self.assertRaises(yaml.constructor.ConstructorError):
+            load('a: !!python/tuple [1, 2]')
+
+
+if __name__ == '__main__':
+    unittest.main()